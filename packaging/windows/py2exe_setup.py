@@ -176,7 +176,7 @@ setup(
     # Note: only include files here which are to be put into the package pyfpdb folder or subfolders
 
     data_files = [('', glob.glob(rootdir+'*.txt'))
-                 ,('', [pydir+'HUD_config.xml.example',pydir+'logging.conf'])
+                 ,('', [pydir+'HUD_config.xml.example',pydir+'logging.conf',pydir+'PreflopEquity.txt'])
                  ] + matplotlib.get_py2exe_datafiles()
 )
 
@@ -17,86 +17,120 @@
 
 ########################################################################
 
-import os, sys
-import re
-from time import time, sleep
+"""Archive.py
+
+Keeps the raw text of imported hands in the RawHands table, so hands can be
+exported or parsed again without the original hand history files.
+Hands are compressed blockSize at a time: hands of one site share most of
+their text, and a block lets the compressor find that across hands where a
+single hand is too short to compress well. Each site has an open block that
+fills across files and auto import runs. It is written with the hands it
+holds when their file is imported, and written again as more
+hands join it, until it is full. Each block lists the Hands.id and
+length of its hands in offsets, a hand is read by decompressing its block.
+What is kept follows the raw_hands element of the config: save is none,
+error (only hands that failed to parse) or all, compression is none, gzip
+or bzip2.
+"""
+
+import zlib
+import bz2
 import codecs
-import shutil
-import subprocess
 
-from IdentifySite import *
+# compression name -> (compress, decompress), the name is stored with each block
+codecs_by_name = { 'none'  : (lambda data: data, lambda data: data)
+                 , 'gzip'  : (lambda data: zlib.compress(data, 9), zlib.decompress)
+                 , 'bzip2' : (lambda data: bz2.compress(data, 9), bz2.decompress)
+                 }
+
+def packBlock(texts, compression, complain=False):
+    """Compresses [(handId, text)] into a RawHands row, see Database.rawHandRow"""
+    data = [text.encode('utf-8') for (handId, text) in texts]
+    offsets = " ".join("%d:%d" % (handId, len(d)) for ((handId, text), d) in zip(texts, data))
+    return (texts[0][0], texts[-1][0], compression, offsets, codecs_by_name[compression][0]("".join(data)), complain)
+
+def unpackBlock(compression, offsets, data):
+    """Returns the [(handId, text)] of a block"""
+    data = codecs_by_name[compression][1](data)
+    texts, pos = [], 0
+    for entry in offsets.split():
+        (handId, length) = [int(x) for x in entry.split(":")]
+        texts.append((handId, data[pos:pos + length].decode('utf-8')))
+        pos += length
+    return texts
+
+class Archive:
+    blockSize = 200     # hands compressed together
+
+    def __init__(self, config):
+        self.save = config.raw_hands.save
+        self.compression = config.raw_hands.compression
+        self.pending = {}       # siteId, None for hands that failed to parse -> [(handId, text)] of the open block
+        self.blockIds = {}      # siteId or None -> RawHands.id the open block is written to
+        self.lastBlock = {}     # handId -> text of the last block read, for reading hands in turn
+
+    def storeHands(self, db, hands, failed=()):
+        """Adds the text of the stored hands, and of the hand texts in failed
+           that didn't parse, as the config asks, and writes the blocks they
+           went to. Does not commit, the caller commits them with the hands."""
+        touched = set()
+        if self.save == 'all':
+            for hand in hands:
+                self.pending.setdefault(hand.siteId, []).append((hand.dbid_hands, hand.handText))
+                touched.add(hand.siteId)
+        if self.save in ('all', 'error') and failed:
+            # hands that failed have no Hands.id, their blocks are kept apart with complain set
+            self.pending.setdefault(None, []).extend((0, text) for text in failed)
+            touched.add(None)
+        for key in touched:
+            self.writeBlocks(db, key)
+
+    def writeBlocks(self, db, key):
+        """Writes the open block of key over the last version of it, and
+           starts a new one when it is full"""
+        texts = self.pending[key]
+        if key is not None:
+            texts.sort()
+        while texts:
+            block = packBlock(texts[:self.blockSize], self.compression, key is None)
+            if key not in self.blockIds or not db.updateRawHand(self.blockIds[key], block):
+                # a rolled back block is written again
+                self.blockIds[key] = db.storeRawHand(block)
+            if len(texts) < self.blockSize:
+                break
+            del texts[:self.blockSize]
+            del self.blockIds[key]
+
+    def getHandText(self, db, handId):
+        """Returns the text of hand handId, None if it isn't archived"""
+        return self.getHandTexts(db, [handId]).get(int(handId))
+
+    def getHandTexts(self, db, handIds):
+        """Returns {handId: text} for the archived hands of handIds, reading
+           each block they are in once"""
+        (texts, found) = ({}, dict(self.lastBlock))
+        for handId in sorted(set(int(id) for id in handIds)):
+            if handId not in found:
+                # blocks of other sites can span the id, all the blocks that do are read
+                block = {}
+                for (first, last, compression, offsets, data) in db.getRawHandBlocks(handId, handId):
+                    block.update(unpackBlock(compression, offsets, data))
+                found.update(block)
+                self.lastBlock = block
+            if handId in found:
+                texts[handId] = found[handId]
+        return texts
+
+    def getFailedTexts(self, db):
+        """Returns the texts of the hands that failed to parse, to try them again after a parser fix"""
+        return [text for (id, compression, offsets, data) in db.getFailedRawHandBlocks()
+                for (handId, text) in unpackBlock(compression, offsets, data)]
 
-class FPDBArchive:
-    def __init__(self, hand):
-        self.hid = hand.dbid_hands
-        self.handText = hand.handText
-        
-class Archive():
-    def __init__(self, config=None, path = None, ftype="hh"):
-        self.config = config
-        self.archivePath = None
-        if config:
-            self.archivePath = config.imp.archivePath
-        self.path   = path
-        self.ftype  = ftype
-        self.handList = {}
-        self.sessionsArchive = {}
-        self.startCardsArchive = {}
-        self.positionsArchive = {}
-        
-    def quickImport(self, userid, filtertype, game, filter, settings, tz): pass
-    """Sets up import in 'quick' mode to import the HandsPlayers, HandsActions, and HandsStove records"""
-        
-    def getSiteSplit(self): pass
-    """Returns split string for each site so it can be added back into the handText when writing to archive"""
-    
-    def fileInfo(self, path, site, filter, filter_name, obj=None, summary=None): pass
-    """Sets file site and header info if applicable"""
-        
-    def addHand(self, hand, write=False): pass
-    """Creates a FPDBArchive object for the hand and adds it to the handList dictionary"""
-    
-    def createSession(self, sid): pass
-    """Creates a session directory for a given sessionId"""
-    
-    def mergeFiles(self, path1, path2): pass
-    """Merges two files together in cases where cash sessions need to be combined within a session"""
-    
-    def mergeSessions(self, oldsid, newsid): pass
-    """Merges two session directories together"""
-    
-    def mergeSubSessions(self, type, sid, oldId, newId, hids): pass
-    """Merges two cash session files together"""
-    
-    def addSessionHands(self, type, sid, id, hids): pass
-    """Adds the handText records for a session to the sessionsArchive dictionary and sets the path"""
-    
-    def addStartCardsHands(self, category, type, startCards, wid, siteId, hids): pass
-    """Adds the handText records for startCards to the startCardsArchive dictionary and sets the path"""
-    
-    def addPositionsHands(self, type, activeSeats, position, wid, siteId, hids): pass
-    """Adds the handText records for Positions to the positionsArchive dictionary and sets the path"""
-    
-    def getFile(self, path): pass
-    """Method for creating, appending and or unzipping a file"""
-    
-    def fileOrZip(self, path): pass
-    """Checks to see if the file exists or if the zip file exists. Unzips if necessary"""
-    
-    def writeHands(self, doinsert): pass
-    """Take the hands stored in the sessionsArchive, startCardsArchive, and positionsArchive dictionaries
-       and write or append those hands to files organized in the archive directory"""
-       
-    def zipFile(self, path): pass
-    """Zip a file for archiving"""
-    
-    def unzipFile(self, path): pass
-    """Unzip a file for import"""
-    
-    def zipAll(self): pass
-    """Recursively zip all the files in the archive directory"""
-    
-    def unzipAll(self): pass
-    """Recursively unzip all the files in the archive directory"""
-    
-     
\ No newline at end of file
+    def exportHands(self, db, handIds, path):
+        """Writes the archived hands of handIds to a hand history file at path,
+           returns the number of hands written"""
+        texts = self.getHandTexts(db, handIds)
+        with codecs.open(path, 'w', 'utf-8') as f:
+            for handId in sorted(texts):
+                f.write(texts[handId].strip() + u"\n\n\n")
+        return len(texts)
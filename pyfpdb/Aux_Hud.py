@@ -94,7 +94,15 @@ class Simple_HUD(Aux_Base.Aux_Seats):
                     = self.game_params.stats[stat].popup
             self.tips[self.game_params.stats[stat].rowcol[0]][self.game_params.stats[stat].rowcol[1]] \
                     = self.game_params.stats[stat].tip
+
+        self.stat_names = set(stat for row in self.stats for stat in row if stat)
+        self.stat_values = {}
                                         
+    def update_gui(self, new_hand_id):
+        # work out every stat of every player once, the stat windows pick theirs from here
+        self.stat_values = Stats.do_stats(self.hud.stat_dict, self.stat_names, hand_instance=self.hud.hand_instance)
+        super(Simple_HUD, self).update_gui(new_hand_id)
+
     def create_contents(self, container, i):
         # this is a call to whatever is in self.aw_class_window but it isn't obvious
         container.create_contents(i)
@@ -174,9 +182,10 @@ class Simple_Stat_Window(Aux_Base.Seat_Window):
         if i == "common": return
         player_id = self.aw.get_id_from_seat(i)
         if player_id is None: return
+        values = self.aw.stat_values.get(player_id, {})
         for r in xrange(self.aw.nrows):
             for c in xrange(self.aw.ncols):
-                self.stat_box[r][c].update(player_id, self.aw.hud.stat_dict)
+                self.stat_box[r][c].update(player_id, self.aw.hud.stat_dict, values.get(self.aw.stats[r][c]))
 
 
 class Simple_stat(object):
@@ -192,10 +201,13 @@ class Simple_stat(object):
         self.stat_dict = None
         self.hud = aw.hud
 
-    def update(self, player_id, stat_dict):
+    def update(self, player_id, stat_dict, number=None):
+        # number is the result of the stat when the caller has worked it out already
         self.stat_dict = stat_dict     # So the Simple_stat obj always has a fresh stat_dict
         self.lab.stat_dict = stat_dict
-        self.number = Stats.do_stat(stat_dict, player_id, self.stat, self.hud.hand_instance)
+        if number is None:
+            number = Stats.do_stat(stat_dict, player_id, self.stat, self.hud.hand_instance)
+        self.number = number
         if self.number:
             self.lab.setText(unicode(self.number[1]))
 
@@ -599,6 +599,7 @@ class Import:
         self.callFpdbHud        = string_to_bool(node.getAttribute("callFpdbHud")      , default=False)
         self.fastStoreHudCache  = string_to_bool(node.getAttribute("fastStoreHudCache"), default=False)
         self.saveStarsHH        = string_to_bool(node.getAttribute("saveStarsHH")      , default=False)
+        self.threads            = node.getAttribute("threads")
         if node.getAttribute("importFilters"):
             self.importFilters = node.getAttribute("importFilters").split(",")
         else:
@@ -752,14 +753,14 @@ class RawHands:
             if save in ("none", "error", "all"):
                 self.save=save
             else:
-                print (_("Invalid config value for %s, defaulting to %s") % (raw_hands.save, "\"error\""))
+                print (_("Invalid config value for %s, defaulting to %s") % ("raw_hands save", "\"error\""))
                 self.save="error"
             
             compression=node.getAttribute("compression")
-            if save in ("none", "gzip", "bzip2"):
+            if compression in ("none", "gzip", "bzip2"):
                 self.compression=compression
             else:
-                print (_("Invalid config value for %s, defaulting to %s") % (raw_hands.compression, "\"none\""))
+                print (_("Invalid config value for %s, defaulting to %s") % ("raw_hands compression", "\"none\""))
                 self.compression="none"
     #end def __init__
 
@@ -778,14 +779,14 @@ class RawTourneys:
             if save in ("none", "error", "all"):
                 self.save=save
             else:
-                print (_("Invalid config value for %s, defaulting to %s") % (raw_tourneys.save, "\"error\""))
+                print (_("Invalid config value for %s, defaulting to %s") % ("raw_tourneys save", "\"error\""))
                 self.save="error"
             
             compression=node.getAttribute("compression")
-            if save in ("none", "gzip", "bzip2"):
+            if compression in ("none", "gzip", "bzip2"):
                 self.compression=compression
             else:
-                print (_("Invalid config value for %s, defaulting to %s") % (raw_tourneys.compression, "\"none\""))
+                print (_("Invalid config value for %s, defaulting to %s") % ("raw_tourneys compression", "\"none\""))
                 self.compression="none"
     #end def __init__
 
@@ -1473,6 +1474,10 @@ class Config:
         try:    imp['timezone'] = self.imp.timezone
         except:  imp['timezone'] = "America/New_York"
 
+        # number of processes used to convert files during a bulk import
+        try:    imp['threads'] = max(1, int(self.imp.threads))
+        except:  imp['threads'] = 1
+
         return imp
     
     def set_timezone(self, timezone):
@@ -39,19 +39,24 @@ import traceback
 from datetime import datetime, date, time, timedelta
 from time import time, strftime, sleep
 from decimal_wrapper import Decimal
-import string
 import re
 import Queue
 import codecs
 import math 
 import pytz
 import csv
+import cStringIO
 import logging
-import random
+import imp
 
 re_char = re.compile('[^a-zA-Z]')
 re_insert = re.compile("insert\sinto\s(?P<TABLENAME>[A-Za-z]+)\s(?P<COLUMNS>\(.+?\))\s+values", re.DOTALL)
 
+# Players ids by database, shared by every Database object (and inherited by forked import
+# workers) so that a new Importer starts with the ids the last one looked up. Only ids that
+# are committed go in, until then they are kept in the pnew of the Database that found them
+_player_ids = {}
+
 #    FreePokerTools modules
 import SQL
 import Card
@@ -73,14 +78,14 @@ except ImportError:
     use_pool = False
 
 try:
-    from numpy import var
+    imp.find_module('numpy')    # only looked for, numpy is slow to import and only VARIANCE uses it
     use_numpy = True
 except ImportError:
     log.info(_("Not using numpy to define variance in sqlite."))
     use_numpy = False
 
 
-DB_VERSION = 216
+DB_VERSION = 218
 
 # Variance created as sqlite has a bunch of undefined aggregate functions.
 
@@ -92,6 +97,7 @@ class VARIANCE:
         self.store.append(value)
 
     def finalize(self):
+        from numpy import var
         return float(var(self.store))
 
 class sqlitemath:
@@ -99,17 +105,62 @@ class sqlitemath:
         return a%b
     
     
+def utc_offset():
+    """datetime.utcnow() - datetime.today() from a single reading of the clock. Read
+       twice the difference can come out a few microseconds short, which is -1 day
+       and 86399 seconds, so tz.seconds/3600 jumped to 23 hours now and then"""
+    now = time()
+    return datetime.utcfromtimestamp(now) - datetime.fromtimestamp(now)
+
 def adapt_decimal(d):
     return str(d)
 
 def convert_decimal(s):
     return Decimal(s)
+
+class CopyStream:
+    """A file like object feeding rows to psycopg2's copy_expert as CSV. Rows are
+       formatted as COPY reads them, a chunk at a time, so a batch is never held
+       as one big string. None is written as \\N, which COPY_STDIN declares as NULL,
+       so that empty strings stay empty strings. Unicode is encoded with the
+       connection's client encoding, which is what the server reads COPY data as."""
+    def __init__(self, rows, encoding='utf-8'):
+        self.rows = iter(rows)
+        self.encoding = encoding
+        self.buffer = cStringIO.StringIO()
+        self.writer = csv.writer(self.buffer, delimiter='\t', quotechar='"', quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        self.data = ''
+
+    def field(self, v):
+        if v is None:
+            return '\\N'
+        if v.__class__ is unicode:
+            return v.encode(self.encoding)
+        return v
+
+    def read(self, size=8192):
+        buffer, writer, field = self.buffer, self.writer, self.field
+        while len(self.data) < size:
+            buffer.seek(0)
+            buffer.truncate()
+            for row in self.rows:
+                writer.writerow([field(v) for v in row])
+                if buffer.tell() >= size:
+                    break
+            chunk = buffer.getvalue()
+            if not chunk:
+                break
+            self.data += chunk
+        data, self.data = self.data[:size], self.data[size:]
+        return data
+
+COPY_STDIN = "COPY %s%s FROM STDIN WITH DELIMITER E'\\t' NULL E'\\\\N' CSV"
     
     
 # These are for appendStats. Insert new stats at the right place, because
 # SQL needs strict order.
 # Keys used to index into player data in storeHandsPlayers.
-HANDS_PLAYERS_KEYS = [
+HANDS_PLAYERS_KEYS = (
     'startCash',
     'effStack',
     'startBounty',
@@ -269,11 +320,7 @@ HANDS_PLAYERS_KEYS = [
     'street2Discards',
     'street3Discards',
     'handString'
-]
-
-# Just like STATS_KEYS, this lets us efficiently add data at the
-# "beginning" later.
-HANDS_PLAYERS_KEYS.reverse()
+)
 
 
 CACHE_KEYS = [
@@ -391,9 +438,21 @@ CACHE_KEYS = [
     'street4Raises',
     'street1Discards',
     'street2Discards',
-    'street3Discards'
+    'street3Discards',
+    'totalProfitSq'
     ]
 
+# The stats behind CACHE_KEYS, n is always 1 for a single hand and totalProfitSq,
+# kept so the stats grids can work out variance from the caches, is totalProfit squared
+CACHE_STATS = tuple(CACHE_KEYS[1:-1])
+CACHE_PROFIT = CACHE_KEYS.index('totalProfit')
+
+def cache_line(stats):
+    """The CACHE_KEYS values of one player in one hand (a DerivedStats.HandsPlayer)"""
+    line = [1] + [int(v) if v.__class__ is bool else v for v in stats.pick(CACHE_STATS)]
+    line.append((line[CACHE_PROFIT] or 0) ** 2)
+    return line
+
 
 class Database:
 
@@ -403,6 +462,15 @@ class Database:
 
     hero_hudstart_def = '1999-12-31'      # default for length of Hero's stats in HUD
     villain_hudstart_def = '1999-12-31'   # default for length of Villain's stats in HUD
+    dupCheckSize = 500                    # siteHandNos per IN (...) in checkDuplicates, sqlite allows 999 parameters
+    replayChunkSize = 500                 # handIds per IN (...) in get_hands_for_replay
+    playerChunkSize = 500                 # player names per IN (...) in cachePlayerIDs
+    sqliteStatementCache = 500            # compiled statements sqlite3 keeps per connection, keyed on the sql text
+    sqliteBulkCacheSize = 262144          # KiB of page cache sqlite uses during a bulk import
+    sqliteBulkMmapSize = 1 << 30          # bytes of the db file sqlite memory maps during a bulk import
+    sqliteBulkFiles = 50                  # files per transaction during a sqlite bulk import
+    # tables every hand writes to, sqlite drops their secondary indexes for a bulk import
+    sqliteBulkTables = ('Hands', 'Boards', 'HandsPlayers', 'HandsActions', 'HandsStove', 'HandsPots')
 
     # Data Structures for index and foreign key creation
     # drop_code is an int with possible values:  0 - don't drop for bulk import
@@ -419,6 +487,7 @@ class Database:
                 [ ] # no db with index 0
               , [ ] # no db with index 1
               , [ # indexes for mysql (list index 2) (foreign keys not here, in next data structure)
+                  {'tab':'RawHands',        'col':'handId',            'drop':0}
                 #  {'tab':'Players',         'col':'name',              'drop':0}  unique indexes not dropped
                 #  {'tab':'Hands',           'col':'siteHandNo',        'drop':0}  unique indexes not dropped
                 #, {'tab':'Tourneys',        'col':'siteTourneyNo',     'drop':0}  unique indexes not dropped
@@ -465,6 +534,7 @@ class Database:
                 , {'tab':'Backings',        'col':'tourneysPlayersId', 'drop':0}
                 , {'tab':'Backings',        'col':'playerId',          'drop':0}
                 , {'tab':'RawHands',        'col':'id',                'drop':0}
+                , {'tab':'RawHands',        'col':'handId',            'drop':0}
                 , {'tab':'RawTourneys',     'col':'id',                'drop':0}
                 ]
               , [ # indexes for sqlite (list index 4)
@@ -503,6 +573,7 @@ class Database:
                 , {'tab':'Backings',        'col':'tourneysPlayersId', 'drop':0}
                 , {'tab':'Backings',        'col':'playerId',          'drop':0}
                 , {'tab':'RawHands',        'col':'id',                'drop':0}
+                , {'tab':'RawHands',        'col':'handId',            'drop':0}
                 , {'tab':'RawTourneys',     'col':'id',                'drop':0}
                 ]
               ]
@@ -643,6 +714,9 @@ class Database:
         self._hero = None
         self._has_lock = False
         self.printdata = False
+        self.bulkFiles = None        # files imported since the last commit while commits span files
+        self.bulkIndexes = []        # (name, sql) of the indexes prepareBulkImport dropped on sqlite
+        self.pnew = {}               # PlayerIds found since the last commit, see _player_ids
         self.resetCache()
         self.resetBulkCache()
         
@@ -769,6 +843,7 @@ class Database:
         self.connection = None
         self.cursor     = None
         self.hand_inc   = 1
+        self.cacheDeltas = set()     # temp tables mergeCache has created on this connection
 
         if backend == Database.MYSQL_INNODB:
             import MySQLdb
@@ -851,7 +926,8 @@ class Database:
             self.db_path = database
             log.info(_("Connecting to SQLite: %s") % self.db_path)
             if os.path.exists(database) or create:
-                self.connection = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES )
+                self.connection = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES
+                                                 , cached_statements=self.sqliteStatementCache )
                 self.__connected = True
                 sqlite3.register_converter("bool", lambda x: bool(int(x)))
                 sqlite3.register_adapter(bool, lambda x: 1 if x else 0)
@@ -907,9 +983,13 @@ class Database:
                 self.wrongDbVersion = True
     #end def connect
 
-    def commit(self):
+    def commit(self, force=False):
         if self.backend != self.SQLITE:
             self.connection.commit()
+            self.keepPlayerIds()
+        elif self.bulkFiles is not None and not force:
+            # a bulk import commits every sqliteBulkFiles files, see fileImported
+            pass
         else:
             # sqlite commits can fail because of shared locks on the database (SQLITE_BUSY)
             # re-try commit if it fails in case this happened
@@ -928,9 +1008,21 @@ class Database:
             if not ok:
                 log.debug(_("commit failed"))
                 raise FpdbError('sqlite commit failed')
+            self.keepPlayerIds()
+
+    def fileImported(self):
+        """Called by the Importer after each file. When commits span files, commits
+           once sqliteBulkFiles files have been imported since the last one"""
+        if self.bulkFiles is not None:
+            self.bulkFiles += 1
+            if self.bulkFiles >= self.sqliteBulkFiles:
+                self.commit(force=True)
+                self.bulkFiles = 0
 
     def rollback(self):
         self.connection.rollback()
+        # ids of players inserted since the last commit are gone
+        self.pnew = {}
 
     def connected(self):
         """ now deprecated, use is_connected() instead """
@@ -952,8 +1044,10 @@ class Database:
         """Disconnects the DB (rolls back if param is true, otherwise commits"""
         if due_to_error:
             self.connection.rollback()
+            self.pnew = {}
         else:
             self.connection.commit()
+            self.keepPlayerIds()
         self.cursor.close()
         self.connection.close()
         self.__connected = False
@@ -1021,12 +1115,98 @@ class Database:
         #  to Hand.hand_factory
         c = self.connection.cursor()
         q = self.sql.query['get_gameinfo_from_hid']
-        q = q.replace('%s', self.sql.query['placeholder'])
         c.execute (q, (hand_id, ))
         row = c.fetchone()
         gameinfo = {'sitename':row[0],'category':row[1],'base':row[2],'type':row[3],'limitType':row[4],
-                'hilo':row[5],'sb':row[6],'bb':row[7], 'sbet':row[8],'bbet':row[9], 'currency':row[10], 'gametypeId':row[11]}
+                'hilo':row[5],'sb':row[6],'bb':row[7], 'sbet':row[8],'bbet':row[9], 'currency':row[10], 'gametypeId':row[11],
+                'split':row[12]}
         return gameinfo
+
+    def get_hands_for_replay(self, hand_ids):
+        """Fetch what Hand.select needs for many hands with a few chunked IN (...)
+           queries instead of half a dozen queries per hand. Returns
+           {handId: {'gameinfo', 'hand', 'players', 'boards', 'actions'}}, hands
+           that are not in the db are left out."""
+        hands = {}
+        c = self.get_cursor()
+        ids = sorted(set(int(id) for id in hand_ids))
+        for i in xrange(0, len(ids), self.replayChunkSize):
+            chunk = ids[i:i+self.replayChunkSize]
+            for row in self.fetch_replay_rows(c, 'get_gameinfo_from_hids', chunk, dicts=False):
+                gameinfo = {'sitename':row[1],'category':row[2],'base':row[3],'type':row[4],'limitType':row[5],
+                        'hilo':row[6],'sb':row[7],'bb':row[8], 'sbet':row[9],'bbet':row[10], 'currency':row[11], 'gametypeId':row[12],
+                        'split':row[13]}
+                hands[row[0]] = {'gameinfo': gameinfo, 'hand': None, 'players': [], 'boards': [], 'actions': []}
+            for row in self.fetch_replay_rows(c, 'multiHand', chunk):
+                if row['id'] in hands:
+                    hands[row['id']]['hand'] = row
+            for (q, key) in (('multiPlayerHand', 'players'), ('multiHandBoards', 'boards'), ('multiHandActions', 'actions')):
+                for row in self.fetch_replay_rows(c, q, chunk):
+                    if row['handid'] in hands:
+                        hands[row['handid']][key].append(row)
+        return hands
+
+    def get_tourney_payouts(self, tourneyId, names):
+        """Payouts of a tourney by place, in the currency's units, for an ICM of
+           a hand between names. None unless names are the last players left,
+           ie. took the top len(names) places, as the imported summary has it."""
+        c = self.get_cursor()
+        c.execute(self.sql.query['getTourneyResults'], (tourneyId,))
+        places = sorted((rank, name, winnings) for (name, rank, winnings) in c.fetchall()
+                        if rank is not None and rank <= len(names))
+        if set(name for (rank, name, winnings) in places) != set(names) or len(places) != len(names):
+            return None
+        payouts = [(winnings or 0) / 100.0 for (rank, name, winnings) in places]
+        if not any(payouts):
+            return None
+        return payouts
+
+    def fetch_replay_rows(self, c, query, hand_ids, dicts=True):
+        q = self.sql.query[query].replace('<hand_ids>', ', '.join([self.sql.query['placeholder']] * len(hand_ids)))
+        c.execute(q, hand_ids)
+        if not dicts:
+            return c.fetchall()
+        # Descriptor must be set to lowercase as supported dbs differ on what is returned.
+        columns = [column[0].lower() for column in c.description]
+        return [dict(zip(columns, row)) for row in c.fetchall()]
+
+    def rawHandRow(self, block):
+        """block is a tuple of (first handId, last handId, compression, offsets,
+           compressed bytes, complain), returns it as query parameters"""
+        if self.backend == self.PGSQL:
+            import psycopg2
+            binary = psycopg2.Binary
+        elif self.backend == self.SQLITE:
+            binary = buffer
+        else:
+            binary = str
+        return block[:4] + (binary(block[4]), block[5])
+
+    def storeRawHand(self, block):
+        """Inserts a raw hand archive block, see rawHandRow, returns its id"""
+        c = self.get_cursor()
+        c.execute(self.sql.query['storeRawHand'], self.rawHandRow(block))
+        return self.get_last_insert_id(c)
+
+    def updateRawHand(self, id, block):
+        """Writes block over raw hand archive block id, returns False if there is none"""
+        c = self.get_cursor()
+        c.execute(self.sql.query['updateRawHand'], self.rawHandRow(block) + (id,))
+        return c.rowcount > 0
+
+    def getRawHandBlocks(self, firstId, lastId):
+        """Returns the archive blocks holding hands firstId to lastId as
+           (first handId, last handId, compression, offsets, compressed bytes)"""
+        c = self.get_cursor()
+        c.execute(self.sql.query['getRawHandBlocks'], (lastId, firstId, False))
+        return [row[:4] + (str(row[4]),) for row in c.fetchall()]
+
+    def getFailedRawHandBlocks(self):
+        """Returns the archive blocks of hands that failed to parse as
+           (id, compression, offsets, compressed bytes)"""
+        c = self.get_cursor()
+        c.execute(self.sql.query['getFailedRawHandBlocks'], (True,))
+        return [row[:3] + (str(row[3]),) for row in c.fetchall()]
         
 #   Query 'get_hand_info' does not exist, so it seems
 #    def get_hand_info(self, new_hand_id):
@@ -1055,11 +1235,9 @@ class Database:
     def getSiteTourneyNos(self, site):
         c = self.connection.cursor()
         q = self.sql.query['getSiteId']
-        q = q.replace('%s', self.sql.query['placeholder'])
         c.execute(q, (site,))
         siteid = c.fetchone()[0]
         q = self.sql.query['getSiteTourneyNos']
-        q = q.replace('%s', self.sql.query['placeholder'])
         c.execute(q, (siteid,))
         alist = []
         for row in c.fetchall():
@@ -1127,7 +1305,7 @@ class Database:
         if row and row[0]:
             self.hand_1day_ago = int(row[0])
                 
-        tz = datetime.utcnow() - datetime.today()
+        tz = utc_offset()
         tz_offset = tz.seconds/3600
         tz_day_start_offset = self.day_start + tz_offset
         
@@ -1153,7 +1331,14 @@ class Database:
                                           }
                            , hero_id = -1
                            , num_seats = 6
+                           , stat_cache = None
+                           , cache_owner = None
                            ):
+        """Return a dict of stat dicts keyed by playerId for the players in hand.
+           stat_cache is an optional dict owned by the caller, shared by all its tables,
+           in which the HudCache totals are kept between calls, so that following hands
+           only have to add their own HandsPlayers rows instead of re-running the query.
+           cache_owner is the table hand was played at, see get_stats_from_hand_cached."""
         stat_range   = hud_params['stat_range']
         agg_bb_mult = hud_params['agg_bb_mult']
         seats_style = hud_params['seats_style']
@@ -1225,6 +1410,14 @@ class Database:
         handinfo = self.get_gameinfo_from_hid(hand)
         gametypeId = handinfo["gametypeId"]
 
+        if stat_cache is not None:
+            key = (gametypeId, stylekey, agg_bb_mult, seats_min, seats_max)
+            h_key = (gametypeId, h_stylekey, h_agg_bb_mult, h_seats_min, h_seats_max)
+            for playerid, t_dict in self.get_stats_from_hand_cached(hand, stat_cache, cache_owner, hero_id, key, h_key).iteritems():
+                if (playerid == hero_id and h_stat_range != 'S') or (playerid != hero_id and stat_range != 'S'):
+                    stat_dict[playerid] = t_dict
+            return stat_dict
+
         query = 'get_stats_from_hand_aggregated'
         subs = (hand
                ,hero_id, stylekey, agg_bb_mult, agg_bb_mult, gametypeId, seats_min, seats_max  # hero params
@@ -1248,6 +1441,125 @@ class Database:
 
         return stat_dict
 
+    def get_stats_from_hand_cached(self, hand, stat_cache, owner, hero_id, key, h_key):
+        """Keep the HudCache totals of the players at all tables in stat_cache and
+           return copies of them for the players in hand.
+           The totals are kept per (playerId, aggregation key) and shared by all
+           tables, key and h_key are the (gametypeId, stylekey, agg_bb_mult, seats_min,
+           seats_max) of opponents and hero at owner's table. Totals not cached yet are
+           fetched with get_stats_from_hand_aggregated. After that every hand imported
+           since the last call, whatever table it was played at, is added once from
+           get_stats_from_hand_delta to each cached total it counts towards.
+           owner holds on to the totals of the players in its latest hand, totals no
+           owner holds on to any more are dropped."""
+        if 'totals' not in stat_cache:
+            stat_cache.setdefault('closed', [])
+            stat_cache.update({'totals': {}, 'players': {}, 'refs': {}, 'last_hand': None
+                              ,'similar': {}, 'gametypes': set()})
+        totals, players = stat_cache['totals'], stat_cache['players']
+        while stat_cache['closed']:
+            self.drop_cached_stats(stat_cache, stat_cache['closed'].pop(), set())
+
+        query = self.sql.query['get_stats_from_hand_delta']
+        if self.db_server == 'mysql':
+            query = query.replace("<signed>", 'signed ')
+        else:
+            query = query.replace("<signed>", '')
+        last_hand = max(self.get_last_hand() or hand, hand)
+        first = stat_cache['last_hand']
+        if first is None:
+            first = last_hand
+        c = self.get_cursor()
+        c.execute(query, (min(first, hand - 1), last_hand))
+        colnames = [desc[0].lower() for desc in c.description]
+        sums = [name for name in colnames if name not in ('player_id', 'seat', 'screen_name', 'hand_id', 'gametype_id', 'seats', 'starttime')]
+        this_hand = {}
+        for row in c.fetchall():
+            d = dict(zip(colnames, row))
+            if d['hand_id'] == hand:
+                this_hand[d['player_id']] = d
+            if d['hand_id'] <= first or d['player_id'] not in players:
+                continue
+            # storeHudCache files the hand under this styleKey
+            if self.build_full_hudcache:
+                tz = utc_offset()
+                td = timedelta(hours=self.day_start + tz.seconds/3600)
+                styleKey = datetime.strftime(d['starttime'] - td, 'd%y%m%d')
+            else:
+                styleKey = 'A000000'
+            for k in players[d['player_id']]:
+                (gametypeId, stylekey, agg_bb_mult, seats_min, seats_max) = k
+                if (styleKey > stylekey and seats_min <= d['seats'] <= seats_max
+                    and d['gametype_id'] in self.get_similar_gametypes(stat_cache, gametypeId, agg_bb_mult, d['gametype_id'])):
+                    t_dict = totals[(d['player_id'], k)]
+                    for name in sums:
+                        t_dict[name] = (t_dict[name] or 0) + (d[name] or 0)
+        stat_cache['last_hand'] = last_hand
+
+        keys = dict((playerid, (h_key if playerid == hero_id else key)) for playerid in this_hand)
+        if [playerid for playerid in keys if (playerid, keys[playerid]) not in totals]:
+            # somebody not cached yet sat down, load them from HudCache
+            (gametypeId, stylekey, agg_bb_mult, seats_min, seats_max) = key
+            (gametypeId, h_stylekey, h_agg_bb_mult, h_seats_min, h_seats_max) = h_key
+            subs = (hand
+                   ,hero_id, stylekey, agg_bb_mult, agg_bb_mult, gametypeId, seats_min, seats_max
+                   ,hero_id, h_stylekey, h_agg_bb_mult, h_agg_bb_mult, gametypeId, h_seats_min, h_seats_max)
+            stime = time()
+            c.execute(self.sql.query['get_stats_from_hand_aggregated'], subs)
+            log.info("HudCache query get_stats_from_hand_aggregated took %.3f seconds" % (time() - stime))
+            names = [desc[0].lower() for desc in c.description]
+            loaded = dict((row[0], dict(zip(names, row))) for row in c.fetchall())
+            for playerid, k in keys.iteritems():
+                if (playerid, k) not in totals:
+                    # no HudCache rows in range yet, start from zero
+                    d = this_hand[playerid]
+                    totals[(playerid, k)] = loaded.get(playerid) or dict((name, 0 if name in sums else d[name]) for name in names)
+                    players.setdefault(playerid, set()).add(k)
+        self.drop_cached_stats(stat_cache, owner, set(keys.iteritems()))
+
+        stat_dict = {}
+        for playerid, k in keys.iteritems():
+            t_dict = totals[(playerid, k)]
+            if t_dict['n']:
+                stat_dict[playerid] = dict(t_dict, seat = this_hand[playerid]['seat'])
+        return stat_dict
+
+    def get_similar_gametypes(self, stat_cache, gametypeId, agg_bb_mult, newId):
+        """Return the ids of the gametypes the HUD aggregates with gametypeId.
+           The sets are kept in stat_cache until a gametype newer than them (newId)
+           turns up."""
+        if newId not in stat_cache['gametypes']:
+            c = self.get_cursor()
+            c.execute(self.sql.query['get_gametype_ids'])
+            stat_cache['gametypes'] = set(row[0] for row in c.fetchall())
+            stat_cache['similar'].clear()
+        similar = stat_cache['similar']
+        if (gametypeId, agg_bb_mult) not in similar:
+            c = self.get_cursor()
+            c.execute(self.sql.query['get_similar_gametypes'], (agg_bb_mult, agg_bb_mult, gametypeId))
+            similar[(gametypeId, agg_bb_mult)] = set(row[0] for row in c.fetchall())
+        return similar[(gametypeId, agg_bb_mult)]
+
+    def drop_cached_stats(self, stat_cache, owner, keep):
+        """Make keep, a set of (playerId, aggregation key), what owner holds on to in
+           stat_cache and drop the totals nobody holds on to any more"""
+        refs = stat_cache['refs']
+        old = refs.pop(owner, set())
+        if keep:
+            refs[owner] = keep
+        for (playerid, k) in old - keep:
+            if not [r for r in refs.itervalues() if (playerid, k) in r]:
+                del stat_cache['totals'][(playerid, k)]
+                stat_cache['players'][playerid].discard(k)
+                if not stat_cache['players'][playerid]:
+                    del stat_cache['players'][playerid]
+
+    def release_cached_stats(self, stat_cache, owner):
+        """owner (a table whose HUD is gone) no longer needs its totals in stat_cache.
+           Only noted here, they are dropped by the next get_stats_from_hand_cached,
+           as this may be called from another thread."""
+        stat_cache.setdefault('closed', []).append(owner)
+
     # uses query on handsplayers instead of hudcache to get stats on just this session
     def get_stats_from_hand_session(self, hand, stat_dict, hero_id
                                    ,stat_range, seats_min, seats_max
@@ -1379,9 +1691,12 @@ class Database:
             raise
         return ret
     
-    def prepareBulkImport(self):
+    def prepareBulkImport(self, spanFiles=False):
         """Drop some indexes/foreign keys to prepare for bulk import.
-           Currently keeping the standalone indexes as needed to import quickly"""
+           Currently keeping the standalone indexes as needed to import quickly.
+           On sqlite the secondary indexes of sqliteBulkTables are dropped, the
+           page cache and memory map enlarged and, with spanFiles, commits are
+           left to fileImported so a transaction spans many files"""
         stime = time()
         c = self.get_cursor()
         # sc: don't think autocommit=0 is needed, should already be in that mode
@@ -1389,6 +1704,20 @@ class Database:
             c.execute("SET foreign_key_checks=0")
             c.execute("SET autocommit=0")
             return
+        if self.backend == self.SQLITE:
+            c.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN (%s)"
+                      % ', '.join("'%s'" % t for t in self.sqliteBulkTables))
+            self.bulkIndexes += [(name, sql) for (name, sql) in c.fetchall() if not re.match(r'\s*CREATE\s+UNIQUE', sql, re.I)]
+            for (name, sql) in self.bulkIndexes:
+                log.info(_("Dropping index:") + " " + name)
+                c.execute("DROP INDEX IF EXISTS %s" % name)
+            c.execute("PRAGMA cache_size=-%d" % self.sqliteBulkCacheSize)
+            c.execute("PRAGMA mmap_size=%d" % self.sqliteBulkMmapSize)
+            self.commit()
+            if spanFiles:
+                self.bulkFiles = 0
+            print (_("prepare import took %s seconds") % (time() - stime))
+            return
         if self.backend == self.PGSQL:
             self.connection.set_isolation_level(0)   # allow table/index operations to work
         for fk in self.foreignKeys[self.backend]:
@@ -1488,6 +1817,18 @@ class Database:
             c.execute("SET foreign_key_checks=1")
             c.execute("SET autocommit=1")
             return
+        if self.backend == self.SQLITE:
+            self.bulkFiles = None
+            self.commit()
+            for (name, sql) in self.bulkIndexes:
+                log.info(_("Creating index %s") % name)
+                c.execute(re.sub('INDEX', 'INDEX IF NOT EXISTS', sql, 1, re.I))
+            self.bulkIndexes = []
+            c.execute("PRAGMA cache_size=-2000")      # sqlite's default
+            c.execute("PRAGMA mmap_size=0")
+            self.commit()
+            print (_("After import took %s seconds") % (time() - stime))
+            return
 
         if self.backend == self.PGSQL:
             self.connection.set_isolation_level(0)   # allow table/index operations to work
@@ -1579,6 +1920,7 @@ class Database:
         """(Re-)creates the tables of the current DB"""
 
         self.drop_tables()
+        self.resetPlayerCache()
         self.resetCache()
         self.resetBulkCache()
         self.create_tables()
@@ -1917,7 +2259,7 @@ class Database:
         c.execute("INSERT INTO Rank (id,name) VALUES ('9', 'Quads')")
         c.execute("INSERT INTO Rank (id,name) VALUES ('10', 'StFlush')")
         #Fill StartCards
-        sql = "INSERT INTO StartCards (category, name, rank, combinations) VALUES (%s, %s, %s, %s)".replace('%s', self.sql.query['placeholder'])
+        sql = self.sql.query['insertStartCards']
         for i in range(170):
             (name, rank, combinations) = Card.StartCardRank(i)
             c.execute(sql,  ('holdem', name, rank, combinations))
@@ -2134,7 +2476,7 @@ class Database:
                         + "   or (    hp.playerId in " + str(tuple(self.hero_ids.values())) \
                         + "       and h.startTime > '" + h_start + "'))" \
                         + "   AND hp.tourneysPlayersId IS NULL)"
-            rebuild_sql_cash = self.sql.query['rebuildCache'].replace('%s', self.sql.query['placeholder'])
+            rebuild_sql_cash = self.sql.query['rebuildCache']
             rebuild_sql_cash = rebuild_sql_cash.replace('<tourney_join_clause>', "")
             rebuild_sql_cash = rebuild_sql_cash.replace('<where_clause>', where)
             rebuild_sql_cash = self.replace_statscache('ring', table, rebuild_sql_cash)
@@ -2156,7 +2498,7 @@ class Database:
                     + "   or (    hp.playerId in " + str(tuple(self.hero_ids.values())) \
                     + "       and h.startTime > '" + h_start + "'))" \
                     + "   AND hp.tourneysPlayersId >= 0)"
-        rebuild_sql_tourney = self.sql.query['rebuildCache'].replace('%s', self.sql.query['placeholder'])
+        rebuild_sql_tourney = self.sql.query['rebuildCache']
         rebuild_sql_tourney = rebuild_sql_tourney.replace('<tourney_join_clause>', """INNER JOIN Tourneys t ON (t.id = h.tourneyId)""")
         rebuild_sql_tourney = rebuild_sql_tourney.replace('<where_clause>', where)
         rebuild_sql_tourney = self.replace_statscache('tour', table, rebuild_sql_tourney)
@@ -2167,11 +2509,11 @@ class Database:
     #end def rebuild_cache
     
     def update_timezone(self, tz_name):
-        select_W     = self.sql.query['select_W'].replace('%s', self.sql.query['placeholder'])
-        select_M     = self.sql.query['select_M'].replace('%s', self.sql.query['placeholder'])
-        insert_W     = self.sql.query['insert_W'].replace('%s', self.sql.query['placeholder'])
-        insert_M     = self.sql.query['insert_M'].replace('%s', self.sql.query['placeholder'])
-        update_WM_S  = self.sql.query['update_WM_S'].replace('%s', self.sql.query['placeholder'])
+        select_W     = self.sql.query['select_W']
+        select_M     = self.sql.query['select_M']
+        insert_W     = self.sql.query['insert_W']
+        insert_M     = self.sql.query['insert_M']
+        update_WM_S  = self.sql.query['update_WM_S']
         c = self.get_cursor()
         c.execute("SELECT id, sessionStart, weekId wid, monthId mid FROM Sessions")
         sessions = self.fetchallDict(c,['id','sessionStart','wid', 'mid'])
@@ -2304,7 +2646,9 @@ class Database:
     #end def lock_for_insert
     
     def resetBulkCache(self, reconnect=False):
-        self.siteHandNos = []         # cache of siteHandNo
+        self.siteHandNos = set()      # cache of siteHandNo
+        self.dupsChecked = set()      # keys looked up by checkDuplicates
+        self.dupsFound   = set()      # keys checkDuplicates found in the db
         self.hbulk       = []         # Hands bulk inserts
         self.bbulk       = []         # Boards bulk inserts
         self.hpbulk      = []         # HandsPlayers bulk inserts
@@ -2320,20 +2664,18 @@ class Database:
         self.tc          = {}         # TourneysCache bulk updates
         self.hids        = []         # hand ids in order of hand bulk inserts
         #self.tids        = []         # tourney ids in order of hp bulk inserts
-        if reconnect: self.do_connect(self.config)
+        # while commits span files the connection is kept, reconnecting would throw away
+        # the files fileImported has yet to commit and the bulk import pragmas
+        if reconnect and self.bulkFiles is None: self.do_connect(self.config)
         
     def executemany(self, c, q, values):
-        if self.backend == self.PGSQL and self.import_options['hhBulkPath'] != "":
-            # COPY much faster under postgres. Requires superuser privileges
-            m = re_insert.match(q)
-            rand = ''.join(random.SystemRandom().choice(string.ascii_uppercase + string.digits) for _ in range(5))
-            bulk_file = os.path.join(self.import_options['hhBulkPath'], m.group("TABLENAME") + '_' + rand)
-            with open(bulk_file, 'wb') as csvfile:
-                writer = csv.writer(csvfile, delimiter='\t', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-                writer.writerows(w for w in values)
-            q_insert = "COPY " + m.group("TABLENAME") + m.group("COLUMNS") + " FROM '" + bulk_file + "' DELIMITER '\t' CSV"
-            c.execute(q_insert)
-            os.remove(bulk_file)
+        m = re_insert.match(q) if self.backend == self.PGSQL else None
+        if m:
+            # COPY much faster under postgres. Streamed from the client, so no temp
+            # file on the server and no superuser privileges needed
+            import psycopg2.extensions
+            encoding = psycopg2.extensions.encodings[self.connection.encoding]
+            c.copy_expert(COPY_STDIN % (m.group("TABLENAME"), m.group("COLUMNS")), CopyStream(values, encoding))
         else:            
             batch_size=20000 #experiment to find optimal batch_size for your data
             while values: # repeat until all records in values have been inserted ''
@@ -2393,9 +2735,8 @@ class Database:
             self.appendHandsSessionIds()
             self.updateTourneysSessions()
             q = self.sql.query['store_hand']
-            q = q.replace('%s', self.sql.query['placeholder'])
             c = self.get_cursor()
-            c.executemany(q, self.hbulk)
+            self.executemany(c, q, self.hbulk) #c.executemany(q, self.hbulk)
             self.commit()
     
     def storeBoards(self, id, boards, doinsert):
@@ -2404,13 +2745,12 @@ class Database:
                 self.bbulk += [[id] + b]
         if doinsert and self.bbulk:
             q = self.sql.query['store_boards']
-            q = q.replace('%s', self.sql.query['placeholder'])
             c = self.get_cursor()
             self.executemany(c, q, self.bbulk) #c.executemany(q, self.bbulk)
     
     def updateTourneysSessions(self):
         if self.tbulk:
-            q_update_sessions  = self.sql.query['updateTourneysSessions'].replace('%s', self.sql.query['placeholder'])
+            q_update_sessions  = self.sql.query['updateTourneysSessions']
             c = self.get_cursor()
             for t, sid in self.tbulk.iteritems():
                 c.execute(q_update_sessions,  (sid, t))
@@ -2425,18 +2765,12 @@ class Database:
 
         hpbulk = self.hpbulk
         for p, pvalue in pdata.iteritems():
-            # Add (hid, pids[p]) + all the values in pvalue at the
-            # keys in HANDS_PLAYERS_KEYS to hpbulk.
-            bulk_data = [pvalue[key] for key in HANDS_PLAYERS_KEYS]
-            bulk_data.append(pids[p])
-            bulk_data.append(hid)
-            bulk_data.reverse()
-            hpbulk.append(bulk_data)
+            # (hid, pids[p]) + the HANDS_PLAYERS_KEYS columns of the row
+            hpbulk.append((hid, pids[p]) + pvalue.pick(HANDS_PLAYERS_KEYS))
 
         if doinsert:
             #self.appendHandsPlayersSessionIds()
             q = self.sql.query['store_hands_players']
-            q = q.replace('%s', self.sql.query['placeholder'])
             c = self.get_cursor(True)
             self.executemany(c, q, self.hpbulk) #c.executemany(q, self.hpbulk)
             
@@ -2444,7 +2778,6 @@ class Database:
         self.htbulk += tdata
         if doinsert and self.htbulk:
             q = self.sql.query['store_hands_pots']
-            q = q.replace('%s', self.sql.query['placeholder'])
             c = self.get_cursor()
             self.executemany(c, q, self.htbulk) #c.executemany(q, self.hsbulk)
 
@@ -2474,7 +2807,6 @@ class Database:
             
         if doinsert:
             q = self.sql.query['store_hands_actions']
-            q = q.replace('%s', self.sql.query['placeholder'])
             c = self.get_cursor()
             self.executemany(c, q, self.habulk) #c.executemany(q, self.habulk)
     
@@ -2482,7 +2814,6 @@ class Database:
         self.hsbulk += sdata
         if doinsert and self.hsbulk:
             q = self.sql.query['store_hands_stove']
-            q = q.replace('%s', self.sql.query['placeholder'])
             c = self.get_cursor()
             self.executemany(c, q, self.hsbulk) #c.executemany(q, self.hsbulk)
             
@@ -2490,7 +2821,7 @@ class Database:
         """Update cached statistics. If update fails because no record exists, do an insert."""
                 
         if pdata:   
-            tz = datetime.utcnow() - datetime.today()
+            tz = utc_offset()
             tz_offset = tz.seconds/3600
             tz_day_start_offset = self.day_start + tz_offset
             
@@ -2513,8 +2844,7 @@ class Database:
                       ,player_stats['tourneyTypeId']
                       ,styleKey if self.build_full_hudcache else 'A000000'
                       )
-                player_stats['n'] = 1
-                line = [int(player_stats[s]) if isinstance(player_stats[s],bool) else player_stats[s] for s in CACHE_KEYS]
+                line = cache_line(player_stats)
                     
                 hud = self.hcbulk.get(k)
                 # Add line to the old line in the hudcache.
@@ -2525,40 +2855,60 @@ class Database:
                     self.hcbulk[k] = line
                 
         if doinsert:
-            update_hudcache = self.sql.query['update_hudcache']
-            update_hudcache = update_hudcache.replace('%s', self.sql.query['placeholder'])
-            insert_hudcache = self.sql.query['insert_hudcache']
-            insert_hudcache = insert_hudcache.replace('%s', self.sql.query['placeholder'])
-            
-            select_hudcache_ring = self.sql.query['select_hudcache_ring']
-            select_hudcache_ring = select_hudcache_ring.replace('%s', self.sql.query['placeholder'])
-            select_hudcache_tour = self.sql.query['select_hudcache_tour']
-            select_hudcache_tour = select_hudcache_tour.replace('%s', self.sql.query['placeholder'])
-            inserts = []
             c = self.get_cursor()
-            for k, item in self.hcbulk.iteritems():
-                
-                if not k[4]:
-                    q = select_hudcache_ring
-                    row = list(k[:4]) + [k[-1]]
-                else:
-                    q = select_hudcache_tour
-                    row = list(k)
-                
-                c.execute(q, row)
-                result = c.fetchone()
-                if result:
-                    id = result[0]
-                    update = item + [id]
-                    c.execute(update_hudcache, update)
-                    
-                else:
-                    inserts.append(list(k) + item)
-                
-            if inserts:
-                self.executemany(c, insert_hudcache, inserts)
+            rows = [list(k) + item for k, item in self.hcbulk.iteritems()]
+            self.mergeCache(c, 'HudCache', ['gametypeId', 'playerId', 'seats', 'position', 'tourneyTypeId', 'styleKey'], rows)
             self.commit()
             
+    def mergeCache(self, c, table, keys, rows, sums = CACHE_KEYS, mins = [], maxs = [], inserts = [], nullable = ['tourneyTypeId']):
+        """Merge rows into table with a handful of set based statements instead of a
+           select and update per row. Each row is its key columns, then the insert only,
+           min, max and summed columns in that order. The rows are loaded into a temp
+           table, existing rows updated from it in one statement and the rest inserted
+           in another. ON CONFLICT/ON DUPLICATE KEY can't be used as the compound
+           indexes include tourneyTypeId, which is NULL for ring games."""
+        if not rows:
+            return
+        delta = table + 'Delta'
+        columns = keys + inserts + mins + maxs + sums
+        def fill(q, **kw):
+            for k, v in kw.iteritems():
+                q = q.replace('<%s>' % k, v)
+            return q.replace('<table>', table).replace('<delta>', delta)
+        def col(q, name):
+            return q.replace('<col>', name)
+        match = ' AND '.join(col(self.sql.query['mergeCacheNullMatch'], k) if k in nullable else col('T.<col>=D.<col>', k) for k in keys)
+        target = self.sql.query['mergeCacheColumn']
+        sets  = [col(target, s) + col('=T.<col>+D.<col>', s) for s in sums]
+        sets += [col(target, s) + col('=CASE WHEN T.<col> IS NULL OR D.<col> < T.<col> THEN D.<col> ELSE T.<col> END', s) for s in mins]
+        sets += [col(target, s) + col('=CASE WHEN T.<col> IS NULL OR D.<col> > T.<col> THEN D.<col> ELSE T.<col> END', s) for s in maxs]
+
+        if delta not in self.cacheDeltas:
+            # once per connection, sqlite3 commits before any CREATE
+            c.execute(fill(self.sql.query['createCacheDelta'], columns=', '.join(columns)))
+            self.cacheDeltas.add(delta)
+        c.execute(fill(self.sql.query['clearCacheDelta']))
+        p = self.sql.query['placeholder']
+        q = fill(self.sql.query['insertCacheDelta'], columns=', '.join(columns), values=', '.join([p] * len(columns)))
+        self.executemany(c, q, rows)
+        if self.sql.query['mergeCacheUpdate'] is not None:
+            c.execute(fill(self.sql.query['mergeCacheUpdate'], match=match, set=', '.join(sets)))
+        else:
+            # no UPDATE ... FROM, look up the ids in one go and update by id
+            c.execute(fill(self.sql.query['mergeCacheIds'], match=match, columns=', '.join('D.' + s for s in sums + mins + maxs)))
+            updates = []
+            for r in c.fetchall():
+                r, ns = list(r), len(sums)
+                updates.append(r[1:ns+1] + [v for v in r[ns+1:] for i in (0, 1)] + r[:1])
+            if updates:
+                q  = [col('<col>=<col>+<p>', s) for s in sums]
+                q += [col('<col>=CASE WHEN <col> IS NULL OR <p> < <col> THEN <p> ELSE <col> END', s) for s in mins]
+                q += [col('<col>=CASE WHEN <col> IS NULL OR <p> > <col> THEN <p> ELSE <col> END', s) for s in maxs]
+                q = 'UPDATE %s SET %s WHERE id=<p>' % (table, ', '.join(q))
+                c.executemany(q.replace('<p>', p), updates)
+        c.execute(fill(self.sql.query['mergeCacheInsert'], match=match
+                      ,columns=', '.join(columns), dcolumns=', '.join('D.' + s for s in columns)))
+
     def storeSessions(self, hid, pids, startTime, tid, heroes, tz_name, doinsert = False):
         """Update cached sessions. If no record exists, do an insert"""
         THRESHOLD     = timedelta(seconds=int(self.sessionTimeout * 60))
@@ -2645,18 +2995,18 @@ class Database:
                 self.s['bk'].append(hand)
         
         if doinsert:
-            select_S     = self.sql.query['select_S'].replace('%s', self.sql.query['placeholder'])
-            select_W     = self.sql.query['select_W'].replace('%s', self.sql.query['placeholder'])
-            select_M     = self.sql.query['select_M'].replace('%s', self.sql.query['placeholder'])
-            update_S     = self.sql.query['update_S'].replace('%s', self.sql.query['placeholder'])
-            insert_W     = self.sql.query['insert_W'].replace('%s', self.sql.query['placeholder'])
-            insert_M     = self.sql.query['insert_M'].replace('%s', self.sql.query['placeholder'])
-            insert_S     = self.sql.query['insert_S'].replace('%s', self.sql.query['placeholder'])
-            update_S_SC  = self.sql.query['update_S_SC'].replace('%s', self.sql.query['placeholder'])
-            update_S_TC  = self.sql.query['update_S_TC'].replace('%s', self.sql.query['placeholder'])
-            update_S_T   = self.sql.query['update_S_T'].replace('%s', self.sql.query['placeholder'])
-            update_S_H   = self.sql.query['update_S_H'].replace('%s', self.sql.query['placeholder'])
-            delete_S     = self.sql.query['delete_S'].replace('%s', self.sql.query['placeholder'])
+            select_S     = self.sql.query['select_S']
+            select_W     = self.sql.query['select_W']
+            select_M     = self.sql.query['select_M']
+            update_S     = self.sql.query['update_S']
+            insert_W     = self.sql.query['insert_W']
+            insert_M     = self.sql.query['insert_M']
+            insert_S     = self.sql.query['insert_S']
+            update_S_SC  = self.sql.query['update_S_SC']
+            update_S_TC  = self.sql.query['update_S_TC']
+            update_S_T   = self.sql.query['update_S_T']
+            update_S_H   = self.sql.query['update_S_H']
+            delete_S     = self.sql.query['delete_S']
             c = self.get_cursor()
             for i in range(len(self.s['bk'])):                
                 lower = self.s['bk'][i]['sessionStart'] - THRESHOLD
@@ -2759,8 +3109,7 @@ class Database:
                 hp['startTime'] = startTime.replace(tzinfo=None)
                 hp['hid']           = hid
                 hp['ids']           = []
-                pdata[p]['n']   = 1
-                hp['line'] = [int(pdata[p][s]) if isinstance(pdata[p][s],bool) else pdata[p][s] for s in CACHE_KEYS]
+                hp['line'] = cache_line(pdata[p])
                 id = []
                 sessionplayer = self.sc.get(k)
                 if sessionplayer is not None:        
@@ -2803,10 +3152,10 @@ class Database:
                     self.sc[k].append(hp)
         
         if doinsert:
-            select_SC    = self.sql.query['select_SC'].replace('%s', self.sql.query['placeholder'])
-            update_SC    = self.sql.query['update_SC'].replace('%s', self.sql.query['placeholder'])
-            insert_SC    = self.sql.query['insert_SC'].replace('%s', self.sql.query['placeholder'])
-            delete_SC    = self.sql.query['delete_SC'].replace('%s', self.sql.query['placeholder'])
+            select_SC    = self.sql.query['select_SC']
+            update_SC    = self.sql.query['update_SC']
+            insert_SC    = self.sql.query['insert_SC']
+            delete_SC    = self.sql.query['delete_SC']
             c = self.get_cursor()
             for k, sessionplayer in self.sc.iteritems():
                 for session in sessionplayer:
@@ -2872,8 +3221,7 @@ class Database:
                 k = (tid
                     ,pids[p]
                     )
-                pdata[p]['n'] = 1
-                line = [int(pdata[p][s]) if isinstance(pdata[p][s], bool) else pdata[p][s] for s in CACHE_KEYS]
+                line = cache_line(pdata[p])
                 tourplayer = self.tc.get(k)
                 # Add line to the old line in the tourcache.
                 if tourplayer is not None:
@@ -2897,41 +3245,15 @@ class Database:
                     self.tc[k]['endTime']    = startTime
                 
         if doinsert:
-            update_TC = self.sql.query['update_TC'].replace('%s', self.sql.query['placeholder'])
-            insert_TC = self.sql.query['insert_TC'].replace('%s', self.sql.query['placeholder'])
-            select_TC = self.sql.query['select_TC'].replace('%s', self.sql.query['placeholder'])
-            
-            inserts = []
+            rows = []
             c = self.get_cursor()
             for k, tc in self.tc.iteritems():
                 sc = self.s.get(tc['hid'])
                 tc['startTime'] = tc['startTime'].replace(tzinfo=None)
                 tc['endTime']   = tc['endTime'].replace(tzinfo=None)
-                c.execute(select_TC, k)
-                r = self.fetchallDict(c, ['id', 'startTime', 'endTime'])
-                num = len(r)
-                if (num == 1):
-                    update = not r[0]['startTime'] or not r[0]['endTime']
-                    if (update or (tc['startTime']<r[0]['startTime'] and tc['endTime']>r[0]['endTime'])):
-                        q = update_TC.replace('<UPDATE>', 'startTime=%s, endTime=%s,')
-                        row = [tc['startTime'], tc['endTime']] + tc['line'] + list(k[:2])
-                    elif tc['startTime']<r[0]['startTime']:
-                        q = update_TC.replace('<UPDATE>', 'startTime=%s, ')
-                        row = [tc['startTime']] + tc['line'] + list(k[:2])
-                    elif tc['endTime']>r[0]['endTime']:
-                        q = update_TC.replace('<UPDATE>', 'endTime=%s, ')
-                        row = [tc['endTime']] + tc['line'] + list(k[:2])
-                    else:
-                        q = update_TC.replace('<UPDATE>', '')
-                        row = tc['line'] + list(k[:2])
-                    c.execute(q, row)
-                elif (num == 0):
-                    row = [sc['id'], tc['startTime'], tc['endTime']] + list(k[:2]) + tc['line']
-                    #append to the bulk inserts
-                    inserts.append(row)
-                
-            if inserts:
-                self.executemany(c, insert_TC, inserts)
+                rows.append(list(k[:2]) + [sc['id'], tc['startTime'], tc['endTime']] + tc['line'])
+            self.mergeCache(c, 'TourneysCache', ['tourneyId', 'playerId'], rows
+                           ,mins = ['startTime'], maxs = ['endTime'], inserts = ['sessionId'], nullable = [])
             self.commit()
     
     def storeCardsCache(self, hid, pids, startTime, gametypeId, tourneyTypeId, pdata, heroes, tz_name, doinsert):
@@ -2944,26 +3266,11 @@ class Database:
                   ,pids[p]
                   ,pdata[p]['startCards']
                   )
-            pdata[p]['n'] = 1
-            line = [int(pdata[p][s]) if isinstance(pdata[p][s], bool) else pdata[p][s] for s in CACHE_KEYS]
+            line = cache_line(pdata[p])
             self.dcbulk[k] = line
                 
         if doinsert:
-            update_cardscache = self.sql.query['update_cardscache']
-            update_cardscache = update_cardscache.replace('%s', self.sql.query['placeholder'])
-            insert_cardscache = self.sql.query['insert_cardscache']
-            insert_cardscache = insert_cardscache.replace('%s', self.sql.query['placeholder'])
-            select_cardscache_ring = self.sql.query['select_cardscache_ring']
-            select_cardscache_ring = select_cardscache_ring.replace('%s', self.sql.query['placeholder'])
-            select_cardscache_tour = self.sql.query['select_cardscache_tour']
-            select_cardscache_tour = select_cardscache_tour.replace('%s', self.sql.query['placeholder'])
-            
-            select_W     = self.sql.query['select_W'].replace('%s', self.sql.query['placeholder'])
-            select_M     = self.sql.query['select_M'].replace('%s', self.sql.query['placeholder'])
-            insert_W     = self.sql.query['insert_W'].replace('%s', self.sql.query['placeholder'])
-            insert_M     = self.sql.query['insert_M'].replace('%s', self.sql.query['placeholder'])
-            
-            dccache, inserts = {}, []
+            dccache = {}
             for k, l in self.dcbulk.iteritems():
                 sc = self.s.get(k[0])
                 if sc != None:                    
@@ -2980,26 +3287,9 @@ class Database:
                             dccache[n] = l
 
             c = self.get_cursor()
-            for k, item in dccache.iteritems():
-                if k[3]:
-                    q = select_cardscache_tour
-                    row = list(k)
-                else:
-                    q = select_cardscache_ring
-                    row = list(k[:3]) + list(k[-2:])
-                c.execute(q, row)
-                result = c.fetchone()
-                if result:
-                    id = result[0]
-                    update = item + [id]
-                    c.execute(update_cardscache, update)                 
-                else:
-                    insert = list(k) + item
-                    inserts.append(insert)
-                
-            if inserts:
-                self.executemany(c, insert_cardscache, inserts)
-                self.commit()
+            rows = [list(k) + item for k, item in dccache.iteritems()]
+            self.mergeCache(c, 'CardsCache', ['weekId', 'monthId', 'gametypeId', 'tourneyTypeId', 'playerId', 'startCards'], rows)
+            self.commit()
             
     def storePositionsCache(self, hid, pids, startTime, gametypeId, tourneyTypeId, pdata, hdata, heroes, tz_name, doinsert):
         """Update cached position statistics. If update fails because no record exists, do an insert."""
@@ -3014,27 +3304,11 @@ class Database:
                   ,hdata['maxPosition']
                   ,position
                   )
-            pdata[p]['n'] = 1
-            line = [int(pdata[p][s]) if isinstance(pdata[p][s],bool) else pdata[p][s] for s in CACHE_KEYS]
+            line = cache_line(pdata[p])
             self.pcbulk[k] = line
                 
         if doinsert:
-            update_positionscache = self.sql.query['update_positionscache']
-            update_positionscache = update_positionscache.replace('%s', self.sql.query['placeholder'])
-            insert_positionscache = self.sql.query['insert_positionscache']
-            insert_positionscache = insert_positionscache.replace('%s', self.sql.query['placeholder'])
-            
-            select_positionscache_ring = self.sql.query['select_positionscache_ring']
-            select_positionscache_ring = select_positionscache_ring.replace('%s', self.sql.query['placeholder'])
-            select_positionscache_tour = self.sql.query['select_positionscache_tour']
-            select_positionscache_tour = select_positionscache_tour.replace('%s', self.sql.query['placeholder'])
-            
-            select_W     = self.sql.query['select_W'].replace('%s', self.sql.query['placeholder'])
-            select_M     = self.sql.query['select_M'].replace('%s', self.sql.query['placeholder'])
-            insert_W     = self.sql.query['insert_W'].replace('%s', self.sql.query['placeholder'])
-            insert_M     = self.sql.query['insert_M'].replace('%s', self.sql.query['placeholder'])
-                
-            pccache, inserts = {}, []
+            pccache = {}
             for k, l in self.pcbulk.iteritems():
                 sc = self.s.get(k[0])
                 if sc != None:
@@ -3051,27 +3325,9 @@ class Database:
                             pccache[n] = l
             
             c = self.get_cursor()
-            for k, item in pccache.iteritems():
-                if k[3]:
-                    q = select_positionscache_tour
-                    row = list(k)
-                else:
-                    q = select_positionscache_ring
-                    row = list(k[:3]) + list(k[-4:])
-                
-                c.execute(q, row)
-                result = c.fetchone()
-                if result:
-                    id = result[0]
-                    update = item + [id]
-                    c.execute(update_positionscache, update)
-                else:
-                    insert = list(k) + item
-                    inserts.append(insert)
-                
-            if inserts:
-                self.executemany(c, insert_positionscache, inserts)
-                self.commit()
+            rows = [list(k) + item for k, item in pccache.iteritems()]
+            self.mergeCache(c, 'PositionsCache', ['weekId', 'monthId', 'gametypeId', 'tourneyTypeId', 'playerId', 'seats', 'maxPosition', 'position'], rows)
+            self.commit()
     
     def appendHandsSessionIds(self):
         for i in range(len(self.hbulk)):
@@ -3084,7 +3340,6 @@ class Database:
                 
     def get_id(self, file):
         q = self.sql.query['get_id']
-        q = q.replace('%s', self.sql.query['placeholder'])
         c = self.get_cursor()
         c.execute(q, (file,))
         id = c.fetchone()
@@ -3094,7 +3349,6 @@ class Database:
 
     def storeFile(self, fdata):
         q = self.sql.query['store_file']
-        q = q.replace('%s', self.sql.query['placeholder'])
         c = self.get_cursor()
         c.execute(q, fdata)
         id = self.get_last_insert_id(c)
@@ -3102,7 +3356,6 @@ class Database:
         
     def updateFile(self, fdata):
         q = self.sql.query['update_file']
-        q = q.replace('%s', self.sql.query['placeholder'])
         c = self.get_cursor()
         c.execute(q, fdata)
 
@@ -3145,43 +3398,137 @@ class Database:
         return id
 
     def isDuplicate(self, siteId, siteHandNo, heroSeat, publicDB):
-        q = self.sql.query['isAlreadyInDB'].replace('%s', self.sql.query['placeholder'])
+        q = self.sql.query['isAlreadyInDB']
         if publicDB:
             key = (siteHandNo, siteId, heroSeat)
-            q = q.replace('<heroSeat>', ' AND heroSeat=%s').replace('%s', self.sql.query['placeholder'])
+            q = q.replace('<heroSeat>', ' AND heroSeat=' + self.sql.query['placeholder'])
         else:
             key = (siteHandNo, siteId)
             q = q.replace('<heroSeat>', '')
         if key in self.siteHandNos:
             return True
-        c = self.get_cursor()
-        c.execute(q, key)
-        result = c.fetchall()
-        if len(result) > 0:
-            return True
-        self.siteHandNos.append(key)
+        if key in self.dupsChecked:
+            if key in self.dupsFound:
+                return True
+        else:
+            c = self.get_cursor()
+            c.execute(q, key)
+            result = c.fetchall()
+            if len(result) > 0:
+                return True
+        self.siteHandNos.add(key)
         return False
+
+    def checkDuplicates(self, keys):
+        """Look up the (siteHandNo, siteId[, heroSeat]) keys of a whole file with a
+           few chunked IN (...) queries. Returns the keys that are already in the db
+           and remembers the answer, so isDuplicate doesn't query again for them."""
+        bysite = {}
+        for key in keys:
+            try:
+                bysite.setdefault(key[1], {})[(int(key[0]),) + tuple(key[2:])] = key
+            except (TypeError, ValueError):
+                pass    # not a number, leave it to isDuplicate
+        q = self.sql.query['areAlreadyInDB']
+        if len(keys) and len(keys[0]) == 3:
+            q = q.replace('<heroSeat>', ', H.heroSeat')
+        else:
+            q = q.replace('<heroSeat>', '')
+        found = set()
+        c = self.get_cursor()
+        for siteId, wanted in bysite.iteritems():
+            handNos = sorted(set(k[0] for k in wanted))
+            for i in xrange(0, len(handNos), self.dupCheckSize):
+                chunk = handNos[i:i+self.dupCheckSize]
+                c.execute(q.replace('<siteHandNos>', ', '.join([self.sql.query['placeholder']] * len(chunk)))
+                         ,[siteId] + chunk)
+                for row in c.fetchall():
+                    key = wanted.get(tuple(int(v) for v in row))
+                    if key is not None:
+                        found.add(key)
+            self.dupsChecked.update(wanted.itervalues())
+        self.dupsFound.update(found)
+        return found
     
     def getSqlPlayerIDs(self, pnames, siteid, hero):
         result = {}
         if(self.pcache == None):
-            self.pcache = LambdaDict(lambda  key:self.insertPlayer(key[0], key[1], key[2]))
+            self.pcache = _player_ids.setdefault(self.playerCacheKey(), {})
 
         for player in pnames:
-            result[player] = self.pcache[(player,siteid,player==hero)]
-            # NOTE: Using the LambdaDict does the same thing as:
-            #if player in self.pcache:
-            #    #print "DEBUG: cachehit"
-            #    pass
-            #else:
-            #    self.pcache[player] = self.insertPlayer(player, siteid)
-            #result[player] = self.pcache[player]
+            key = (player,siteid,player==hero)
+            id = self.pcache.get(key) or self.pnew.get(key)
+            if id is None:
+                id = self.pnew[key] = self.insertPlayer(player, siteid, player==hero)
+            result[player] = id
 
         return result
-    
-    def insertPlayer(self, name, site_id, hero):
-        insert_player = "INSERT INTO Players (name, siteId, hero, chars) VALUES (%s, %s, %s, %s)"
-        insert_player = insert_player.replace('%s', self.sql.query['placeholder'])
+
+    def cachePlayerIDs(self, players):
+        """Look up the (name, siteId, hero) players of a whole file with a few
+           chunked IN (...) queries, inserting the ones that are new in bulk, so
+           getSqlPlayerIDs finds them all in its cache. Names the db matches
+           differently (eg. case insensitive collations) are left to insertPlayer."""
+        if(self.pcache == None):
+            self.pcache = _player_ids.setdefault(self.playerCacheKey(), {})
+        bysite = {}
+        for key in players:
+            if key not in self.pcache and key not in self.pnew:
+                bysite.setdefault(key[1], {}).setdefault(self.playerRow(*key)[0], []).append(key)
+        c = self.get_cursor()
+        for siteId, wanted in bysite.iteritems():
+            (found, similar) = self.fetchPlayerIDs(c, siteId, wanted.keys())
+            updates, inserts = [], []
+            for _name, keys in wanted.iteritems():
+                if _name in found:
+                    (id, hero) = found[_name]
+                    if not hero and [k for k in keys if k[2]]:
+                        updates.append((True, _name, siteId))
+                    for key in keys:
+                        self.pnew[key] = id
+                elif _name.lower() not in similar:
+                    inserts.append(self.playerRow(keys[0][0], siteId, bool([k for k in keys if k[2]])))
+            if updates:
+                c.executemany(self.sql.query['updatePlayerHero'], updates)
+            if inserts:
+                c.executemany(self.sql.query['insertPlayer'], inserts)
+                (found, similar) = self.fetchPlayerIDs(c, siteId, [row[0] for row in inserts])
+                for (_name, (id, hero)) in found.iteritems():
+                    for key in wanted[_name]:
+                        self.pnew[key] = id
+
+    def fetchPlayerIDs(self, c, siteId, names):
+        """Return {name: (id, hero)} for the names in Players, and the lowercased
+           names of all the rows returned"""
+        found, similar = {}, set()
+        q = self.sql.query['getPlayerIdsByNames']
+        for i in xrange(0, len(names), self.playerChunkSize):
+            chunk = names[i:i+self.playerChunkSize]
+            c.execute(q.replace('<names>', ', '.join([self.sql.query['placeholder']] * len(chunk)))
+                     ,[siteId] + chunk)
+            for (id, name, hero) in c.fetchall():
+                name = Charset.to_db_utf8(name)
+                found[name] = (id, hero)
+                similar.add(name.lower())
+        return (found, similar)
+
+    def playerCacheKey(self):
+        return (self.backend, self.host, self.database)
+
+    def resetPlayerCache(self):
+        # cleared in place, the other Database objects of this database hold the same dict
+        _player_ids.setdefault(self.playerCacheKey(), {}).clear()
+        self.pcache = None
+        self.pnew = {}
+
+    def keepPlayerIds(self):
+        """Adds the PlayerIds found since the last commit to _player_ids, once committed"""
+        if self.pnew:
+            _player_ids.setdefault(self.playerCacheKey(), {}).update(self.pnew)
+            self.pnew = {}
+
+    def playerRow(self, name, site_id, hero):
+        """(name, siteId, hero, chars) of a new Players row"""
         _name = Charset.to_db_utf8(name)[:32]
         if re_char.match(_name[0]):
             char = '123'
@@ -3189,8 +3536,11 @@ class Database:
             char = _name[0] + '1'
         else:
             char = _name[:2]
-        
-        key = (_name, site_id, hero, char.upper())
+        return (_name, site_id, hero, char.upper())
+    
+    def insertPlayer(self, name, site_id, hero):
+        insert_player = self.sql.query['insertPlayer']
+        key = self.playerRow(name, site_id, hero)
         
         #NOTE/FIXME?: MySQL has ON DUPLICATE KEY UPDATE
         #Usage:
@@ -3202,8 +3552,7 @@ class Database:
         #print "DEBUG: name: %s site: %s" %(name, site_id)
         result = None
         c = self.get_cursor()
-        q = "SELECT id, name, hero FROM Players WHERE name=%s and siteid=%s"
-        q = q.replace('%s', self.sql.query['placeholder'])
+        q = self.sql.query['getPlayerByName']
         result = self.insertOrUpdate('players', c, key, q, insert_player)
         return result
     
@@ -3220,9 +3569,7 @@ class Database:
             result = tmp[0]
             if type=='players':
                 if not tmp[2] and key[2]:
-                    q = "UPDATE Players SET hero=%s WHERE name=%s and siteid=%s"
-                    q = q.replace('%s', self.sql.query['placeholder'])
-                    cursor.execute (q, (key[2], key[0], key[1]))
+                    cursor.execute (self.sql.query['updatePlayerHero'], (key[2], key[0], key[1]))
         return result
     
     def getSqlGameTypeId(self, siteid, game, printdata = False):
@@ -3256,7 +3603,6 @@ class Database:
         result = None
         c = self.get_cursor()
         q = self.sql.query['getGametypeNL']
-        q = q.replace('%s', self.sql.query['placeholder'])
         c.execute(q, gtinfo)
         tmp = c.fetchone()
         if (tmp == None):
@@ -3268,7 +3614,7 @@ class Database:
                 pp.pprint(gtinsert)
                 print ("###### End Gametype ########")
                 
-            c.execute(self.sql.query['insertGameTypes'].replace('%s', self.sql.query['placeholder']), gtinsert)
+            c.execute(self.sql.query['insertGameTypes'], gtinsert)
             result = self.get_last_insert_id(c)
         else:
             result = tmp[0]
@@ -3276,7 +3622,7 @@ class Database:
     
     def getTourneyInfo(self, siteName, tourneyNo):
         c = self.get_cursor()
-        q = self.sql.query['getTourneyInfo'].replace('%s', self.sql.query['placeholder'])
+        q = self.sql.query['getTourneyInfo']
         c.execute(q, (siteName, tourneyNo))
         columnNames=c.description
 
@@ -3323,7 +3669,7 @@ class Database:
         ttid, _ttid, updateDb = None, None, False
         setattr(obj, 'limitType', obj.gametype['limitType'])
         cursor = self.get_cursor()
-        q = self.sql.query['getTourneyTypeIdByTourneyNo'].replace('%s', self.sql.query['placeholder'])
+        q = self.sql.query['getTourneyTypeIdByTourneyNo']
         cursor.execute(q, (obj.tourNo, obj.siteId))
         result=cursor.fetchone()
         
@@ -3361,7 +3707,7 @@ class Database:
                    obj.isMultiEntry, obj.isReEntry, obj.isHomeGame, obj.isNewToGame, obj.isSplit, obj.isFifty50, obj.isTime,
                    obj.timeAmt, obj.isSatellite, obj.isDoubleOrNothing, obj.isCashOut, obj.isOnDemand, obj.isFlighted, 
                    obj.isGuarantee, obj.guaranteeAmt)
-            cursor.execute (self.sql.query['getTourneyTypeId'].replace('%s', self.sql.query['placeholder']), row)
+            cursor.execute (self.sql.query['getTourneyTypeId'], row)
             tmp=cursor.fetchone()
             try:
                 ttid = tmp[0]
@@ -3372,11 +3718,11 @@ class Database:
                     pp = pprint.PrettyPrinter(indent=4)
                     pp.pprint(row)
                     print ("###### End Tourneys ########")
-                cursor.execute (self.sql.query['insertTourneyType'].replace('%s', self.sql.query['placeholder']), row)
+                cursor.execute (self.sql.query['insertTourneyType'], row)
                 ttid = self.get_last_insert_id(cursor)
             if updateDb:
                 #print 'DEBUG createOrUpdateTourneyType:', 'old', oldttid, 'new', ttid, row
-                q = self.sql.query['updateTourneyTypeId'].replace('%s', self.sql.query['placeholder'])
+                q = self.sql.query['updateTourneyTypeId']
                 cursor.execute(q, (ttid, obj.siteId, obj.tourNo))
                 self.ttold.add(oldttid)
                 self.ttnew.add(ttid)
@@ -3392,13 +3738,13 @@ class Database:
                 tables = ('CardsCache', 'PositionsCache')
             else:
                 tables = set([])
-            select = self.sql.query['selectTourneyWithTypeId'].replace('%s', self.sql.query['placeholder'])
-            delete = self.sql.query['deleteTourneyTypeId'].replace('%s', self.sql.query['placeholder'])
+            select = self.sql.query['selectTourneyWithTypeId']
+            delete = self.sql.query['deleteTourneyTypeId']
             cursor = self.get_cursor()
             for ttid in self.ttold:
                 for t in tables:
                     statement = 'clear%sTourneyType' % t
-                    clear  = self.sql.query[statement].replace('%s', self.sql.query['placeholder'])
+                    clear  = self.sql.query[statement]
                     cursor.execute(clear, (ttid,))
                 self.commit()                
                 cursor.execute(select, (ttid,))
@@ -3409,12 +3755,12 @@ class Database:
             for ttid in self.ttnew:
                 for t in tables:
                     statement = 'clear%sTourneyType' % t
-                    clear  = self.sql.query[statement].replace('%s', self.sql.query['placeholder'])
+                    clear  = self.sql.query[statement]
                     cursor.execute(clear, (ttid,))
                 self.commit()
             for t in tables:
                 statement = 'fetchNew%sTourneyTypeIds' % t
-                fetch  = self.sql.query[statement].replace('%s', self.sql.query['placeholder'])
+                fetch  = self.sql.query[statement]
                 cursor.execute(fetch)
                 for id in cursor.fetchall():
                     self.rebuild_cache(None, None, t, id[0])
@@ -3422,16 +3768,16 @@ class Database:
                     
     def cleanUpWeeksMonths(self):
         if self.cacheSessions and self.wmold:
-            selectWeekId = self.sql.query['selectSessionWithWeekId'].replace('%s', self.sql.query['placeholder'])
-            selectMonthId = self.sql.query['selectSessionWithMonthId'].replace('%s', self.sql.query['placeholder'])
-            deleteWeekId = self.sql.query['deleteWeekId'].replace('%s', self.sql.query['placeholder'])
-            deleteMonthId = self.sql.query['deleteMonthId'].replace('%s', self.sql.query['placeholder'])
+            selectWeekId = self.sql.query['selectSessionWithWeekId']
+            selectMonthId = self.sql.query['selectSessionWithMonthId']
+            deleteWeekId = self.sql.query['deleteWeekId']
+            deleteMonthId = self.sql.query['deleteMonthId']
             cursor = self.get_cursor()
             weeks, months, wmids = set(), set(), set()
             for (wid, mid) in self.wmold:
                 for t in ('CardsCache', 'PositionsCache'):
                     statement = 'clear%sWeeksMonths' % t
-                    clear  = self.sql.query[statement].replace('%s', self.sql.query['placeholder'])
+                    clear  = self.sql.query[statement]
                     cursor.execute(clear, (wid, mid))
                 self.commit()
                 weeks.add(wid)
@@ -3454,14 +3800,14 @@ class Database:
             for (wid, mid) in self.wmnew:
                 for t in ('CardsCache', 'PositionsCache'):
                     statement = 'clear%sWeeksMonths' % t
-                    clear  = self.sql.query[statement].replace('%s', self.sql.query['placeholder'])
+                    clear  = self.sql.query[statement]
                     cursor.execute(clear, (wid, mid))
                 self.commit()
                     
             if self.wmold:
                 for t in ('CardsCache', 'PositionsCache'):
                     statement = 'fetchNew%sWeeksMonths' % t
-                    fetch  = self.sql.query[statement].replace('%s', self.sql.query['placeholder'])
+                    fetch  = self.sql.query[statement]
                     cursor.execute(fetch)
                     for (wid, mid) in cursor.fetchall():
                         wmids.add((wid, mid))         
@@ -3497,13 +3843,12 @@ class Database:
         result = None
         c = self.get_cursor()
         q = self.sql.query['getTourneyByTourneyNo']
-        q = q.replace('%s', self.sql.query['placeholder'])
         t = hand.startTime.replace(tzinfo=None)
         c.execute (q, (hand.siteId, hand.tourNo))
 
         tmp = c.fetchone()
         if (tmp == None): 
-            c.execute (self.sql.query['insertTourney'].replace('%s', self.sql.query['placeholder']),
+            c.execute (self.sql.query['insertTourney'],
                         (hand.tourneyTypeId, None, hand.tourNo, None, None,
                          t, t, hand.tourneyName, None, None, None, None, None, None))
             result = self.get_last_insert_id(c)
@@ -3517,16 +3862,16 @@ class Database:
                 startTime, endTime = resultDict['startTime'], resultDict['endTime']
                 
             if (startTime == None or t < startTime):
-                q = self.sql.query['updateTourneyStart'].replace('%s', self.sql.query['placeholder'])
+                q = self.sql.query['updateTourneyStart']
                 c.execute(q, (t, result))
             elif (endTime == None or t > endTime):
-                q = self.sql.query['updateTourneyEnd'].replace('%s', self.sql.query['placeholder'])
+                q = self.sql.query['updateTourneyEnd']
                 c.execute(q, (t, result))                
         return result
     
     def createOrUpdateTourney(self, summary):
         cursor = self.get_cursor()
-        q = self.sql.query['getTourneyByTourneyNo'].replace('%s', self.sql.query['placeholder'])
+        q = self.sql.query['getTourneyByTourneyNo']
         cursor.execute(q, (summary.siteId, summary.tourNo))
 
         columnNames=[desc[0] for desc in cursor.description]
@@ -3556,7 +3901,7 @@ class Database:
                 #    if (resultDict[ev] < summary.startTime):
                 #        summary.startTime=resultDict[ev]
             if updateDb:
-                q = self.sql.query['updateTourney'].replace('%s', self.sql.query['placeholder'])
+                q = self.sql.query['updateTourney']
                 startTime, endTime = None, None
                 if (summary.startTime!=None): startTime = summary.startTime.replace(tzinfo=None)
                 if (summary.endTime!=None): endTime = summary.endTime.replace(tzinfo=None)
@@ -3578,7 +3923,7 @@ class Database:
                 pp = pprint.PrettyPrinter(indent=4)
                 pp.pprint(row)
                 print ("###### End Tourneys ########")
-            cursor.execute (self.sql.query['insertTourney'].replace('%s', self.sql.query['placeholder']), row)
+            cursor.execute (self.sql.query['insertTourney'], row)
             tourneyId = self.get_last_insert_id(cursor)
         return tourneyId
     #end def createOrUpdateTourney
@@ -3611,13 +3956,12 @@ class Database:
         result = None
         c = self.get_cursor()
         q = self.sql.query['getTourneysPlayersByIds']
-        q = q.replace('%s', self.sql.query['placeholder'])
 
         c.execute (q, (tourneyId, playerId, entryId))
 
         tmp = c.fetchone()
         if (tmp == None): #new player
-            c.execute (self.sql.query['insertTourneysPlayer'].replace('%s',self.sql.query['placeholder'])
+            c.execute (self.sql.query['insertTourneysPlayer']
                       ,(tourneyId, playerId, entryId, None, None, None, None, None, None))
             #Get last id might be faster here.
             #c.execute ("SELECT id FROM Players WHERE name=%s", (name,))
@@ -3629,7 +3973,7 @@ class Database:
     def updateTourneyPlayerBounties(self, hand):
         updateDb = False
         cursor = self.get_cursor()
-        q = self.sql.query['updateTourneysPlayerBounties'].replace('%s', self.sql.query['placeholder'])
+        q = self.sql.query['updateTourneysPlayerBounties']
         for player, tourneysPlayersId in hand.tourneysPlayersIds.iteritems():
             if player in hand.koCounts:
                 cursor.execute(q, (
@@ -3643,7 +3987,7 @@ class Database:
     def createOrUpdateTourneysPlayers(self, summary):
         tourneysPlayersIds, tplayers, inserts = {}, [], []
         cursor = self.get_cursor()
-        cursor.execute (self.sql.query['getTourneysPlayersByTourney'].replace('%s', self.sql.query['placeholder']),
+        cursor.execute (self.sql.query['getTourneysPlayersByTourney'],
                             (summary.tourneyId,))
         result=cursor.fetchall()
         if result: tplayers += [i for i in result]
@@ -3652,7 +3996,7 @@ class Database:
             for entryIdx in range(len(entries)):
                 entryId = entries[entryIdx]
                 if (playerId,entryId) in tplayers:
-                    cursor.execute (self.sql.query['getTourneysPlayersByIds'].replace('%s', self.sql.query['placeholder']),
+                    cursor.execute (self.sql.query['getTourneysPlayersByIds'],
                                     (summary.tourneyId, playerId, entryId))
                     columnNames=[desc[0] for desc in cursor.description]
                     result=cursor.fetchone()
@@ -3678,7 +4022,7 @@ class Database:
                         elif summaryDict[player][entryIdx]!=None and not resultDict[ev[1]]:#object has this value but DB doesnt, so update DB
                             updateDb=True
                     if updateDb:
-                        q = self.sql.query['updateTourneysPlayer'].replace('%s', self.sql.query['placeholder'])
+                        q = self.sql.query['updateTourneysPlayer']
                         inputs = (summary.ranks[player][entryIdx],
                                   summary.winnings[player][entryIdx],
                                   summary.winningsCurrency[player][entryIdx],
@@ -3704,7 +4048,7 @@ class Database:
                         summary.koCounts[player][entryIdx]
                     ))
         if inserts:
-            self.executemany(cursor, self.sql.query['insertTourneysPlayer'].replace('%s', self.sql.query['placeholder']), inserts)
+            self.executemany(cursor, self.sql.query['insertTourneysPlayer'], inserts)
             
     
 #end class Database
@@ -22,6 +22,7 @@ import Card
 from decimal_wrapper import Decimal, ROUND_DOWN
 
 import sys
+import operator
 import logging
 # logging has been set up in fpdb.py or HUD_main.py, use their settings:
 log = logging.getLogger("parser")
@@ -30,7 +31,8 @@ try:
     from pokereval import PokerEval
     pokereval = PokerEval()
 except:
-    pokereval = None
+    from Evaluator import PokerEval
+    pokereval = PokerEval(seed=0)   # the same hand gets the same allInEV whenever it is imported
     
 def _buildStatsInitializer():
     init = {}
@@ -124,6 +126,59 @@ def _buildStatsInitializer():
 
 _INIT_STATS = _buildStatsInitializer()
 
+# The layout of a HandsPlayer row, every stat getStats works out for a player
+HANDS_PLAYERS_COLUMNS = (tuple(sorted(_INIT_STATS))
+                        + ('startCash', 'seatNo', 'sitout', 'tourneysPlayersId')
+                        + tuple('card%d' % i for i in range(1, 21)))
+_COLUMN = dict((c, i) for (i, c) in enumerate(HANDS_PLAYERS_COLUMNS))
+# The row a player starts a hand with, assembleHandsPlayers sets the columns left None
+_DEFAULT_ROW = [_INIT_STATS.get(c) for c in HANDS_PLAYERS_COLUMNS]
+_pickers = {}
+
+class HandsPlayer(object):
+    """The stats of one player in one hand, a row of HANDS_PLAYERS_COLUMNS.
+       A list rather than a 150 key dict is kept for every player of every
+       hand. getStats reads and writes it by name like the dict, Database
+       takes its columns with pick()."""
+    __slots__ = ('row',)
+
+    def __init__(self):
+        self.row = list(_DEFAULT_ROW)
+
+    def pick(self, columns):
+        """The values of columns, a tuple of column names, as a tuple"""
+        picker = _pickers.get(columns)
+        if picker is None:
+            picker = _pickers[columns] = operator.itemgetter(*[_COLUMN[c] for c in columns])
+        return picker(self.row)
+
+    def __getitem__(self, key):
+        return self.row[_COLUMN[key]]
+
+    def __setitem__(self, key, value):
+        self.row[_COLUMN[key]] = value
+
+    def __contains__(self, key):
+        return key in _COLUMN
+
+    def __iter__(self):
+        return iter(HANDS_PLAYERS_COLUMNS)
+
+    def __len__(self):
+        return len(HANDS_PLAYERS_COLUMNS)
+
+    def get(self, key, default=None):
+        return self.row[_COLUMN[key]] if key in _COLUMN else default
+
+    def keys(self):
+        return list(HANDS_PLAYERS_COLUMNS)
+
+    def iteritems(self):
+        return iter(zip(HANDS_PLAYERS_COLUMNS, self.row))
+
+    def __repr__(self):
+        return repr(dict(zip(HANDS_PLAYERS_COLUMNS, self.row)))
+
 class DerivedStats():
     def __init__(self):
         self.hands        = {}
@@ -134,7 +189,7 @@ class DerivedStats():
 
     def getStats(self, hand):
         for player in hand.players:
-            self.handsplayers[player[1]] = _INIT_STATS.copy()
+            self.handsplayers[player[1]] = HandsPlayer()
         
         self.assembleHands(hand)
         self.assembleHandsPlayers(hand)
@@ -382,7 +437,8 @@ class DerivedStats():
                     self.handsactions[k]['allIn'] = act[-1]
                     if act[-1]: 
                         self.handsplayers[act[0]]['wentAllIn'] = True
-                        self.handsplayers[act[0]]['street%dAllIn' %(i-1)] = True
+                        if i > 0: # all in posting the blinds or antes has no street column
+                            self.handsplayers[act[0]]['street%dAllIn' %(i-1)] = True
     
     def assembleHandsStove(self, hand):
         category = hand.gametype['category']
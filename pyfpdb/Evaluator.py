@@ -0,0 +1,500 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Evaluator.py
+
+Poker hand evaluator and equity calculator, used by DerivedStats in place of
+the pokereval C extension when that is not installed. PokerEval implements
+the part of the pypoker-eval interface fpdb uses - best(), winners(),
+poker_eval() and card2string() - for the evaluators named in Card.games.
+
+Hands are ranked with lookup tables: a flush by the rank bitmask of its suit,
+anything else by a key adding up 5**rank for each card, which identifies the
+ranks held and how often. Equities are enumerated exactly when there are no
+more boards to deal than the budget, otherwise a Monte Carlo sample of budget
+boards is taken. With a seed the sample only depends on the seed and the
+cards, not on what was evaluated before. With NumPy installed the boards are
+evaluated in batches.
+"""
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#    In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import L10n
+_ = L10n.get_translation()
+
+#    Standard Library modules
+import random
+from itertools import combinations
+
+#    Other Library modules
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+RANKS = '23456789TJQKA'
+SUITS = 'hdcs'
+NOCARD = 255
+
+NOPAIR, ONEPAIR, TWOPAIR, TRIPS, STRAIGHT, FLUSH, FLHOUSE, QUADS, STFLUSH = range(9)
+HANDNAMES = ('NoPair', 'OnePair', 'TwoPair', 'Trips', 'Straight', 'Flush', 'FlHouse', 'Quads', 'StFlush')
+LOW_NOTHING = (STFLUSH + 1) << 24   # worse than any low
+OMAHA_COST = 5      # about how many hold'em boards ranking an omaha board costs, its sample is that much smaller
+
+# evaluator: (hi rules, low rules, number of pocket cards to play with the board)
+GAMES = {  'holdem' : ('hi', None, None),
+            'omaha' : ('hi', None, 2),
+           'omaha8' : ('hi', 'low8', 2),
+            '7stud' : ('hi', None, None),
+           '7stud8' : ('hi', 'low8', None),
+          'lowball' : (None, 'a5', None),
+        'lowball27' : (None, '27', None),
+        }
+
+_KEY = [5 ** (c % 13) for c in xrange(52)]        # no more than four of a rank, so base 5
+_BIT = [1 << (c % 13) for c in xrange(52)]
+_LOWBIT = [1 << ((c + 1) % 13) for c in xrange(52)]   # ace low: A=bit 0 ... 8=bit 7, K=bit 12
+_BITCOUNT = [bin(m).count('1') for m in xrange(8192)]
+_STRAIGHTS = [(0x1f << (top - 4), top) for top in xrange(12, 3, -1)] + [(0x100f, 3)]
+
+_rank_values = {}       # rank key -> hi value ignoring flushes, filled in as keys turn up
+_flush_values = {}      # rank bitmask of a suit -> flush or straight flush value
+
+
+def _pack(type, ranks):
+    value, shift = type << 24, 16
+    for r in ranks:
+        value |= r << shift
+        shift -= 4
+    return value
+
+def _straight(mask, wheel=True):
+    for bits, top in _STRAIGHTS:
+        if mask & bits == bits and (wheel or top > 3):
+            return top
+    return -1
+
+def _counts_value(counts, straights=True, wheel=True):
+    """Hi value of the best five cards that can be made from the rank counts,
+       flushes aside"""
+    ranks = [r for r in xrange(12, -1, -1) if counts[r]]
+    grouped = sorted(ranks, key=lambda r: -counts[r])
+    top = grouped[0]
+    if counts[top] >= 4:
+        return _pack(QUADS, [top] + [r for r in ranks if r != top][:1])
+    if counts[top] == 3:
+        pairs = [r for r in ranks if r != top and counts[r] >= 2]
+        if pairs:
+            return _pack(FLHOUSE, [top, pairs[0]])
+    if straights:
+        mask = sum(1 << r for r in ranks)
+        high = _straight(mask, wheel)
+        if high >= 0:
+            return _pack(STRAIGHT, [high])
+    if counts[top] == 3:
+        return _pack(TRIPS, [top] + [r for r in ranks if r != top][:2])
+    if counts[top] == 2:
+        pairs = [r for r in ranks if counts[r] == 2][:2]
+        if len(pairs) == 2:
+            return _pack(TWOPAIR, pairs + [r for r in ranks if r not in pairs][:1])
+        return _pack(ONEPAIR, [top] + [r for r in ranks if r != top][:3])
+    return _pack(NOPAIR, ranks[:5])
+
+def _rank_value(key):
+    value = _rank_values.get(key)
+    if value is None:
+        value = _rank_values[key] = _counts_value([key // 5 ** r % 5 for r in xrange(13)])
+    return value
+
+def _flush_value(mask):
+    value = _flush_values.get(mask)
+    if value is None:
+        high = _straight(mask)
+        if high >= 0:
+            value = _pack(STFLUSH, [high])
+        else:
+            value = _pack(FLUSH, [r for r in xrange(12, -1, -1) if mask & (1 << r)][:5])
+        _flush_values[mask] = value
+    return value
+
+def _low8_value(mask):
+    """Value of the lowest five distinct ranks eight or under in an ace low
+       rank bitmask, LOW_NOTHING if there aren't five of them"""
+    ranks = [r for r in xrange(8) if mask & (1 << r)]
+    if len(ranks) < 5:
+        return LOW_NOTHING
+    return _pack(NOPAIR, ranks[4::-1])
+
+def eval_hi(cards):
+    """Hi value of the best five of 5 to 7 cards, higher is better.
+       With seven cards or less a flush can't be beaten by a full house or quads,
+       so a suit with five cards decides the hand."""
+    key, masks = 0, [0, 0, 0, 0]
+    for c in cards:
+        key += _KEY[c]
+        masks[c // 13] |= _BIT[c]
+    for mask in masks:
+        if _BITCOUNT[mask] >= 5:
+            return _flush_value(mask)
+    return _rank_value(key)
+
+def eval_low8(cards):
+    """Ace to five low, eight or better, lower is better"""
+    mask = 0
+    for c in cards:
+        mask |= _LOWBIT[c]
+    return _low8_value(mask & 0xff)
+
+def eval_a5(cards):
+    """Ace to five lowball: no qualifier, straights and flushes don't count,
+       lower is better"""
+    if len(cards) > 5:
+        return min(eval_a5(five) for five in combinations(cards, 5))
+    counts = [0] * 13
+    for c in cards:
+        counts[(c + 1) % 13] += 1
+    return _counts_value(counts, straights=False)
+
+def eval_27(cards):
+    """Deuce to seven lowball: aces are high, straights and flushes count,
+       lower is better"""
+    if len(cards) > 5:
+        return min(eval_27(five) for five in combinations(cards, 5))
+    counts, masks = [0] * 13, [0, 0, 0, 0]
+    for c in cards:
+        counts[c % 13] += 1
+        masks[c // 13] |= _BIT[c]
+    for mask in masks:
+        if _BITCOUNT[mask] == 5:
+            high = _straight(mask, wheel=False)
+            if high >= 0:
+                return _pack(STFLUSH, [high])
+            return _pack(FLUSH, [r for r in xrange(12, -1, -1) if mask & (1 << r)])
+    return _counts_value(counts, wheel=False)
+
+_EVALS = {'hi': eval_hi, 'low8': eval_low8, 'a5': eval_a5, '27': eval_27}
+
+
+def _np_tables():
+    """The lookup tables as arrays, built on first use"""
+    global _np_key, _np_bit, _np_lowbit, _np_bitcount, _np_flush, _np_low8
+    if _np_key is None:
+        _np_key = numpy.array(_KEY, dtype=numpy.int64)
+        _np_bit = numpy.array(_BIT + [0], dtype=numpy.int64)
+        _np_lowbit = numpy.array(_LOWBIT, dtype=numpy.int64)
+        _np_bitcount = numpy.array(_BITCOUNT, dtype=numpy.int64)
+        _np_flush = numpy.array([_flush_value(m) if _BITCOUNT[m] >= 5 else 0 for m in xrange(8192)], dtype=numpy.int64)
+        _np_low8 = numpy.array([_low8_value(m) for m in xrange(256)], dtype=numpy.int64)
+
+_np_key = None
+
+def np_eval_hi(cards):
+    """eval_hi of each row of an (n, 5..7) array of cards"""
+    _np_tables()
+    keys = _np_key[cards].sum(axis=1)
+    uniq, inverse = numpy.unique(keys, return_inverse=True)
+    values = numpy.array([_rank_value(k) for k in uniq.tolist()], dtype=numpy.int64)[inverse]
+    suits = cards // 13
+    for s in xrange(4):
+        masks = numpy.where(suits == s, _np_bit[cards], 0).sum(axis=1)
+        values = numpy.where(_np_bitcount[masks] >= 5, _np_flush[masks], values)
+    return values
+
+def np_eval_low8(cards):
+    """eval_low8 of each row of an (n, 5..7) array of cards"""
+    _np_tables()
+    masks = numpy.bitwise_or.reduce(_np_lowbit[cards], axis=1)
+    return _np_low8[masks & 0xff]
+
+_NP_EVALS = {'hi': np_eval_hi, 'low8': np_eval_low8}
+
+
+class PokerEval(object):
+    """Stands in for pokereval.PokerEval.
+       iterations asks for that many Monte Carlo samples, or for exhaustive
+       enumeration when 0. Either is limited to budget boards (a fifth of
+       that in the omaha games): a sample of that many is taken where
+       enumerating would deal more."""
+
+    def __init__(self, budget=None, seed=None):
+        if budget is None:
+            budget = 50000 if numpy else 10000
+        self.budget = budget
+        self.seed = seed
+        self.random = random.Random(seed)
+
+    def string2card(self, card):
+        if card in ('__', NOCARD):
+            return NOCARD
+        if isinstance(card, (int, long)):
+            return card
+        return SUITS.index(card[1].lower()) * 13 + RANKS.index(card[0].upper())
+
+    def card2string(self, cards):
+        if isinstance(cards, (list, tuple)):
+            return [self.card2string(c) for c in cards]
+        if cards == NOCARD:
+            return '__'
+        return RANKS[cards % 13] + SUITS[cards // 13]
+
+    def best(self, side, hand, board=[]):
+        """Return (value, [name, card, ...]) for the best five cards of hand.
+           When a board is given omaha rules apply: two cards from hand and
+           three from board. side is 'hi' (higher values better) or 'low' (ace to
+           five eight or better, lower values better, 'Nothing' if there is none)."""
+        hand = [self.string2card(c) for c in hand]
+        board = [self.string2card(c) for c in board]
+        if len(hand + board) < 5:
+            return False
+        if board:
+            fives = [h + b for h in combinations(hand, 2) for b in combinations(board, 3)]
+        else:
+            fives = list(combinations(hand, 5))
+        if side == 'hi':
+            value, five = max((eval_hi(five), five) for five in fives)
+            type = value >> 24
+            ranks = [c % 13 for c in five]
+            cards = sorted(five, key=lambda c: (ranks.count(c % 13), c % 13), reverse=True)
+            if type in (STRAIGHT, STFLUSH) and (value >> 16) & 0xf == 3:
+                cards = cards[1:] + cards[:1]       # the wheel runs 5432A
+        else:
+            value, five = min((eval_low8(five), five) for five in fives)
+            if value == LOW_NOTHING:
+                return value, ['Nothing']
+            type = NOPAIR
+            cards = sorted(five, key=lambda c: (c + 1) % 13, reverse=True)
+        return value, [HANDNAMES[type]] + cards
+
+    def winners(self, game, pockets, board=[], dead=[], **kwargs):
+        """Return {'hi': [index, ...], 'low': [index, ...]} for the pockets
+           winning each side of the pot. Pockets with unknown cards can't win,
+           and 'low' is left out if nobody makes one."""
+        index = [i for i, p in enumerate(pockets) if not [c for c in p if c in ('__', NOCARD)]]
+        result = self.poker_eval(game, [pockets[i] for i in index], board, dead)
+        (count, haslopot, hashipot) = result['info']
+        winners = {'hi': [], 'low': []}
+        for i, e in zip(index, result['eval']):
+            if e['winhi'] or e['tiehi']:
+                winners['hi'].append(i)
+            if e['winlo'] or e['tielo']:
+                winners['low'].append(i)
+        if not haslopot or not winners['low']:
+            del winners['low']
+        if not hashipot:
+            del winners['hi']
+        return winners
+
+    def poker_eval(self, game, pockets, board=[], dead=[], iterations=0, **kwargs):
+        """Deal out the unknown ('__') board cards and return
+           {'info': (samples, haslopot, hashipot),
+            'eval': [{'scoop', 'winhi', 'losehi', 'tiehi', 'winlo', 'loselo', 'tielo', 'ev'}, ...]}
+           with one dict per pocket, ev being its share of the pot in thousandths."""
+        if game not in GAMES:
+            raise ValueError(_("Unsupported game: %s") % game)
+        hirule, lorule, use = GAMES[game]
+        pockets = [[self.string2card(c) for c in p] for p in pockets]
+        board = [self.string2card(c) for c in board]
+        known = [c for c in board if c != NOCARD]
+        unknown = len(board) - len(known)
+        for p in pockets:
+            if NOCARD in p:
+                raise ValueError(_("Unknown pocket cards are not supported"))
+        used = set(known + [self.string2card(c) for c in dead] + [c for p in pockets for c in p])
+        deck = [c for c in xrange(52) if c not in used]
+
+        batch = numpy is not None and lorule in (None, 'low8')
+        deals = 1
+        for i in xrange(unknown):
+            deals = deals * (len(deck) - i) / (i + 1)
+        samples = min(iterations or self.budget, self.budget)
+        if use:
+            samples = max(1, samples / OMAHA_COST)
+        if deals > samples:
+            if self.seed is None:
+                rng = self.random
+            else:
+                rng = random.Random(repr((self.seed, game, pockets, board, sorted(used))))
+            if batch:
+                deals = self._deal_batch(rng, deck, unknown, samples)
+            else:
+                deals = self._deal(rng, deck, unknown, samples)
+        else:
+            deals = list(combinations(deck, unknown))
+
+        if batch and len(deals) > 1:
+            hi, lo = self._evaluate_batch(pockets, known, deals, hirule, lorule, use)
+            results = self._tally_batch(len(pockets), len(deals), hi, lo)
+        else:
+            hi, lo = self._evaluate(pockets, known, deals, hirule, lorule, use)
+            results = self._tally(len(pockets), len(deals), hi, lo)
+        return {'info': (len(deals), int(lorule is not None), int(hirule is not None)), 'eval': results}
+
+    def _deal(self, rng, deck, count, samples):
+        """List of samples random deals of count cards from deck. Each shuffle
+           of the deck is dealt out in full, the deals are each still random."""
+        deck, deals = deck[:], []
+        per_shuffle = len(deck) // count
+        while len(deals) < samples:
+            rng.shuffle(deck)
+            deals.extend(deck[i:i + count] for i in xrange(0, per_shuffle * count, count))
+        return deals[:samples]
+
+    def _deal_batch(self, rng, deck, count, samples):
+        """Array of samples random deals of count cards from deck"""
+        deck = numpy.array(deck, dtype=numpy.int64)
+        state = numpy.random.RandomState(rng.randint(0, 2 ** 31 - 1))
+        deals = state.randint(0, len(deck), (samples, count))
+        while count > 1:
+            ordered = numpy.sort(deals, axis=1)
+            redeal = (ordered[:, 1:] == ordered[:, :-1]).any(axis=1)
+            if not redeal.any():
+                break
+            deals[redeal] = state.randint(0, len(deck), (redeal.sum(), count))
+        return deck[deals]
+
+    def _evaluate(self, pockets, known, deals, hirule, lorule, use):
+        """Values of each pocket on each deal, as lists [pocket][deal]"""
+        hi = [[] for p in pockets] if hirule else None
+        lo = [[] for p in pockets] if lorule else None
+        if hirule and not use:
+            self._evaluate_hi(pockets, known, deals, hi)
+            if not lorule:
+                return hi, lo
+        for deal in deals:
+            board = known + list(deal)
+            for i, p in enumerate(pockets):
+                if use:
+                    fives = [h + b for h in combinations(p, use) for b in combinations(board, 5 - use)]
+                    if hirule:
+                        hi[i].append(max(eval_hi(five) for five in fives))
+                    if lorule:
+                        lo[i].append(min(_EVALS[lorule](five) for five in fives))
+                else:
+                    lo[i].append(_EVALS[lorule](p + board))
+        return hi, lo
+
+    def _evaluate_hi(self, pockets, known, deals, hi):
+        """eval_hi of each pocket plus the board, adding up the board once per
+           deal and only looking for flushes in suits the board makes possible"""
+        pkeys, pmasks = [], []
+        for p in pockets:
+            masks = [0, 0, 0, 0]
+            for c in p:
+                masks[c // 13] |= _BIT[c]
+            pkeys.append(sum(_KEY[c] for c in p))
+            pmasks.append(masks)
+        needed = 5 - max(_BITCOUNT[m] for masks in pmasks for m in masks)
+        kkey, kmasks = 0, [0, 0, 0, 0]
+        for c in known:
+            kkey += _KEY[c]
+            kmasks[c // 13] |= _BIT[c]
+        players = range(len(pockets))
+        for deal in deals:
+            key, masks = kkey, kmasks[:]
+            for c in deal:
+                key += _KEY[c]
+                masks[c // 13] |= _BIT[c]
+            suits = [s for s in xrange(4) if _BITCOUNT[masks[s]] >= needed]
+            for i in players:
+                value = None
+                for s in suits:
+                    mask = masks[s] | pmasks[i][s]
+                    if _BITCOUNT[mask] >= 5:
+                        value = _flush_value(mask)
+                        break
+                if value is None:
+                    value = _rank_values.get(key + pkeys[i]) or _rank_value(key + pkeys[i])
+                hi[i].append(value)
+
+    def _evaluate_batch(self, pockets, known, deals, hirule, lorule, use):
+        """As _evaluate, evaluating all deals at once as arrays [pocket, deal]"""
+        n = len(deals)
+        boards = numpy.hstack([numpy.tile(numpy.array(known, dtype=numpy.int64), (n, 1)),
+                               numpy.array(deals, dtype=numpy.int64).reshape(n, -1)])
+        hi = [] if hirule else None
+        lo = [] if lorule else None
+        for p in pockets:
+            if use:
+                fives = [numpy.hstack([numpy.tile(numpy.array(h, dtype=numpy.int64), (n, 1)), boards[:, list(b)]])
+                         for h in combinations(p, use) for b in combinations(xrange(boards.shape[1]), 5 - use)]
+            else:
+                fives = [numpy.hstack([numpy.tile(numpy.array(p, dtype=numpy.int64), (n, 1)), boards])]
+            if hirule:
+                hi.append(numpy.max([np_eval_hi(f) for f in fives], axis=0))
+            if lorule:
+                lo.append(numpy.min([_NP_EVALS[lorule](f) for f in fives], axis=0))
+        return (numpy.array(hi) if hirule else None), (numpy.array(lo) if lorule else None)
+
+    def _tally(self, players, samples, hi, lo):
+        """Count the wins, ties and losses on each side of the pot and each
+           pocket's share of it. Without a qualifying low the hi side takes all."""
+        outcomes = {}
+        for n in xrange(samples):
+            pots = []
+            if hi is not None:
+                values = [h[n] for h in hi]
+                best = max(values)
+                pots.append(('hi', tuple([i for i, v in enumerate(values) if v == best])))
+            if lo is not None:
+                values = [l[n] for l in lo]
+                best = min(values)
+                if best != LOW_NOTHING:
+                    pots.append(('lo', tuple([i for i, v in enumerate(values) if v == best])))
+            pots = tuple(pots)
+            outcomes[pots] = outcomes.get(pots, 0) + 1
+
+        results = [dict(scoop=0, winhi=0, losehi=0, tiehi=0, winlo=0, loselo=0, tielo=0, ev=0) for i in xrange(players)]
+        share = [0.0] * players
+        for pots, count in outcomes.iteritems():
+            for side, winners in pots:
+                for i in xrange(players):
+                    if i not in winners:
+                        results[i]['lose' + side] += count
+                    elif len(winners) == 1:
+                        results[i]['win' + side] += count
+                    else:
+                        results[i]['tie' + side] += count
+                for i in winners:
+                    share[i] += float(count) / (len(pots) * len(winners))
+            alone = set(winners[0] for side, winners in pots if len(winners) == 1)
+            if len(alone) == 1 and len([w for s, w in pots if len(w) == 1]) == len(pots):
+                results[alone.pop()]['scoop'] += count
+        for r, s in zip(results, share):
+            r['ev'] = int(1000 * s / samples)
+        return results
+
+    def _tally_batch(self, players, samples, hi, lo):
+        """As _tally, for arrays [pocket, deal]"""
+        results = [dict(scoop=0, winhi=0, losehi=0, tiehi=0, winlo=0, loselo=0, tielo=0, ev=0) for i in xrange(players)]
+        pots = []
+        if hi is not None:
+            pots.append(('hi', hi == hi.max(axis=0), numpy.ones(samples, dtype=bool)))
+        if lo is not None:
+            best = lo.min(axis=0)
+            made = best != LOW_NOTHING
+            pots.append(('lo', (lo == best) & made, made))
+        npots = numpy.sum([made for side, win, made in pots], axis=0)
+        share = numpy.zeros((players, samples))
+        alone = numpy.ones((players, samples), dtype=bool)
+        for side, win, made in pots:
+            nwin = win.sum(axis=0)
+            single = win & (nwin == 1)
+            for i, r in enumerate(results):
+                r['win' + side] = int(single[i].sum())
+                r['tie' + side] = int((win[i] & (nwin > 1)).sum())
+                r['lose' + side] = int((~win[i] & made).sum())
+            share += win / numpy.maximum(nwin * npots, 1).astype(float)
+            alone &= single | ~made
+        for i, r in enumerate(results):
+            r['scoop'] = int(alone[i].sum())
+            r['ev'] = int(1000 * share[i].sum() / samples)
+        return results
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""FileWatcher.py
+
+Event driven watching of the hand history directories for the auto importer.
+get_watcher() returns None where no event source is available, in which case
+Importer.runUpdated keeps stat()ing the monitored files on every poll.
+"""
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#    In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import L10n
+_ = L10n.get_translation()
+
+#    Standard Library modules
+import os
+import sys
+import errno
+import struct
+import logging
+
+#    Other Library modules
+import ctypes
+import ctypes.util
+
+log = logging.getLogger("importer")
+
+
+def get_watcher():
+    """Return a watcher for this platform, or None to fall back to polling"""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError), e:
+            log.info(_("inotify not available, polling import directories instead: %s") % e)
+    return None
+
+
+class InotifyWatcher(object):
+    """Watches directory trees with the Linux inotify api.
+       The file descriptor is non blocking, so fileno() can be handed to a
+       QSocketNotifier and changes() called whenever it is readable."""
+
+    IN_MODIFY      = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM  = 0x00000040
+    IN_MOVED_TO    = 0x00000080
+    IN_CREATE      = 0x00000100
+    IN_DELETE      = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW  = 0x00004000
+    IN_IGNORED     = 0x00008000
+    IN_ISDIR       = 0x40000000
+    IN_NONBLOCK    = 0o4000
+    IN_CLOEXEC     = 0o2000000
+
+    WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+                 | IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+    EVENT_HEADER = struct.Struct('iIII')    # wd, mask, cookie, len
+    READ_SIZE = 65536
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.dirs = {}          # watch descriptor -> directory
+        self.overflowed = False # events were lost, the caller has to rescan
+        self.incomplete = False # not every directory could be watched, the caller has to keep polling
+
+    def fileno(self):
+        return self.fd
+
+    def add_directory(self, dir):
+        """Watch dir and every directory below it"""
+        if dir in self.dirs.values():
+            return
+        for (path, subdirs, files) in os.walk(dir):
+            self._add_watch(path)
+
+    def _add_watch(self, path):
+        if isinstance(path, unicode):
+            bpath = path.encode(sys.getfilesystemencoding())
+        else:
+            bpath = path
+        wd = self.libc.inotify_add_watch(self.fd, bpath, self.WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            log.warning(_("Unable to watch directory '%s': %s") % (path, os.strerror(err)))
+            self.incomplete = True
+            return
+        self.dirs[wd] = path
+
+    def changes(self):
+        """Return the paths that have been written, created or removed since
+           the last call, oldest first. Files in newly created directories are
+           included as the directory is only watched from now on."""
+        changed = []
+        while True:
+            try:
+                data = os.read(self.fd, self.READ_SIZE)
+            except OSError, e:
+                if e.errno in (errno.EAGAIN, errno.EINTR):
+                    break
+                raise
+            if not data:
+                break
+            pos = 0
+            while pos < len(data):
+                (wd, mask, cookie, length) = self.EVENT_HEADER.unpack_from(data, pos)
+                pos += self.EVENT_HEADER.size
+                name = data[pos:pos + length].rstrip('\0')
+                pos += length
+                if mask & self.IN_Q_OVERFLOW:
+                    self.overflowed = True
+                    continue
+                if mask & self.IN_IGNORED:
+                    self.dirs.pop(wd, None)
+                    continue
+                dir = self.dirs.get(wd)
+                if dir is None or not name:
+                    continue
+                if isinstance(dir, unicode):
+                    name = name.decode(sys.getfilesystemencoding(), 'replace')
+                path = os.path.join(dir, name)
+                if mask & self.IN_ISDIR:
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                        self.add_directory(path)
+                        for (subdir, subdirs, files) in os.walk(path):
+                            changed.extend(os.path.join(subdir, file) for file in files)
+                    continue
+                changed.append(path)
+        # several events usually arrive for one write, keep the first of each
+        seen = set()
+        return [path for path in changed if not (path in seen or seen.add(path))]
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        self.dirs = {}
@@ -302,6 +302,22 @@ class Filters(QWidget):
 
         return (adj_t1.toUTC().toString("yyyy-MM-dd HH:mm:ss"), adj_t2.toUTC().toString("yyyy-MM-dd HH:mm:ss"))
 
+    def getStyleKeys(self):
+        # HudCache files hands under 'dYYMMDD' of the day they were played, allowing for day_start,
+        # so the same days as getDates. styleKeys only hold 2000-2099, clamp dates outside them
+        def styleKey(t):
+            if t.year() < 2000:
+                return 'd000000'
+            if t.year() > 2099:
+                return 'd999999'
+            return 'd' + t.toString("yyMMdd")
+
+        return (styleKey(self.start_date.date()), styleKey(self.end_date.date()))
+
+    def getAllDates(self):
+        # True when the dates are cleared, so no hand is outside them
+        return self.start_date.date() == QDate(1970,1,1) and self.end_date.date() == QDate(2100,1,1)
+
     def registerButton1Name(self, title):
         self.Button1.setText(title)
 
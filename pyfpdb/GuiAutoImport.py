@@ -27,7 +27,7 @@ import sys
 import logging
 
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QSpinBox, QPushButton, QLineEdit, QTextEdit, QCheckBox, QFileDialog
-from PyQt5.QtCore import QTimer
+from PyQt5.QtCore import QTimer, QSocketNotifier
 from PyQt5.QtGui import QTextCursor
 
 import Importer
@@ -49,6 +49,7 @@ class GuiAutoImport(QWidget):
     def __init__(self, settings, config, sql = None, parent = None, cli = False):
         QWidget.__init__(self, parent)
         self.importtimer = None
+        self.watchnotifier = None
         self.settings = settings
         self.config = config
         self.sql = sql
@@ -240,12 +241,20 @@ class GuiAutoImport(QWidget):
                     self.importtimer = QTimer()
                     self.importtimer.timeout.connect(self.do_import)
                     self.importtimer.start(interval * 1000)
+                    if self.importer.watcher is not None:
+                        # import as soon as the watcher sees a write, the timer stays for the summary grab
+                        self.watchnotifier = QSocketNotifier(self.importer.watcher.fileno(), QSocketNotifier.Read)
+                        self.watchnotifier.activated.connect(lambda fd: self.do_import())
 
             else:
                 self.addText("\n" + _("Auto Import aborted.") + _("Global lock not available."))
         else: # toggled off
             self.doAutoImportBool = False # do_import will return this and stop the gobject callback timer
             self.importtimer = None
+            if self.watchnotifier is not None:
+                self.watchnotifier.setEnabled(False)
+                self.watchnotifier = None
+            self.importer.closeWatcher()
             self.importer.autoSummaryGrab(True)
             self.settings['global_lock'].release()
             self.addText("\n" + _("Stopping Auto Import.") + _("Global lock released."))
@@ -25,7 +25,7 @@ from time import time
 from optparse import OptionParser
 import traceback
 
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QFileDialog
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QFileDialog, QLabel, QSpinBox
 
 #    fpdb/FreePokerTools modules
 import Options
@@ -41,7 +41,7 @@ log = logging.getLogger("importer")
 
 class GuiBulkImport(QWidget):
     # CONFIGURATION  -  update these as preferred:
-    allowThreads = False  # set to True to try out the threads field
+    allowThreads = True  # set to False to hide the threads field
 
     def load_clicked(self):
         stored = None
@@ -61,6 +61,8 @@ class GuiBulkImport(QWidget):
                 
                 self.importer.setHandsInDB(self.n_hands_in_db)
                 self.importer.setMode('bulk')
+                if self.allowThreads:
+                    self.importer.setThreads(self.spin_threads.value())
 
                 self.importer.addBulkImportImportFileOrDir(selected, site = 'auto')
                 self.importer.setCallHud(False)
@@ -105,6 +107,16 @@ class GuiBulkImport(QWidget):
         hbox.addWidget(self.chooseButton)
         self.layout().addLayout(hbox)
 
+        if self.allowThreads:
+            hbox = QHBoxLayout()
+            hbox.addWidget(QLabel(_('Worker processes:')))
+            self.spin_threads = QSpinBox()
+            self.spin_threads.setRange(1, 32)
+            self.spin_threads.setValue(self.settings.get('threads', 1))
+            hbox.addWidget(self.spin_threads)
+            hbox.addStretch()
+            self.layout().addLayout(hbox)
+
         self.load_button = QPushButton(_('Bulk Import'))
         self.load_button.clicked.connect(self.load_clicked)
         self.layout().addWidget(self.load_button)
@@ -22,11 +22,15 @@ from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import (QFrame, QHBoxLayout, QLabel, QScrollArea, QSizePolicy,
                              QSplitter, QVBoxLayout, QWidget)
 import sys
+from functools import partial
 from time import time
+from itertools import chain
+from collections import OrderedDict
 
 import Database
 import Filters
 import Charset
+import QueryExecutor
 
 try:
     calluse = not 'matplotlib' in sys.modules
@@ -39,15 +43,34 @@ try:
     from matplotlib.figure import Figure
     from matplotlib.backends.backend_qt5agg import FigureCanvas
     from matplotlib.font_manager import FontProperties
-    from numpy import cumsum
+    from numpy import (arange, column_stack, concatenate, cumsum, float64, fromiter,
+                       linspace, maximum, minimum, where)
 except ImportError, inst:
     print _("""Failed to load libs for graphing, graphing will not function. Please install numpy and matplotlib if you want to use graphs.""")
     print _("""This is of no consequence for other parts of the program, e.g. import and HUD are NOT affected by this problem.""")
     print "ImportError: %s" % inst.args
 
 
+def downsample(lines, bins):
+    """Min/max binning of lines, equal length arrays, down to 4 points a bin.
+       Each bin keeps its first, lowest, highest and last value, so peaks and
+       drawdowns survive however many hands share a pixel. Returns the hand
+       numbers to plot against and the binned lines"""
+    n = len(lines[0])
+    if n <= 4 * bins:
+        return arange(n), lines
+    edges = linspace(0, n, bins + 1).astype(int)
+    starts, ends = edges[:-1], edges[1:] - 1
+    mids = (starts + ends) // 2
+    x = column_stack((starts, mids, mids, ends)).ravel()
+    return x, [column_stack((l[starts], minimum.reduceat(l, starts), maximum.reduceat(l, starts), l[ends])).ravel()
+               for l in lines]
+
+
 class GuiGraphViewer(QSplitter):
 
+    graphCacheSize = 4      # filter selections whose lines are kept for the next refresh
+
     def __init__(self, querylist, config, parent, debug=True):
         QSplitter.__init__(self, parent)
         self.sql = querylist
@@ -55,6 +78,8 @@ class GuiGraphViewer(QSplitter):
         self.debug = debug
         self.parent = parent
         self.db = Database.Database(self.conf, sql=self.sql)
+        # the profit lines are read on this worker thread, with its own connection
+        self.executor = QueryExecutor.QueryExecutor(self.conf, self.sql, self)
 
 
         filters_display = { "Heroes"    : True,
@@ -98,6 +123,8 @@ class GuiGraphViewer(QSplitter):
         self.canvas = None
 
         self.exportFile = None
+        # profit graph query -> [highest handId, startTime of the last hand, cumulative lines]
+        self.graphCache = OrderedDict()
 
         self.db.rollback()
 
@@ -118,6 +145,7 @@ class GuiGraphViewer(QSplitter):
         self.canvas.setParent(self)
 
     def generateGraph(self, widget):
+        self.executor.cancel()
         self.clearGraphData()
 
         sitenos = []
@@ -158,13 +186,24 @@ class GuiGraphViewer(QSplitter):
             self.db.rollback()
             return
 
+        #Get graph data from DB, on the executor's thread
+        starttime = time()
+        tmp = self.getRingProfitQuery(playerids, sitenos, limits, games, currencies, display_in)
+        self.db.rollback()
+        self.executor.submit(lambda db: [(self.getRingProfitGraph(db, tmp), None)],
+                             partial(self.drawGraph, names, graphops, display_in, starttime))
+
+    def drawGraph(self, names, graphops, display_in, starttime, lines, colnames):
+        (green, blue, red, orange) = lines
+        print _("Graph generated in: %s") %(time() - starttime)
+
         #Set graph properties
         self.ax = self.fig.add_subplot(111)
 
-        #Get graph data from DB
-        starttime = time()
-        (green, blue, red, orange) = self.getRingProfitGraph(playerids, sitenos, limits, games, currencies, display_in)
-        print _("Graph generated in: %s") %(time() - starttime)
+        if green is not None:
+            hands = len(green)
+            # no point drawing more points than the graph has pixels across
+            x, (green, blue, red, orange) = downsample((green, blue, red, orange), max(self.widget(1).width(), 500))
 
         #Set axis labels and grid overlay properites
         self.ax.set_xlabel(_("Hands"))
@@ -205,12 +244,12 @@ class GuiGraphViewer(QSplitter):
 
             #Draw plot
             if 'showdown' in graphops:
-                self.ax.plot(blue, color='blue', label=_('Showdown') + ' (%s): %.2f' %(display_in, blue[-1]))
+                self.ax.plot(x, blue, color='blue', label=_('Showdown') + ' (%s): %.2f' %(display_in, blue[-1]))
             if 'nonshowdown' in graphops:
-                self.ax.plot(red, color='red', label=_('Non-showdown') + ' (%s): %.2f' %(display_in, red[-1]))
+                self.ax.plot(x, red, color='red', label=_('Non-showdown') + ' (%s): %.2f' %(display_in, red[-1]))
             if 'ev'in graphops:
-                self.ax.plot(orange, color='orange', label=_('All-in EV') + ' (%s): %.2f' %(display_in, orange[-1]))
-            self.ax.plot(green, color='green', label=_('Hands') + ': %d\n' % len(green) + _('Profit') + ': (%s): %.2f' % (display_in, green[-1]))
+                self.ax.plot(x, orange, color='orange', label=_('All-in EV') + ' (%s): %.2f' %(display_in, orange[-1]))
+            self.ax.plot(x, green, color='green', label=_('Hands') + ': %d\n' % hands + _('Profit') + ': (%s): %.2f' % (display_in, green[-1]))
 
             # order legend, greenline on top
             handles, labels = self.ax.get_legend_handles_labels()
@@ -224,7 +263,7 @@ class GuiGraphViewer(QSplitter):
             #self.exportButton.set_sensitive(True)
 
 
-    def getRingProfitGraph(self, names, sites, limits, games, currencies, units):
+    def getRingProfitQuery(self, names, sites, limits, games, currencies, units):
 #        tmp = self.sql.query['getRingProfitAllHandsPlayerIdSite']
 #        print "DEBUG: getRingProfitGraph"
 
@@ -279,22 +318,35 @@ class GuiGraphViewer(QSplitter):
 
         #print "DEBUG: sql query:"
         #print tmp
-        self.db.cursor.execute(tmp)
-        #returns (HandId,Winnings,Costs,Profit)
-        winnings = self.db.cursor.fetchall()
-        self.db.rollback()
-
-        if len(winnings) == 0:
+        return tmp
+
+    def getRingProfitGraph(self, db, tmp):
+        # The lines of a filter selection are kept, later refreshes only fetch the
+        # hands imported since and add them on the end
+        (maxHandId, lastStart, lines) = self.graphCache.pop(tmp, [-1, None, None])
+        c = db.get_cursor()
+        c.execute(tmp.replace("<handid_test>", "AND hp.handId > %d" % maxHandId))
+        #returns (HandId,Profit,Showdown,AllInEV,StartTime)
+        winnings = c.fetchall()
+        if winnings and lines is not None and winnings[0][4] < lastStart:
+            # older hands were imported, they go in the middle of the lines
+            c.execute(tmp.replace("<handid_test>", ""))
+            (winnings, lines) = (c.fetchall(), None)
+
+        if winnings:
+            data = fromiter(chain.from_iterable(w[:4] for w in winnings), float64).reshape(-1, 4)
+            profit, showdown = data[:, 1], data[:, 2] != 0
+            new = [cumsum(l) for l in (profit, where(showdown, profit, 0.0), where(showdown, 0.0, profit), data[:, 3])]
+            if lines is not None:
+                new = [concatenate((line, l + line[-1])) for (line, l) in zip(lines, new)]
+            (maxHandId, lastStart, lines) = (max(maxHandId, int(data[:, 0].max())), winnings[-1][4], new)
+        self.graphCache[tmp] = [maxHandId, lastStart, lines]
+        while len(self.graphCache) > self.graphCacheSize:
+            self.graphCache.popitem(last=False)
+
+        if lines is None:
             return (None, None, None, None)
-
-        green = map(lambda x:float(x[1]), winnings)
-        blue  = map(lambda x: float(x[1]) if x[2] == True  else 0.0, winnings)
-        red   = map(lambda x: float(x[1]) if x[2] == False else 0.0, winnings)
-        orange = map(lambda x:float(x[3]), winnings)
-        greenline = cumsum(green)
-        blueline  = cumsum(blue)
-        redline   = cumsum(red)
-        orangeline = cumsum(orange)
+        (greenline, blueline, redline, orangeline) = lines
         return (greenline/100, blueline/100, redline/100, orangeline/100)
 
     def exportGraph (self, widget, data):
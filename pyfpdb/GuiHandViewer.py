@@ -31,8 +31,9 @@ import Database
 import SQL
 import Filters
 import Deck
+import QueryExecutor
 
-from PyQt5.QtCore import QCoreApplication, QSortFilterProxyModel, Qt
+from PyQt5.QtCore import QSortFilterProxyModel, Qt
 from PyQt5.QtGui import (QPainter, QPixmap, QStandardItem, QStandardItemModel)
 from PyQt5.QtWidgets import (QApplication, QFrame, QMenu,
                              QProgressDialog, QScrollArea, QSplitter,
@@ -43,6 +44,7 @@ from StringIO import StringIO
 import GuiReplayer
 
 class GuiHandViewer(QSplitter):
+    loadChunkSize = 200     # hands read at once by reload_hands
     def __init__(self, config, querylist, mainwin):
         QSplitter.__init__(self, mainwin)
         self.config = config
@@ -51,6 +53,10 @@ class GuiHandViewer(QSplitter):
         self.replayer = None
 
         self.db = Database.Database(self.config, sql=self.sql)
+        self.handCache = Hand.HandCache()
+        # the hands are read on this worker thread, with its own connection
+        self.executor = QueryExecutor.QueryExecutor(self.config, self.sql, self)
+        self.hands = {}
 
         
         filters_display = { "Heroes"    : True,
@@ -144,17 +150,21 @@ class GuiHandViewer(QSplitter):
         return card_images
 
     def loadHands(self, checkState):
-        hand_ids = self.get_hand_ids_from_date_range(self.filters.getDates()[0], self.filters.getDates()[1])
-        self.reload_hands(hand_ids)
+        self.executor.cancel()
+        hand_ids = []
+        q = self.hand_ids_query(self.filters.getDates()[0], self.filters.getDates()[1])
+        self.executor.submit(q, lambda rows, colnames: hand_ids.extend(r[0] for r in rows),
+                             lambda: self.reload_hands(hand_ids))
 
-    def get_hand_ids_from_date_range(self, start, end):
+    def hand_ids_query(self, start, end):
         q = self.db.sql.query['handsInRange']
         q = q.replace('<datetest>', "between '" + start + "' and '" + end + "'")
-        q = self.filters.replace_placeholders_with_filter_values(q)
+        return self.filters.replace_placeholders_with_filter_values(q)
 
+    def get_hand_ids_from_date_range(self, start, end):
         c = self.db.get_cursor()
 
-        c.execute(q)
+        c.execute(self.hand_ids_query(start, end))
         return [r[0] for r in c.fetchall()]
 
     def rankedhand(self, hand, game):
@@ -176,22 +186,35 @@ class GuiHandViewer(QSplitter):
             return 0
 
     def reload_hands(self, handids):
+        self.executor.cancel()
         self.hands = {}
         self.model.removeRows(0, self.model.rowCount())
         if len(handids) == 0:
             return
         progress = QProgressDialog("Loading hands", "Abort", 0, len(handids), self)
         progress.setValue(0)
+        progress.canceled.connect(self.executor.cancel)
         progress.show()
-        for idx, handid in enumerate(handids):
-            if progress.wasCanceled():
-                break
-            self.hands[handid] = self.importhand(handid)
-            self.addHandRow(handid, self.hands[handid])
-            progress.setValue(idx + 1)
-            if idx % 10 == 0:
-                QCoreApplication.processEvents()
-                self.view.resizeColumnsToContents()
+        self.executor.submit(partial(self.readHands, handids), partial(self.addHands, progress),
+                             partial(self.handsDone, progress), partial(self.handsDone, progress))
+
+    def readHands(self, handids, db):
+        # runs on the executor's thread, the next few hundred hands are read with a handful of queries
+        for idx in xrange(0, len(handids), self.loadChunkSize):
+            yield Hand.hands_factory(handids[idx:idx + self.loadChunkSize], self.config, db, self.handCache), None
+
+    def addHands(self, progress, hands, colnames):
+        heroes = self.filters.getHeroes()
+        for hand in hands:
+            # Set the hero for this hand using the filter for the sitename of this hand
+            hand.hero = heroes[hand.sitename]
+            self.hands[hand.handid_selected] = hand
+            self.addHandRow(hand.handid_selected, hand)
+        progress.setValue(min(progress.value() + self.loadChunkSize, progress.maximum()))
+        self.view.resizeColumnsToContents()
+
+    def handsDone(self, progress, error=None):
+        progress.setValue(progress.maximum())
         self.view.resizeColumnsToContents()
     
     def addHandRow(self, handid, hand):
@@ -292,7 +315,7 @@ class GuiHandViewer(QSplitter):
 
     def row_activated(self, index):
         handlist = list(sorted(self.hands.keys()))
-        self.replayer = GuiReplayer.GuiReplayer(self.config, self.sql, self.main_window, handlist)
+        self.replayer = GuiReplayer.GuiReplayer(self.config, self.sql, self.main_window, handlist, self.handCache)
 
         self.replayer.play_hand(handlist.index(int(index.sibling(index.row(), self.colnum['HandId']).data())))
 
@@ -301,7 +324,7 @@ class GuiHandViewer(QSplitter):
         # We need at least sitename, gametype, handid
         # for the Hand.__init__
 
-        h = Hand.hand_factory(handid, self.config, self.db)
+        h = Hand.hand_factory(handid, self.config, self.db, self.handCache)
 
         # Set the hero for this hand using the filter for the sitename of this hand
         h.hero = self.filters.getHeroes()[h.sitename]
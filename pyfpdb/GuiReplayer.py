@@ -28,6 +28,7 @@ import Configuration
 import Database
 import SQL
 import Deck
+import ICM
 
 from PyQt5.QtCore import (QPoint, QRect, Qt, QTimer)
 from PyQt5.QtGui import (QColor, QImage, QPainter)
@@ -45,7 +46,7 @@ CARD_WIDTH = 30
 
 class GuiReplayer(QWidget):
     """A Replayer to replay hands."""
-    def __init__(self, config, querylist, mainwin, handlist):
+    def __init__(self, config, querylist, mainwin, handlist, cache=None):
         QWidget.__init__(self, None)
         self.setFixedSize(800, 680)
         self.conf = config
@@ -56,6 +57,8 @@ class GuiReplayer(QWidget):
         self.states = [] # List with all table states.
         self.handlist = handlist
         self.handidx = 0
+        self.handCache = cache if cache is not None else Hand.HandCache()
+        self.payouts = {} # (tourneyId, names) -> payouts, see Database.get_tourney_payouts
 
         self.setWindowTitle("FPDB Hand Replayer")
         
@@ -156,6 +159,8 @@ class GuiReplayer(QWidget):
                              '%s %s%.2f' % (player.name,
                                             self.currency,
                                             player.stack))
+            if player.icm is not None:
+                painter.drawText(QRect(playerx - 100, playery + 30, 200, 20), Qt.AlignCenter, 'ICM %.2f' % player.icm)
 
             if player.justacted:
                 painter.setPen(QColor("yellow"))
@@ -209,12 +214,15 @@ class GuiReplayer(QWidget):
 
     def play_hand(self, handidx):
         self.handidx = handidx
-        hand = Hand.hand_factory(self.handlist[handidx], self.conf, self.db)
+        if self.handCache.get(self.handlist[handidx]) is None:
+            # read the hands around this one at once, paging through them is then free
+            Hand.hands_factory(self.handlist[max(0, handidx - 50):handidx + 50], self.conf, self.db, self.handCache)
+        hand = Hand.hand_factory(self.handlist[handidx], self.conf, self.db, self.handCache)
         # hand.writeHand()  # Print handhistory to stdout -> should be an option in the GUI
         self.currency = hand.sym
 
         self.states = []
-        state = TableState(hand)
+        state = TableState(hand, self.tourneyPayouts(hand))
         seenStreets = []
         for street in hand.allStreets:
             if state.called > 0:
@@ -257,6 +265,14 @@ class GuiReplayer(QWidget):
         self.stateSlider.setValue(0)
         self.update()
 
+    def tourneyPayouts(self, hand):
+        if hand.tourneyId is None:
+            return None
+        key = (hand.tourneyId, frozenset(p[1] for p in hand.players))
+        if key not in self.payouts:
+            self.payouts[key] = self.db.get_tourney_payouts(*key)
+        return self.payouts[key]
+
     def increment_state(self):
         if self.stateSlider.value() == self.stateSlider.maximum():
             self.playing = False
@@ -270,7 +286,7 @@ class GuiReplayer(QWidget):
 
     def importhand(self, handid=1):
 
-        h = Hand.hand_factory(handid, self.conf, self.db)
+        h = Hand.hand_factory(handid, self.conf, self.db, self.handCache)
         
         return h
 
@@ -303,34 +319,8 @@ class GuiReplayer(QWidget):
                 self.stateSlider.setValue(i)
                 break
 
-# ICM code originally grabbed from http://svn.gna.org/svn/pokersource/trunk/icm-calculator/icm-webservice.py
-# Copyright (c) 2008 Thomas Johnson <tomfmason@gmail.com>
-
-class ICM:
-    def __init__(self, stacks, payouts):
-        self.stacks = stacks
-        self.payouts = payouts
-        self.equities = []
-        self.prepare()
-    def prepare(self):
-        total = sum(self.stacks)
-        for k in self.stacks:
-            self.equities.append(round(Decimal(str(self.getEquities(total, k, 0))), 4))
-    def getEquities(self, total, player, depth):
-        D = Decimal
-        eq = D(self.stacks[player]) / total * D(str(self.payouts[depth]))
-        if(depth + 1 < len(self.payouts)):
-            i=0
-            for stack in self.stacks:
-                if i != player and stack > 0.0:
-                    self.stacks[i] = 0.0
-                    eq += self.getEquities((total - stack), player, (depth + 1)) * (stack / D(total))
-                    self.stacks[i] = stack
-                i += 1
-        return eq
-
 class TableState:
-    def __init__(self, hand):
+    def __init__(self, hand, payouts=None):
         self.pot = Decimal(0)
         self.street = None
         self.board = hand.board
@@ -341,14 +331,21 @@ class TableState:
         self.gamebase = hand.gametype['base']
         self.allin = False
         self.allinThisStreet = False
-        # NOTE: Need a useful way to grab payouts
-        #self.icm = ICM(stacks,payouts)
-        #print icm.equities
+        # the places a tourney pays, when the hand is played by the last players left
+        self.payouts = payouts
 
         self.players = {}
 
-        for seat, name, chips, pos in hand.players:
+        for seat, name, chips, pos, bounty in hand.players:
             self.players[name] = Player(hand, name, chips, seat)
+        self.updateIcm()
+
+    def updateIcm(self):
+        if self.payouts is None:
+            return
+        players = self.players.values()
+        for (player, icm) in zip(players, ICM.equities([player.stack + player.chips for player in players], self.payouts)):
+            player.icm = icm
 
     def startPhase(self, phase):
         self.street = phase
@@ -432,6 +429,7 @@ class TableState:
             player.justacted = True
         for name, amount in returned.items():
             self.players[name].stack += amount
+        self.updateIcm()
 
 class Player:
     def __init__(self, hand, name, stack, seat):
@@ -440,6 +438,7 @@ class Player:
         self.seat      = seat
         self.name      = name
         self.action    = None
+        self.icm       = None # tourney equity, see TableState.updateIcm
         self.justacted = False
         self.holecards = hand.join_holecards(name, asList=True)
         self.streetcards = {}
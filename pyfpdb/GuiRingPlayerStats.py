@@ -18,6 +18,7 @@
 import L10n
 _ = L10n.get_translation()
 
+from functools import partial
 from time import time
 
 from PyQt5.QtCore import Qt
@@ -31,6 +32,7 @@ import Card
 import Database
 import Filters
 import Charset
+import QueryExecutor
 
 colalias,colheading,colshowsumm,colshowposn,colformat,coltype,colxalign = 0,1,2,3,4,5,6
 ranks = {'x':0, '2':2, '3':3, '4':4, '5':5, '6':6, '7':7, '8':8, '9':9, 'T':10, 'J':11, 'Q':12, 'K':13, 'A':14}
@@ -90,6 +92,8 @@ class GuiRingPlayerStats(QSplitter):
         # create new db connection to avoid conflicts with other threads
         self.db = Database.Database(self.conf, sql=self.sql)
         self.cursor = self.db.cursor
+        # the grids are read on this worker thread, with its own connection
+        self.executor = QueryExecutor.QueryExecutor(self.conf, self.sql, self)
 
         settings = {}
         settings.update(self.conf.get_db_parameters())
@@ -188,6 +192,7 @@ class GuiRingPlayerStats(QSplitter):
             steals_column[colshowposn] = False
 
     def refreshStats(self, checkState):
+        self.executor.cancel()
         self.liststore = []
         self.listcols = []
         self.stats_frame.layout().removeWidget(self.stats_vbox)
@@ -240,6 +245,12 @@ class GuiRingPlayerStats(QSplitter):
         startTime = time()
         show_detail = True
 
+        if 'allplayers' in groups:
+            # can't currently do this combination so skip detailed table
+            show_detail = False
+        # the grids fill in as their rows arrive, the last one done is the whole page
+        done = partial(self.statsDone, startTime)
+
 #        # Display summary table at top of page
 #        # 3rd parameter passes extra flags, currently includes:
 #        #   holecards - whether to display card breakdown (True/False)
@@ -247,11 +258,8 @@ class GuiRingPlayerStats(QSplitter):
 #        #   gridnum   - index for grid data structures
         flags = [False, self.filters.getNumHands(), 0]
         self.addGrid(vbox, 'playerDetailedStats', flags, playerids
-                    ,sitenos, limits, seats, groups, dates, games, currencies)
-
-        if 'allplayers' in groups:
-            # can't currently do this combination so skip detailed table
-            show_detail = False
+                    ,sitenos, limits, seats, groups, dates, games, currencies
+                    ,None if show_detail else done)
 
         if show_detail: 
             # Separator
@@ -268,27 +276,30 @@ class GuiRingPlayerStats(QSplitter):
             flags[0] = True
             flags[2] = 1
             self.addGrid(vbox2, 'playerDetailedStats', flags, playerids
-                        ,sitenos, limits, seats, groups, dates, games, currencies)
+                        ,sitenos, limits, seats, groups, dates, games, currencies, done)
 
         self.db.rollback()
+
+    def statsDone(self, startTime):
         print (_("Stats page displayed in %4.2f seconds") % (time() - startTime))
 
-    def addGrid(self, vbox, query, flags, playerids, sitenos, limits, seats, groups, dates, games, currencies):
-        sqlrow = 0
+    def addGrid(self, vbox, query, flags, playerids, sitenos, limits, seats, groups, dates, games, currencies, done=None):
         if not flags:  holecards,grid = False,0
         else:          holecards,grid = flags[0],flags[2]
+        colshow = colshowsumm
+        if 'posn' in groups:  colshow = colshowposn
 
-        tmp = self.sql.query[query]
-        tmp = self.refineQuery(tmp, flags, playerids, sitenos, limits, seats, groups, dates, games, currencies)
-        self.cursor.execute(tmp)
-        result = self.cursor.fetchall()
-        colnames = [desc[0].lower() for desc in self.cursor.description]
+        cache = self.planCache(holecards, seats, groups)
+        if cache:
+            tmp = self.sql.query[query + 'Cache']
+            tmp = self.refineQuery(tmp, flags, playerids, sitenos, limits, seats, groups, dates, games, currencies, cache)
+            job = partial(self.cacheRows, tmp)
+        else:
+            tmp = self.sql.query[query]
+            job = self.refineQuery(tmp, flags, playerids, sitenos, limits, seats, groups, dates, games, currencies)
 
         # pre-fetch some constant values:
-        colshow = colshowsumm
-        if 'posn' in groups:  colshow = colshowposn
         self.cols_to_show = [x for x in self.columns if x[colshow]]
-        hgametypeid_idx = colnames.index('hgametypeid')
 
         assert len(self.liststore) == grid, "len(self.liststore)="+str(len(self.liststore))+" grid-1="+str(grid)
         view = QTableView()
@@ -308,11 +319,17 @@ class GuiRingPlayerStats(QSplitter):
             self.listcols[grid].append(s)
         self.liststore[grid].setHorizontalHeaderLabels(self.listcols[grid])
 
-        rows = len(result) # +1 for title row
+        self.executor.submit(job, partial(self.addRows, grid, self.cols_to_show, holecards), partial(self.gridDone, view, done))
+
+    def addRows(self, grid, cols_to_show, holecards, result, colnames):
+        sqlrow = 0
+        colnames = [c.lower() for c in colnames]
+        hgametypeid_idx = colnames.index('hgametypeid')
+        rows = len(result)
 
         while sqlrow < rows:
             treerow = []
-            for col,column in enumerate(self.cols_to_show):
+            for col,column in enumerate(cols_to_show):
                 if column[colalias] in colnames:
                     value = result[sqlrow][colnames.index(column[colalias])]
                     if column[colalias] == 'plposition':
@@ -374,13 +391,60 @@ class GuiRingPlayerStats(QSplitter):
             self.liststore[grid].appendRow(treerow)
             sqlrow += 1
 
+    def gridDone(self, view, done):
         view.resizeColumnsToContents()
         view.setSortingEnabled(True) # do this after resizing columns, otherwise it leaves room for the sorting triangle in every heading
         view.resizeColumnToContents(0) # we want room for the sorting triangle in column 0 where it starts.
         view.resizeRowsToContents()
-
-    def refineQuery(self, query, flags, playerids, sitenos, limits, seats, groups, dates, games, currencies):
+        if done is not None:
+            done()
+
+    def planCache(self, holecards, seats, groups):
+        """Returns the cache table that can answer playerDetailedStats for these filters,
+           or None when only HandsPlayers can"""
+        if self.detailFilters or self.cardsFilters:
+            return None
+        colshow = colshowsumm
+        if 'posn' in groups:  colshow = colshowposn
+        allseats = not seats or (seats['from'] <= 2 and seats['to'] >= 10)
+        avgseats_column = (x for x in self.columns if x[0] == 'avgseats').next()
+        if holecards:
+            # CardsCache keeps weeks and no seats or positions
+            if (self.db.cacheSessions and self.filters.getAllDates() and allseats
+                    and 'posn' not in groups and 'seats' not in groups and not avgseats_column[colshow]):
+                return 'CardsCache'
+        elif 'posn' in groups:
+            # HudCache lumps positions together, PositionsCache keeps them but only has weeks
+            if self.db.cacheSessions and self.filters.getAllDates():
+                return 'PositionsCache'
+        elif self.db.callHud and self.db.build_full_hudcache:
+            return 'HudCache'
+        return None
+
+    def cacheRows(self, query, db):
+        """Executor job for a grid from a cache table, yields its rows"""
+        c = db.get_cursor()
+        c.execute(query)
+        yield c.fetchall(), [desc[0].lower() for desc in c.description]
+
+    def refineQuery(self, query, flags, playerids, sitenos, limits, seats, groups, dates, games, currencies, cache=None):
         having = ''
+        # playerDetailedStatsCache reads the cache table as hp, with n hands in each row
+        if cache:  hands,handcount = 'hp','sum(hp.n)'
+        else:      hands,handcount = 'h','count(1)'
+        query = query.replace("<cache_table>", str(cache))
+        # CardsCache has no seats and only HudCache has days, planCache only
+        # picks the others when those filters let every hand through
+        if cache == 'CardsCache':
+            query = query.replace("<cache_seats_test>", "")
+            query = query.replace("<cache_avgseats>", "null")
+        else:
+            query = query.replace("<cache_seats_test>", "and hp.seats <seats_test>")
+            query = query.replace("<cache_avgseats>", "sum(hp.seats*hp.n+0.0)/sum(hp.n)")
+        if cache == 'HudCache':
+            query = query.replace("<cache_datestest>", "and hp.styleKey between '%s' and '%s'" % self.filters.getStyleKeys())
+        else:
+            query = query.replace("<cache_datestest>", "")
         if not flags:
             holecards = False
             numhands = 0
@@ -405,7 +469,7 @@ class GuiRingPlayerStats(QSplitter):
                 # set flag in self.columns to show player name column
                 pname_column[colshow] = True
                 if numhands:
-                    having = ' and count(1) > %d ' % (numhands,)
+                    having = ' and %s > %d ' % (handcount, numhands)
         else:
             if playerids:
                 nametest = str(tuple(playerids))
@@ -455,15 +519,18 @@ class GuiRingPlayerStats(QSplitter):
         if seats:
             query = query.replace('<seats_test>', 'between ' + str(seats['from']) + ' and ' + str(seats['to']))
             if 'seats' in groups:
-                query = query.replace('<groupbyseats>', ',h.seats')
-                query = query.replace('<orderbyseats>', ',h.seats')
+                query = query.replace('<groupbyseats>', ',%s.seats' % hands)
+                query = query.replace('<orderbyseats>', ',%s.seats' % hands)
+                query = query.replace('<selectseats>', ',%s.seats AS seats' % hands)
             else:
                 query = query.replace('<groupbyseats>', '')
                 query = query.replace('<orderbyseats>', '')
+                query = query.replace('<selectseats>', '')
         else:
             query = query.replace('<seats_test>', 'between 0 and 100')
             query = query.replace('<groupbyseats>', '')
             query = query.replace('<orderbyseats>', '')
+            query = query.replace('<selectseats>', '')
 
         bbtest = self.filters.get_limits_where_clause(limits)
 
@@ -481,7 +548,7 @@ class GuiRingPlayerStats(QSplitter):
             if groupLevels:
                 query = query.replace("<hgametypeId>", "p.name")  # need to use p.name for sqlite posn stats to work
             else:
-                query = query.replace("<hgametypeId>", "h.gametypeId")
+                query = query.replace("<hgametypeId>", "%s.gametypeId" % hands)
 
         # process self.detailFilters (a list of tuples)
         flagtest = ''
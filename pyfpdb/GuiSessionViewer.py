@@ -21,6 +21,8 @@ _ = L10n.get_translation()
 import sys
 import os
 import traceback
+from functools import partial
+from itertools import chain
 from time import time, strftime, localtime, gmtime
 
 from PyQt5.QtCore import Qt
@@ -40,8 +42,13 @@ try:
     from matplotlib.backends.backend_qt5agg import FigureCanvas
     from matplotlib.finance import candlestick_ochl
 
-    from numpy import diff, nonzero, sum, cumsum, max, min, append
+except ImportError, inst:
+    print _("""Failed to load numpy and/or matplotlib in Session Viewer""")
+    print "ImportError: %s" % inst.args
 
+# the session stats only need numpy, the table works without matplotlib
+try:
+    from numpy import diff, nonzero, cumsum, append, concatenate, fromiter, maximum, minimum, float64, int64
 except ImportError, inst:
     print _("""Failed to load numpy and/or matplotlib in Session Viewer""")
     print "ImportError: %s" % inst.args
@@ -50,6 +57,7 @@ import Card
 import Database
 import Filters
 import Charset
+import QueryExecutor
 
 import GuiHandViewer
 
@@ -77,6 +85,8 @@ class GuiSessionViewer(QSplitter):
         
         # create new db connection to avoid conflicts with other threads
         self.db = Database.Database(self.conf, sql=self.sql)
+        # the sessions are worked out on this worker thread, with its own connection
+        self.executor = QueryExecutor.QueryExecutor(self.conf, self.sql, self)
         self.cursor = self.db.cursor
 
         settings = {}
@@ -151,6 +161,7 @@ class GuiSessionViewer(QSplitter):
         self.main_vbox.addWidget(self.stats_frame)
 
     def refreshStats(self, checkState):
+        self.executor.cancel()
         if self.view:
             self.stats_frame.layout().removeWidget(self.view)
             self.view.setParent(None)
@@ -197,7 +208,14 @@ class GuiSessionViewer(QSplitter):
     def createStatsPane(self, frame, playerids, sitenos, games, currencies, limits, seats):
         starttime = time()
 
-        (results, quotes) = self.generateDatasets(playerids, sitenos, games, currencies, limits, seats)
+        q = self.sessionQuery(playerids, sitenos, games, currencies, limits, seats)
+        self.db.rollback()
+        # the sessions are worked out on the executor's thread, one chunk brings all of them
+        self.executor.submit(lambda db: [(self.generateDatasets(q, db.get_cursor()), None)],
+                             partial(self.showSessions, frame, starttime))
+
+    def showSessions(self, frame, starttime, datasets, colnames):
+        (results, quotes, self.times) = datasets
 
         if DEBUG:
             for x in quotes:
@@ -207,14 +225,9 @@ class GuiSessionViewer(QSplitter):
 
         self.addTable(frame, results)
 
-        self.db.rollback()
         print _("Stats page displayed in %4.2f seconds") % (time() - starttime)
 
-    def generateDatasets(self, playerids, sitenos, games, currencies, limits, seats):
-        if (DEBUG): print "DEBUG: Starting generateDatasets"
-        THRESHOLD = 1800     # Min # of secs between consecutive hands before being considered a new session
-        PADDING   = 5        # Additional time in minutes to add to a session, session startup, shutdown etc
-
+    def sessionQuery(self, playerids, sitenos, games, currencies, limits, seats):
         # Get a list of timestamps and profits
 
         q = self.sql.query['sessionStats']
@@ -255,6 +268,12 @@ class GuiSessionViewer(QSplitter):
         nametest = nametest.replace(",)",")")
         q = q.replace("<player_test>", nametest)
         q = q.replace("<ampersand_s>", "%s")
+        return q
+
+    def generateDatasets(self, q, cursor):
+        if (DEBUG): print "DEBUG: Starting generateDatasets"
+        THRESHOLD = 1800     # Min # of secs between consecutive hands before being considered a new session
+        PADDING   = 5        # Additional time in minutes to add to a session, session startup, shutdown etc
 
         if DEBUG:
             hands = [ 
@@ -276,102 +295,58 @@ class GuiSessionViewer(QSplitter):
                 (u'160000', -40), (u'160000',  80), (u'160000', -40),
                 ]
         else:
-            self.db.cursor.execute(q)
-            hands = self.db.cursor.fetchall()
-
-        #fixme - nasty hack to ensure that the hands.insert() works 
-        # for mysql data.  mysql returns tuples which can't be inserted
-        # into so convert explicity to list.
-        hands = list(hands)
-
-        if (not hands):
-            return ([], [])
-
-        hands.insert(0, (hands[0][0], 0))
-
-        # Take that list and create an array of the time between hands
-        times = map(lambda x:long(x[0]), hands)
-        profits = map(lambda x:float(x[1]), hands)
-        #print "DEBUG: times   : %s" % times
-        #print "DEBUG: profits: %s" % profits
-        #print "DEBUG: len(times) %s" %(len(times))
-        diffs = diff(times)                      # This array is the difference in starttime between consecutive hands
-        diffs2 = append(diffs,THRESHOLD + 1)     # Append an additional session to the end of the diffs, so the next line
-                                                 # includes an index into the last 'session'
-        index = nonzero(diffs2 > THRESHOLD)      # This array represents the indexes into 'times' for start/end times of sessions
-                                                 # times[index[0][0]] is the end of the first session,
-        #print "DEBUG: len(index[0]) %s" %(len(index[0]))
-        if len(index[0]) > 0:
-            #print "DEBUG: index[0][0] %s" %(index[0][0])
-            #print "DEBUG: index %s" %(index)
-            pass
-        else:
-            index = [[0]]
-            #print "DEBUG: index %s" %(index)
-            #print "DEBUG: index[0][0] %s" %(index[0][0])
-            pass
+            cursor.execute(q)
+            hands = cursor
+
+        # (time, profit) rows straight into one array, times are whole seconds so
+        # float64 holds them exactly. A zero profit hand at the first time is put
+        # in front, the opening balance of the first session.
+        data = fromiter(chain.from_iterable(hands), float64).reshape(-1, 2)
+        if not len(data):
+            return ([], [], [])
+        times = concatenate((data[:1, 0], data[:, 0])).astype(int64)
+        profits = concatenate(([0.0], data[:, 1]))
+
+        # A session ends at each hand followed by a gap of more than THRESHOLD,
+        # and at the last hand. Sessions are [starts[i], ends[i]] in the arrays.
+        ends = nonzero(append(diff(times), THRESHOLD + 1) > THRESHOLD)[0]
+        starts = concatenate(([1], ends[:-1] + 1))
 
-        first_idx = 1
-        quotes = []
-        results = []
         cum_sum = cumsum(profits) / 100
-        sid = 1
-
-        total_hands = 0
-        total_time = 0
-        global_open = None
-        global_lwm = None
-        global_hwm = None
+        opens = cum_sum[starts - 1]                 # the balance before the first hand
+        closes = cum_sum[ends]
+        # highs and lows over each session's hands, then the opening balance
+        hwms = maximum(maximum.reduceat(cum_sum, starts), opens)
+        lwms = minimum(minimum.reduceat(cum_sum, starts), opens)
+        hds = ends - starts + 1                     # Number of hands in session
+        minutes = (times[ends] - times[starts]) // 60 + PADDING
+        minutes[minutes == 0] = 1
+        hphs = hds * 60 // minutes                  # Hands per hour
 
-        self.times = []
+        quotes = []
+        results = []
+        sessionTimes = zip((times[starts] - PADDING * 60).tolist(), (times[ends] + PADDING * 60).tolist())
         # Take all results and format them into a list for feeding into gui model.
-        #print "DEBUG: range(len(index[0]): %s" % range(len(index[0]))
-        for i in range(len(index[0])):
-            last_idx = index[0][i]
-            hds = last_idx - first_idx + 1                                           # Number of hands in session
-            if hds > 0:
-                stime = strftime("%d/%m/%Y %H:%M", localtime(times[first_idx]))      # Formatted start time
-                etime = strftime("%d/%m/%Y %H:%M", localtime(times[last_idx]))       # Formatted end time
-                self.times.append((times[first_idx] - PADDING * 60, times[last_idx] + PADDING * 60))
-                minutesplayed = (times[last_idx] - times[first_idx])/60
-                minutesplayed = minutesplayed + PADDING
-                if minutesplayed == 0:
-                    minutesplayed = 1
-                hph = hds*60/minutesplayed # Hands per hour
-                end_idx = last_idx+1
-                won = sum(profits[first_idx:end_idx])/100.0
-                #print "DEBUG: profits[%s:%s]: %s" % (first_idx, end_idx, profits[first_idx:end_idx])
-                hwm = max(cum_sum[first_idx-1:end_idx]) # include the opening balance,
-                lwm = min(cum_sum[first_idx-1:end_idx]) # before we win/lose first hand
-                open = (sum(profits[:first_idx]))/100
-                close = (sum(profits[:end_idx]))/100
-                #print "DEBUG: range: (%s, %s) - (min, max): (%s, %s) - (open,close): (%s, %s)" %(first_idx, end_idx, lwm, hwm, open, close)
-            
-                total_hands = total_hands + hds
-                total_time = total_time + minutesplayed
-                if (global_lwm == None or global_lwm > lwm):
-                    global_lwm = lwm
-                if (global_hwm == None or global_hwm < hwm):
-                    global_hwm = hwm
-                if (global_open == None):
-                    global_open = open
-                    global_stime = stime
-
-                results.append([sid, hds, stime, etime, hph,
-                                "%.2f" % open,
-                                "%.2f" % close,
-                                "%.2f" % lwm,
-                                "%.2f" % hwm,
-                                "%.2f" % (hwm - lwm),
-                                "%.2f" % won])
-                quotes.append((sid, open, close, hwm, lwm))
-                #print "DEBUG: Hands in session %4s: %4s  Start: %s End: %s HPH: %s Profit: %s" %(sid, hds, stime, etime, hph, won)
-                first_idx = end_idx
-                sid = sid+1
-            else:
-                print "hds <= 0"
-        global_close = close
-        global_etime = etime
+        sessions = zip(hds.tolist(), times[starts].tolist(), times[ends].tolist(), hphs.tolist(),
+                       opens.tolist(), closes.tolist(), lwms.tolist(), hwms.tolist())
+        for (sid, (hd, first, last, hph, open, close, lwm, hwm)) in enumerate(sessions, 1):
+            stime = strftime("%d/%m/%Y %H:%M", localtime(first))      # Formatted start time
+            etime = strftime("%d/%m/%Y %H:%M", localtime(last))       # Formatted end time
+            results.append([sid, hd, stime, etime, hph,
+                            "%.2f" % open,
+                            "%.2f" % close,
+                            "%.2f" % lwm,
+                            "%.2f" % hwm,
+                            "%.2f" % (hwm - lwm),
+                            "%.2f" % (close - open)])
+            quotes.append((sid, open, close, hwm, lwm))
+            #print "DEBUG: Hands in session %4s: %4s  Start: %s End: %s HPH: %s Profit: %s" %(sid, hd, stime, etime, hph, close - open)
+
+        total_hands = int(hds.sum())
+        total_time = int(minutes.sum())
+        global_open, global_close = opens[0], closes[-1]
+        global_lwm, global_hwm = lwms.min(), hwms.max()
+        global_stime, global_etime = results[0][2], results[-1][3]
         results.append([''] * 11)
         results.append([_("all"), total_hands, global_stime, global_etime,
                         total_hands * 60 / total_time,
@@ -382,7 +357,7 @@ class GuiSessionViewer(QSplitter):
                         "%.2f" % (global_hwm - global_lwm),
                         "%.2f" % (global_close - global_open)])
 
-        return (results, quotes)
+        return (results, quotes, sessionTimes)
 
     def clearGraphData(self):
 
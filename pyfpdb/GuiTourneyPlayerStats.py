@@ -18,6 +18,7 @@
 import L10n
 _ = L10n.get_translation()
 
+from functools import partial
 from time import time, strftime
 
 from PyQt5.QtCore import Qt
@@ -27,6 +28,7 @@ from PyQt5.QtWidgets import (QFrame, QScrollArea, QSplitter,
 
 import Charset
 import Filters
+import QueryExecutor
 
 colalias,colshow,colheading,colxalign,colformat,coltype = 0,1,2,3,4,5
 
@@ -37,6 +39,8 @@ class GuiTourneyPlayerStats(QSplitter):
         self.db = db
         self.cursor = self.db.cursor
         self.sql = sql
+        # the grid is read on this worker thread, with its own connection
+        self.executor = QueryExecutor.QueryExecutor(self.conf, self.sql, self)
         self.main_window = mainwin
         self.debug = debug
         
@@ -108,15 +112,11 @@ class GuiTourneyPlayerStats(QSplitter):
         self.setStretchFactor(0, 0)
         self.setStretchFactor(1, 1)
 
-    def addGrid(self, vbox, query, numTourneys, tourneyTypes, playerids, sitenos, seats):
-        sqlrow = 0
+    def addGrid(self, vbox, query, numTourneys, tourneyTypes, playerids, sitenos, seats, done=None):
         grid=numTourneys #TODO: should this be numTourneyTypes?
         
         query = self.sql.query[query]
         query = self.refineQuery(query, numTourneys, tourneyTypes, playerids, sitenos, seats)
-        self.cursor.execute(query)
-        result = self.cursor.fetchall()
-        colnames = [desc[0] for desc in self.cursor.description]
 
         # pre-fetch some constant values:
         #self.cols_to_show = [x for x in self.columns if x[colshow]]
@@ -141,7 +141,11 @@ class GuiTourneyPlayerStats(QSplitter):
             self.listcols[grid].append(s)
         self.liststore[grid].setHorizontalHeaderLabels(self.listcols[grid])
 
-        rows = len(result) # +1 for title row
+        self.executor.submit(query, partial(self.addRows, grid), partial(self.gridDone, view, done))
+
+    def addRows(self, grid, result, colnames):
+        sqlrow = 0
+        rows = len(result)
 
         while sqlrow < rows:
             treerow = []
@@ -167,15 +171,20 @@ class GuiTourneyPlayerStats(QSplitter):
             self.liststore[grid].appendRow(treerow)
             sqlrow += 1
 
+    def gridDone(self, view, done):
         view.resizeColumnsToContents()
         view.setSortingEnabled(True)
+        if done is not None:
+            done()
 
     def createStatsTable(self, vbox, tourneyTypes, playerids, sitenos, seats):
         startTime = time()
 
         numTourneys = self.filters.getNumTourneys()
-        self.addGrid(vbox, 'tourneyPlayerDetailedStats', numTourneys, tourneyTypes, playerids, sitenos, seats)
+        self.addGrid(vbox, 'tourneyPlayerDetailedStats', numTourneys, tourneyTypes, playerids, sitenos, seats,
+                     partial(self.statsDone, startTime))
 
+    def statsDone(self, startTime):
         print _("Stats page displayed in %4.2f seconds") % (time() - startTime)
 
     def fillStatsFrame(self, vbox):
@@ -286,6 +295,7 @@ class GuiTourneyPlayerStats(QSplitter):
         return(query)
 
     def refreshStats(self, widget):
+        self.executor.cancel()
 #        self.last_pos = self.stats_vbox.get_position()
         self.stats_frame.layout().removeWidget(self.stats_vbox)
         self.stats_vbox.setParent(None)
@@ -39,7 +39,7 @@ import string
 import logging
 
 from PyQt5.QtCore import (QCoreApplication, QMetaObject, QObject, Qt,
-                          QThread, pyqtSignal)
+                          QSocketNotifier, QThread, pyqtSignal)
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import (QApplication, QLabel, QMainWindow,
                              QVBoxLayout, QWidget)
@@ -104,6 +104,7 @@ class HUD_main(QObject):
         self.db_connection = Database.Database(self.config)
         #update and save config
         self.hud_dict = {}
+        self.stat_cache = {} # running HudCache totals shared by the tables, see Database.get_stats_from_hand_cached
         self.blacklist = [] #a list of blacklisted table numbers (handles)
         self.hud_params = self.config.get_hud_ui_parameters()
         self.deck = Deck.Deck(self.config,
@@ -139,6 +140,13 @@ class HUD_main(QObject):
         if os.path.exists(cards):
             self.main_window.setWindowIcon(QIcon(cards))
 
+        # XTables reports moved, resized, closed and renamed tables as X events, those
+        # are handled as they arrive. Elsewhere the timer polls the table windows.
+        self.table_tracker = getattr(Tables, 'tracker', None)
+        if self.table_tracker is not None:
+            self.tablenotifier = QSocketNotifier(self.table_tracker.fileno(), QSocketNotifier.Read)
+            self.tablenotifier.activated.connect(lambda fd: self.check_tables())
+
         self.startTimer(800)
         self.main_window.show()
 
@@ -341,7 +349,8 @@ class HUD_main(QObject):
                                                  , self.hud_dict[temp_key].hud_params['h_hud_days'])
             #print "update an existing hud ", temp_key, self.hud_dict[temp_key].hud_params
             stat_dict = self.db_connection.get_stats_from_hand(new_hand_id, type, self.hud_dict[temp_key].hud_params,
-                                                               self.hero_ids[site_id], num_seats)
+                                                               self.hero_ids[site_id], num_seats,
+                                                               self.stat_cache, temp_key)
 
             try:
                 self.hud_dict[temp_key].stat_dict = stat_dict
@@ -362,7 +371,8 @@ class HUD_main(QObject):
 
             self.db_connection.init_hud_stat_vars( self.hud_params['hud_days'], self.hud_params['h_hud_days'] )
             stat_dict = self.db_connection.get_stats_from_hand(new_hand_id, type, self.hud_params,
-                                                               self.hero_ids[site_id], num_seats)
+                                                               self.hero_ids[site_id], num_seats,
+                                                               self.stat_cache, temp_key)
 
             #Confirm our hero is seated for this hand, otherwise we must __not__ create a hud
             # because it is impossible to work out who is sitting where, and that working-out
@@ -436,7 +446,9 @@ def idle_kill(hud_main, table):
             hud_main.hud_dict[table].tablehudlabel.setParent(None)
 #            hud_main.hud_dict[table].main_window.destroy()
             hud_main.hud_dict[table].kill()
+            hud_main.hud_dict[table].table.stop_tracking()
             del(hud_main.hud_dict[table])
+        hud_main.db_connection.release_cached_stats(hud_main.stat_cache, table)
         hud_main.main_window.resize(1, 1)
     except:
         log.exception(_("Error killing HUD for table: %s.") % table.title)
@@ -468,6 +480,9 @@ def idle_update(hud_main, new_hand_id, table_name, config):
 
 def idle_check_tables(hud_main):
     try:
+        if hud_main.table_tracker is not None:
+            idle_track_tables(hud_main)
+            return
         for tablename, hud in hud_main.hud_dict.items():
             status = hud.table.check_table()
             if status == "client_destroyed":
@@ -479,6 +494,31 @@ def idle_check_tables(hud_main):
     except:
         log.exception("Error checking tables.")
 
+def idle_track_tables(hud_main):
+    # only the tables the tracker has seen change are checked, check_table()
+    # then compares against the geometry the tracker already has
+    huds = dict((hud.table.number, hud) for hud in hud_main.hud_dict.values())
+    changes = hud_main.table_tracker.changes()
+    if hud_main.table_tracker.lost:
+        # a broken connection stays readable, stop listening to it
+        hud_main.tablenotifier.setEnabled(False)
+    for (window, change) in changes:
+        hud = huds.get(window)
+        if hud is None or hud.table.key not in hud_main.hud_dict:
+            continue
+        if change == "title":
+            if hud.table.type == "tour" and hud.table.has_table_title_changed(hud):
+                hud_main.table_is_stale(hud)
+            continue
+        status = hud.table.check_size()
+        if status == "client_destroyed":
+            hud_main.client_destroyed(None, hud)
+            continue
+        if status == "client_resized":
+            hud_main.client_resized(None, hud)
+        if hud.table.check_loc() == "client_moved":
+            hud_main.client_moved(None, hud)
+
 if __name__== "__main__":
     app = QApplication([])
 
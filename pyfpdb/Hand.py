@@ -23,15 +23,17 @@ _ = L10n.get_translation()
 import sys
 from decimal_wrapper import Decimal
 import datetime
+import threading
 from string import upper
 import pprint
+from collections import OrderedDict
 
 import logging
 # logging has been set up in fpdb.py or HUD_main.py, use their settings:
 log = logging.getLogger("parser")
 
 import Configuration
-from Exceptions import FpdbHandDuplicate, FpdbHandPartial, FpdbParseError
+from Exceptions import FpdbHandDuplicate, FpdbHandPartial, FpdbParseError, FpdbHandError
 import DerivedStats
 import Card
 Configuration.set_logfile("fpdb-log.txt")
@@ -176,6 +178,13 @@ class Hand(object):
         self.pot.setSym(self.sym)
         self.is_duplicate = False  # i.e. don't update hudcache if true
 
+    def __getstate__(self):
+        # Hands are pickled back from the parallel import workers. The
+        # Configuration doesn't need to travel, the receiver sets its own.
+        state = self.__dict__.copy()
+        state['config'] = None
+        return state
+
     def __str__(self):
         vars = ( (_("BB"), self.bb),
                  (_("SB"), self.sb),
@@ -301,6 +310,16 @@ class Hand(object):
         self.handsstove = self.stats.getHandsStove()
         self.handspots = self.stats.getHandsPots()
 
+    def getDuplicateKey(self):
+        """The key Database.isDuplicate knows this hand by, available before assembleHand"""
+        if self.publicDB:
+            heroSeat = 0
+            for player in self.players:
+                if self.hero==player[1]:
+                    heroSeat = player[0]
+            return (self.handid, self.siteId, heroSeat)
+        return (self.handid, self.siteId)
+
     def getHandId(self, db, id):
         if db.isDuplicate(self.siteId, self.hands['siteHandNo'], self.hands['heroSeat'], self.publicDB):
             #log.debug(_("Hand.insert(): hid #: %s is a duplicate") % self.hands['siteHandNo'])
@@ -377,20 +396,17 @@ class Hand(object):
 
     def select(self, db, handId):
         """ Function to create Hand object from database """
-        c = db.get_cursor()
-        q = db.sql.query['playerHand']
-        q = q.replace('%s', db.sql.query['placeholder'])
+        rows = db.get_hands_for_replay([handId])[int(handId)]
+        self.select_rows(rows['hand'], rows['players'], rows['boards'], rows['actions'])
 
-        c.execute("select heroseat from Hands where id = {}".format(handId))
-        heroSeat = c.fetchone()[0]
+    def select_rows(self, res, players, boards, actions):
+        """ Build the Hand from rows fetched by Database.get_hands_for_replay: the Hands
+            row, and the HandsPlayers, Boards and HandsActions rows of the hand in order.
+            Column names are lowercase as the supported dbs differ on what they return."""
+        heroSeat = res['heroseat']
 
         # PlayerStacks
-        c.execute(q, (handId,))
-        # See NOTE: below on what this does.
-
-        # Discripter must be set to lowercase as postgres returns all descriptors lower case and SQLight returns them as they are
-        res = [dict(line) for line in [zip([ column[0].lower() for column in c.description], row) for row in c.fetchall()]]
-        for row in res:
+        for row in players:
             self.addPlayer(row['seatno'],row['name'],str(row['chips']), str(row['position']), row['sitout'], str(row['bounty']))
             cardlist = []
             cardlist.append(Card.valueSuitFromCard(row['card1']))
@@ -444,24 +460,9 @@ class Hand(object):
 
 
         # HandInfo
-        q = db.sql.query['singleHand']
-        q = q.replace('%s', db.sql.query['placeholder'])
-        c.execute(q, (handId,))
-
-        # NOTE: This relies on row_factory = sqlite3.Row (set in connect() params)
-        #       Need to find MySQL and Postgres equivalents
-        #       MySQL maybe: cursorclass=MySQLdb.cursors.DictCursor
-        #res = c.fetchone()
-
-        # Using row_factory is global, and affects the rest of fpdb. The following 2 line achieves
-        # a similar result
-
-        # Discripter must be set to lowercase as supported dbs differ on what is returned.
-        res = [dict(line) for line in [zip([ column[0].lower() for column in c.description], row) for row in c.fetchall()]]
-        res = res[0]
-
         self.tablename = res['tablename']
         self.handid    = res['sitehandno']
+        self.tourneyId = res['tourneyid']
         # FIXME: Need to figure out why some times come out of the DB as %Y-%m-%d %H:%M:%S+00:00,
         #        and others as %Y-%m-%d %H:%M:%S
         
@@ -483,11 +484,7 @@ class Hand(object):
             self.setCommunityCards('RIVER', [cards[4]])
 
         if res['runittwice'] or self.gametype['split']:
-            # Get runItTwice boards
-            q = db.sql.query['singleHandBoards']
-            q = q.replace('%s', db.sql.query['placeholder'])
-            c.execute(q, (handId,))
-            boards = [dict(line) for line in [zip([ column[0].lower() for column in c.description], row) for row in c.fetchall()]]
+            # runItTwice boards
             for b in boards:
                 cards = map(Card.valueSuitFromCard, [b['boardcard1'], b['boardcard2'], b['boardcard3'], b['boardcard4'], b['boardcard5']])
                 if cards[0]:
@@ -518,13 +515,7 @@ class Hand(object):
         # street3Pot | street4Pot | showdownPot | comment | commentTs | texture
 
         # Actions
-        q = db.sql.query['handActions']
-        q = q.replace('%s', db.sql.query['placeholder'])
-        c.execute(q, (handId,))
-        
-        # Discripter must be set to lowercase as supported dbs differ on what is returned.
-        res = [dict(line) for line in [zip([ column[0].lower() for column in c.description], row) for row in c.fetchall()]]
-        for row in res:
+        for row in actions:
             name = row['name']
             street = row['street']
             act = row['actionid']
@@ -1906,25 +1897,80 @@ class Pot(object):
 
         return ret + ''.join([ (" Side pot %s%.2f." % (self.sym, self.pots[x][0]) ) for x in xrange(1, len(self.pots)) ])
         
-def hand_factory(hand_id, config, db_connection):
+class HandCache(object):
+    """Least recently used cache of Hand objects built from the db, for viewers
+       that page back and forth through the same hands. The hand viewer fills
+       it from a worker thread while the gui reads it, so it is locked."""
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.hands = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, hand_id):
+        with self.lock:
+            hand = self.hands.pop(hand_id, None)
+            if hand is not None:
+                self.hands[hand_id] = hand
+            return hand
+
+    def put(self, hand_id, hand):
+        with self.lock:
+            self.hands.pop(hand_id, None)
+            self.hands[hand_id] = hand
+            while len(self.hands) > self.size:
+                self.hands.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.hands.clear()
+
+def hand_factory(hand_id, config, db_connection, cache=None):
     # a factory function to discover the base type of the hand
     # and to return a populated class instance of the correct hand
-    
-    gameinfo = db_connection.get_gameinfo_from_hid(hand_id)
-
-    if gameinfo['base'] == 'hold':
-        hand_instance = HoldemOmahaHand(config=config, hhc=None, sitename=gameinfo['sitename'],
-         gametype = gameinfo, handText=None, builtFrom = "DB", handid=hand_id)
-    elif gameinfo['base'] == 'stud':
-        hand_instance = StudHand(config=config, hhc=None, sitename=gameinfo['sitename'],
-         gametype = gameinfo, handText=None, builtFrom = "DB", handid=hand_id)
-    elif gameinfo['base'] == 'draw':
-        hand_instance = DrawHand(config=config, hhc=None, sitename=gameinfo['sitename'],
-         gametype = gameinfo, handText=None, builtFrom = "DB", handid=hand_id)
-
-    hand_instance.select(db_connection, hand_id)
-    hand_instance.handid_selected = hand_id #hand_instance does not supply this, create it here
-    
-    return hand_instance
+    hands = hands_factory([hand_id], config, db_connection, cache)
+    if not hands:
+        raise FpdbHandError(_("Hand %s not found in the database") % hand_id)
+    return hands[0]
+
+def hands_factory(hand_ids, config, db_connection, cache=None):
+    # like hand_factory for a list of hands, which are read with a few queries
+    # for all of them. Returns the hands in the order of hand_ids, leaving out
+    # ids that are not in the db or fail to rebuild. Hands in cache are not read again.
+    hands = {}
+    if cache is not None:
+        for hand_id in hand_ids:
+            hand = cache.get(int(hand_id))
+            if hand is not None:
+                hands[int(hand_id)] = hand
+    missing = [int(hand_id) for hand_id in hand_ids if int(hand_id) not in hands]
+    if missing:
+        found = db_connection.get_hands_for_replay(missing)
+        for hand_id in missing:
+            if hand_id not in found:
+                continue
+            rows = found[hand_id]
+            gameinfo = rows['gameinfo']
+            if gameinfo['base'] == 'hold':
+                hand_instance = HoldemOmahaHand(config=config, hhc=None, sitename=gameinfo['sitename'],
+                 gametype = gameinfo, handText=None, builtFrom = "DB", handid=hand_id)
+            elif gameinfo['base'] == 'stud':
+                hand_instance = StudHand(config=config, hhc=None, sitename=gameinfo['sitename'],
+                 gametype = gameinfo, handText=None, builtFrom = "DB", handid=hand_id)
+            elif gameinfo['base'] == 'draw':
+                hand_instance = DrawHand(config=config, hhc=None, sitename=gameinfo['sitename'],
+                 gametype = gameinfo, handText=None, builtFrom = "DB", handid=hand_id)
+
+            try:
+                hand_instance.select_rows(rows['hand'], rows['players'], rows['boards'], rows['actions'])
+            except Exception, e:
+                # one hand that can't be rebuilt shouldn't cost the others
+                log.error(_("Hand %s could not be read from the database: %s"), hand_id, e)
+                continue
+            hand_instance.handid_selected = hand_id #hand_instance does not supply this, create it here
+            hands[hand_id] = hand_instance
+            if cache is not None:
+                cache.put(hand_id, hand_instance)
+    return [hands[int(hand_id)] for hand_id in hand_ids if int(hand_id) in hands]
 
 
@@ -20,6 +20,9 @@ _ = L10n.get_translation()
 
 import re
 import sys
+import itertools
+import bisect
+from collections import deque
 import traceback
 from optparse import OptionParser
 import os
@@ -48,6 +51,8 @@ import Configuration
 class HandHistoryConverter():
 
     READ_CHUNK_SIZE = 10000 # bytes to read at a time from file in tail mode
+    DECODE_KEEP = 16        # chunks of text kept from checking a codec, see openFile
+    SPLIT_LOOKAHEAD = 1000  # characters that must follow a hand separator before it is trusted
 
     # filetype can be "text" or "xml"
     # so far always "text"
@@ -60,6 +65,9 @@ class HandHistoryConverter():
     codepage = "cp1252"
 
     re_tzOffset = re.compile('^\w+[+-]\d{4}$')
+    re_LineStart = re.compile('\S\n')   # matched against the reversed text
+    re_StarsArchive = re.compile('^Hand #\d+', re.MULTILINE)
+    re_FtpArchive = re.compile('\*{20}\s#\s\d+\s\*{20,25}\s+', re.MULTILINE)
     copyGameHeader = False
     summaryInFile  = False
 
@@ -85,8 +93,15 @@ out_path  (default '-' = sys.stdout)
         self.base_name = self.getBasename()
         self.out_path = out_path
         self.kodec = None
+        self.resume = None
+        self.decoder = None
+        self.pending = None
+        self.decoded = deque()  # (text, byte offset after it) decoded while picking the codec, for readChunk
+        self.bytepos = 0        # byte offset in_path has been decoded to
+        self.checkpoints = []   # (character, byte) offsets at the chunk boundaries read
 
         self.processedHands = []
+        self.failedHands = []   # texts of the hands that raised FpdbParseError, for the raw hand archive
         self.numHands = 0
         self.numErrors = 0
         self.numPartial = 0
@@ -131,14 +146,17 @@ HandHistoryConverter: '%(sitename)s'
         self.numSkipped = 0
         self.numErrors = 0
         lastParsed = None
-        handsList = self.allHandsAsList()
-        log.debug( _("Hands list is:") + str(handsList))
-        log.info(_("Parsing %d hands") % len(handsList))
+        handsList = self.allHandsAsIter()
         # Determine if we're dealing with a HH file or a Summary file
         # quick fix : empty files make the handsList[0] fail ==> If empty file, go on with HH parsing
-        if len(handsList) == 0 or self.isSummary(handsList[0]) == False:
+        firstHand = next(handsList, None)
+        if firstHand is not None:
+            handsList = itertools.chain([firstHand], handsList)
+        if firstHand is None or self.isSummary(firstHand) == False:
             self.parsedObjectType = "HH"
+            handText = None
             for handText in handsList:
+                self.numHands += 1
                 try:
                     self.processedHands.append(self.processHand(handText))
                     lastParsed = 'stored'
@@ -151,24 +169,25 @@ HandHistoryConverter: '%(sitename)s'
                     lastParsed = 'skipped'
                 except FpdbParseError:
                     self.numErrors += 1
+                    self.failedHands.append(handText)
                     lastParsed = 'error'
                     log.error(_("FpdbParseError for file '%s'") % self.in_path)
             if lastParsed in ('partial', 'error') and self.autoPop:
-                self.index -= len(handsList[-1])
+                self.index -= len(handText)
                 if self.isCarraige:
-                     self.index -= handsList[-1].count('\n')
-                handsList.pop()
+                     self.index -= handText.count('\n')
+                self.numHands -= 1
                 if lastParsed=='partial':
                     self.numPartial -= 1
                 else:
                     self.numErrors -= 1
+                    self.failedHands.pop()
                 log.info(_("Removing partially written hand & resetting index"))
-            self.numHands = len(handsList)
             endtime = time.time()
             log.info(_("Read %d hands (%d failed) in %.3f seconds") % (self.numHands, (self.numErrors + self.numPartial), endtime - starttime))
         else:
             self.parsedObjectType = "Summary"
-            summaryParsingStatus = self.readSummaryInfo(handsList)
+            summaryParsingStatus = self.readSummaryInfo(list(handsList))
             endtime = time.time()
             if summaryParsingStatus :
                 log.info(_("Summary file '%s' correctly parsed (took %.3f seconds)") % (self.in_path, endtime - starttime))
@@ -180,27 +199,19 @@ HandHistoryConverter: '%(sitename)s'
                 
     def allHandsAsList(self):
         """Return a list of handtexts in the file at self.in_path"""
-        #TODO : any need for this to be generator? e.g. stars support can email one huge file of all hands in a year. Better to read bit by bit than all at once.
+        if self.copyGameHeader or self.filetype != "text":
+            return self.readAllHands()
+        return list(self.allHandsAsIter())
+
+    def readAllHands(self):
+        """Read the whole file at self.in_path and return a list of its handtexts.
+           Used by the converters that need self.whole_file (copyGameHeader)"""
         self.readFile()
         lenobs = len(self.obs)
         self.obs = self.obs.rstrip()
         self.index -= (lenobs - len(self.obs))
         self.obs = self.obs.lstrip()
-        lenobs = len(self.obs)
-        self.obs = self.obs.replace('\r\n', '\n').replace(u'\xa0', u' ')
-        if lenobs != len(self.obs):
-            self.isCarraige = True
-        # maybe archive params should be one archive param, then call method in specific converter?
-        # if self.archive:
-        #     self.obs = self.convert_archive(self.obs)
-        if self.starsArchive == True:
-            m = re.compile('^Hand #\d+', re.MULTILINE)
-            self.obs = m.sub('', self.obs)
-
-        if self.ftpArchive == True:
-            # Remove  ******************** # 1 *************************
-            m = re.compile('\*{20}\s#\s\d+\s\*{20,25}\s+', re.MULTILINE)
-            self.obs = m.sub('', self.obs)
+        self.obs = self.normaliseText(self.obs)
     
         if self.obs is None or self.obs == "":
             log.info(_("Read no hands from file: '%s'") % self.in_path)
@@ -210,13 +221,101 @@ HandHistoryConverter: '%(sitename)s'
         # ie. </game> (split) </session>EOL
         # Remove this dangler if less than 50 characters and warn in the log
         if len(handlist[-1]) <= 50:
-            self.index -= len(handlist[-1])
-            if self.isCarraige:
-                self.index -= handlist[-1].count('\n')
-            handlist.pop()
-            log.info(_("Removing text < 50 characters & resetting index"))
+            self.removeDangler(handlist.pop())
         return handlist
 
+    def allHandsAsIter(self):
+        """Yield the handtexts in the file at self.in_path one at a time.
+           The file is decoded READ_CHUNK_SIZE at a time and only the text of the
+           hand currently being split is held in memory, so a huge archive (e.g. a
+           year of emailed stars hands) doesn't have to be read in one go."""
+        if self.copyGameHeader or self.filetype != "text":
+            for handText in self.readAllHands():
+                yield handText
+            return
+        in_fh = self.openFile()
+        if in_fh is None:
+            return
+        lead, eof, nhands = True, False, 0
+        tail, buf = u'', u''
+        trailing = 0    # length of the whitespace run at the end of what has been read
+        try:
+            while not eof:
+                chunk = self.readChunk(in_fh)
+                if chunk is None:
+                    chunk = u''
+                elif chunk == u'':
+                    continue
+                if chunk:
+                    self.index += len(chunk)
+                    self.checkpoints.append((self.index, self.bytepos))
+                    text = chunk.rstrip()
+                    trailing = trailing + len(chunk) if text == u'' else len(chunk) - len(text)
+                    # hold back everything after the last line start so that \r\n pairs,
+                    # archive headers and split separators are never cut in two
+                    text = tail + chunk
+                    cut = self.re_LineStart.search(text[::-1])
+                    if cut is None:
+                        tail = text
+                        continue
+                    cut = len(text) - 1 - cut.start()
+                    text, tail = text[:cut], text[cut:]
+                else:
+                    eof = True
+                    self.index -= trailing
+                    text, tail = tail.rstrip(), u''
+                if lead:
+                    text = text.lstrip()
+                    lead = (text == u'')
+                buf += self.normaliseText(text)
+
+                # only accept a separator that has enough text after it to be complete
+                limit = len(buf) if eof else len(buf) - self.SPLIT_LOOKAHEAD
+                start = 0
+                for m in self.re_SplitHands.finditer(buf):
+                    if m.end() > limit:
+                        break
+                    nhands += 1
+                    yield buf[start:m.start()]
+                    start = m.end()
+                buf = buf[start:]
+        finally:
+            in_fh.close()
+
+        if nhands == 0 and buf == u'':
+            log.info(_("Read no hands from file: '%s'") % self.in_path)
+            return
+        # Some HH formats leave dangling text after the split
+        # ie. </game> (split) </session>EOL
+        # Remove this dangler if less than 50 characters and warn in the log
+        if len(buf) <= 50:
+            self.removeDangler(buf)
+        else:
+            yield buf
+
+    def normaliseText(self, text):
+        """Normalise line endings and spaces and strip archive headers from text"""
+        lenobs = len(text)
+        text = text.replace('\r\n', '\n').replace(u'\xa0', u' ')
+        if lenobs != len(text):
+            self.isCarraige = True
+        # maybe archive params should be one archive param, then call method in specific converter?
+        # if self.archive:
+        #     text = self.convert_archive(text)
+        if self.starsArchive == True:
+            text = self.re_StarsArchive.sub('', text)
+
+        if self.ftpArchive == True:
+            # Remove  ******************** # 1 *************************
+            text = self.re_FtpArchive.sub('', text)
+        return text
+
+    def removeDangler(self, text):
+        self.index -= len(text)
+        if self.isCarraige:
+            self.index -= text.count('\n')
+        log.info(_("Removing text < 50 characters & resetting index"))
+
     def processHand(self, handText):
         if self.isPartial(handText):
             raise FpdbHandPartial(_("Could not identify as a %s hand") % self.sitename)
@@ -489,6 +588,115 @@ or None if we fail to get the info """
         elif self.filetype == "":
             pass
 
+    def openFile(self):
+        """Open in_path with the first codec in self.codepage that can decode it.
+           Returns the file positioned self.index characters in, with
+           self.decoder ready to decode from there, or None if the file can't
+           be read. If a resume point is set the file is seeked straight to it
+           and nothing before it is decoded again. Otherwise each codec but the
+           last is tried on the whole file before any hand is handed out. The
+           text of its first DECODE_KEEP chunks is kept for readChunk, the rest
+           is thrown away and decoded again as it is read, so only a small file
+           is decoded once and a big one is never held in memory."""
+        self.checkpoints = []
+        self.decoded = deque()
+        kodecs = self.__listof(self.codepage)
+        resume = self.resume
+        if resume is not None:
+            (charpos, bytepos, kodec) = resume
+            if charpos > self.index or not os.path.exists(self.in_path) or bytepos > os.path.getsize(self.in_path):
+                resume = None   # file has been replaced or truncated, start again
+            else:
+                kodecs = [kodec]
+        for kodec in kodecs:
+            try:
+                in_fh = open(self.in_path, 'rb')
+            except IOError:
+                break
+            try:
+                self.decoder = codecs.getincrementaldecoder(kodec)()
+                (charpos, bytepos) = (0, 0) if resume is None else resume[:2]
+                seekpos = bytepos
+                if resume is None and kodec != kodecs[-1]:
+                    # try the whole file up front, there is no going back once hands have been handed out
+                    decoded = deque()
+                    data = in_fh.read(self.READ_CHUNK_SIZE)
+                    while data:
+                        text = self.decoder.decode(data)
+                        if len(decoded) < self.DECODE_KEEP:
+                            decoded.append((text, in_fh.tell() - len(self.decoder.getstate()[0])))
+                        data = in_fh.read(self.READ_CHUNK_SIZE)
+                    self.decoder.decode('', True)
+                    self.decoded = decoded
+                    # carry on decoding after the text that was kept
+                    self.decoder = codecs.getincrementaldecoder(kodec)()
+                    in_fh.seek(0)
+                    if decoded:
+                        seekpos = decoded[-1][1]
+                if seekpos and codecs.lookup(kodec).name == 'utf-16':
+                    # the byte order comes from the BOM at the start of the file
+                    self.decoder.decode(in_fh.read(2))
+                in_fh.seek(seekpos)
+                self.bytepos = bytepos
+                skip, self.index = self.index - charpos, charpos
+                self.checkpoints.append((charpos, bytepos))
+                self.kodec = kodec
+                while skip > 0:
+                    text = self.readChunk(in_fh)
+                    if not text:
+                        if text is None:
+                            break
+                        continue
+                    if len(text) > skip:
+                        # give the rest back to allHandsAsIter
+                        self.pending = text[skip:]
+                        text = text[:skip]
+                    skip -= len(text)
+                    self.index += len(text)
+                    if self.pending is None:
+                        self.checkpoints.append((self.index, self.bytepos))
+                return in_fh
+            except (UnicodeError, LookupError):
+                in_fh.close()
+        log.error(_("unable to read file with any codec in list!") + " " + self.in_path)
+        return None
+
+    def readChunk(self, in_fh):
+        """Decode the next READ_CHUNK_SIZE bytes of in_fh, or return the next
+           text openFile already decoded. Returns None at the end of the file. A multibyte character that is still being written is left
+           in the decoder, it is not read until it is complete."""
+        if self.pending is not None:
+            text, self.pending = self.pending, None
+            return text
+        if self.decoded:
+            (text, self.bytepos) = self.decoded.popleft()
+            return text
+        data = in_fh.read(self.READ_CHUNK_SIZE)
+        if not data:
+            return None
+        try:
+            text = self.decoder.decode(data)
+        except UnicodeError:
+            log.error(_("unable to read file with any codec in list!") + " " + self.in_path)
+            return None
+        self.bytepos = in_fh.tell() - len(self.decoder.getstate()[0])
+        return text
+
+    def setResumePoint(self, resume):
+        """resume is a (character, byte, codec) tuple from getResumePoint of an
+           earlier read of the same file"""
+        self.resume = resume
+
+    def getResumePoint(self):
+        """Return the last (character, byte, codec) position at or before
+           self.index, for the next read of a growing file to seek to"""
+        if not self.checkpoints:
+            return None
+        i = bisect.bisect_right(self.checkpoints, (self.index, sys.maxint)) - 1
+        if i < 0:
+            return None
+        return self.checkpoints[i] + (self.kodec,)
+
     def guessMaxSeats(self, hand):
         """Return a guess at maxseats when not specified in HH."""
         # if some other code prior to this has already set it, return it
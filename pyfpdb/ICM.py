@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""ICM.py
+
+Independent Chip Model (Malmuth-Harville) tournament equity.
+Each place is won with probability proportional to stack among the players
+not yet placed. Instead of recursing over every finishing order, the
+probability of every set of players taking the top places is built up one
+place at a time, so a final table costs n * 2**n steps instead of n!.
+"""
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#    In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import L10n
+_ = L10n.get_translation()
+
+#    Standard Library modules
+import logging
+
+#    Other Library modules
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+log = logging.getLogger("db")
+
+NUMPY_SUBSETS = 1000    # from this many sets of placed players on numpy is used when available
+NUMPY_PLAYERS = 20      # the numpy version keeps 2**n floats, more players than this use python
+MAX_SUBSETS = 1 << 20   # refuse tables that would take too long
+CACHE_SIZE = 4096       # results kept by equities()
+
+_cache = {}
+
+
+def equities(stacks, payouts):
+    """ICM equity of each stack, in the order of stacks, as floats in the units
+       of payouts. payouts[0] is paid for 1st place and so on, places beyond
+       the list pay nothing. Players without chips get nothing.
+       Results are memoized on (stacks, payouts)."""
+    key = (tuple(float(s) for s in stacks), tuple(float(p) for p in payouts))
+    result = _cache.get(key)
+    if result is None:
+        if len(_cache) >= CACHE_SIZE:
+            _cache.clear()
+        result = _cache[key] = tuple(_equities(*key))
+    return list(result)
+
+def ev_diff(stacks, payouts, new_stacks):
+    """Change in ICM equity of each player from stacks to new_stacks, eg. to
+       turn the chip allInEV of a tournament hand into tournament money."""
+    return [after - before for (before, after) in zip(equities(stacks, payouts), equities(new_stacks, payouts))]
+
+def _equities(stacks, payouts):
+    # players with chips, only they take part in the model
+    alive = [i for (i, s) in enumerate(stacks) if s > 0]
+    result = [0.0] * len(stacks)
+    places = min(len(payouts), len(alive))
+    if places == 0:
+        return result
+    subsets = sum(_choose(len(alive), k) for k in xrange(places))
+    if subsets > MAX_SUBSETS:
+        raise ValueError(_("ICM: %d players with %d paid places is too many") % (len(alive), places))
+    chips = [float(stacks[i]) for i in alive]
+    if numpy is not None and subsets >= NUMPY_SUBSETS and len(alive) <= NUMPY_PLAYERS:
+        values = _np_equities(chips, payouts[:places])
+    else:
+        values = _py_equities(chips, payouts[:places])
+    for (i, value) in zip(alive, values):
+        result[i] = value
+    return result
+
+def _choose(n, k):
+    result = 1
+    for i in xrange(k):
+        result = result * (n - i) / (i + 1)
+    return result
+
+def _py_equities(chips, payouts):
+    n = len(chips)
+    total = sum(chips)
+    eq = [0.0] * n
+    # probability that the players in the mask took the first len(mask) places
+    layer = {0: (1.0, total)}    # mask -> (probability, chips left)
+    for payout in payouts:
+        nextlayer = {}
+        for (mask, (prob, left)) in layer.iteritems():
+            for j in xrange(n):
+                bit = 1 << j
+                if mask & bit:
+                    continue
+                p = prob * chips[j] / left
+                eq[j] += payout * p
+                target = mask | bit
+                if target in nextlayer:
+                    nextlayer[target] = (nextlayer[target][0] + p, left - chips[j])
+                else:
+                    nextlayer[target] = (p, left - chips[j])
+        layer = nextlayer
+    return eq
+
+def _np_equities(chips, payouts):
+    n = len(chips)
+    size = 1 << n
+    chips = numpy.array(chips, dtype=numpy.float64)
+    left = numpy.empty(size)
+    left.fill(chips.sum())
+    count = numpy.zeros(size, dtype=numpy.int8)
+    for j in xrange(n):
+        # the masks with bit j set are the second half of each block of 2**(j+1)
+        left.reshape(-1, 2, 1 << j)[:, 1, :] -= chips[j]
+        count.reshape(-1, 2, 1 << j)[:, 1, :] += 1
+    prob = numpy.zeros(size)
+    prob[0] = 1.0
+    eq = numpy.zeros(n)
+    for (place, payout) in enumerate(payouts):
+        masks = numpy.flatnonzero(count == place)
+        share = prob[masks] / left[masks]
+        for j in xrange(n):
+            bit = 1 << j
+            sel = (masks & bit) == 0
+            p = share[sel] * chips[j]
+            eq[j] += payout * p.sum()
+            # each mask without j reaches a different mask with j
+            prob[masks[sel] | bit] += p
+    return eq.tolist()
@@ -24,6 +24,7 @@ import os
 from time import time
 from optparse import OptionParser
 import codecs
+import cPickle
 import Database
 import Configuration
 import logging
@@ -34,6 +35,7 @@ except:
 # logging has been set up in fpdb.py or HUD_main.py, use their settings:
 log = logging.getLogger("parser")
 
+# the dividers are searched in the whole file as read, \s also matches the \r of \r\n line ends
 re_Divider, re_Head, re_XLS  = {}, {}, {}
 re_Divider['PokerStars'] = re.compile(r'^Hand #(\d+)\s*$', re.MULTILINE)
 re_Divider['Fulltilt'] = re.compile(r'\*{20}\s#\s\d+\s\*{15,25}\s?', re.MULTILINE)
@@ -113,18 +115,25 @@ class Site:
             self.re_HeroCards2 = obj.re_HeroCards2 
 
 class IdentifySite:
+    CACHE_VERSION = 1
+
     def __init__(self, config, hhcs = None):
         self.config = config
         self.codepage = ("utf8", "utf-16", "cp1252", "ISO-8859-1")
         self.sitelist = {}
         self.filelist = {}
         self.generateSiteList(hhcs)
+        # path -> ((size, mtime), result of idSite), kept in the database directory between runs
+        self.cache_path = os.path.join(config.dir_database, u'IdentifySite.cache')
+        self.idcache = None
+        self.cache_changed = False
 
     def scan(self, path):
         if os.path.isdir(path):
             self.walkDirectory(path, self.sitelist)
         else:
             self.processFile(path)
+        self.save_cache()
             
     def get_fobj(self, file):
         try:
@@ -174,13 +183,96 @@ class IdentifySite:
 
     def processFile(self, path):
         if path not in self.filelist:
-            whole_file, kodec = self.read_file(path)
-            if whole_file:
+            try:
+                st = os.stat(path)
+                stamp = (st.st_size, st.st_mtime)
+            except OSError:
+                stamp = None
+            fobj = self.get_cached(path, stamp)
+            if fobj is None:
+                whole_file, kodec = self.read_file(path)
+                if not whole_file:
+                    return
                 fobj = self.idSite(path, whole_file, kodec)
-                if fobj == False: # Site id failed
-                    log.debug(_("DEBUG:") + " " + _("siteId Failed for: %s") % path)
-                else:
-                    self.filelist[path] = fobj
+                self.put_cached(path, stamp, fobj)
+            if fobj == False: # Site id failed
+                log.debug(_("DEBUG:") + " " + _("siteId Failed for: %s") % path)
+            else:
+                self.filelist[path] = fobj
+
+    def load_cache(self):
+        self.idcache = {}
+        try:
+            with open(self.cache_path, 'rb') as cachefile:
+                (version, idcache) = cPickle.load(cachefile)
+            if version == self.CACHE_VERSION:
+                self.idcache = idcache
+        except IOError:
+            pass
+        except Exception, e:
+            log.warning(_("Ignoring unreadable site identification cache '%s': %s") % (self.cache_path, e))
+
+    def save_cache(self):
+        """Write the identification results back to disk, call once a scan is done.
+           Entries of files that are gone or have changed since are left out."""
+        if not self.cache_changed:
+            return
+        for (path, (stamp, result)) in self.idcache.items():
+            try:
+                st = os.stat(path)
+                if (st.st_size, st.st_mtime) != stamp:
+                    del self.idcache[path]
+            except OSError:
+                del self.idcache[path]
+        try:
+            with open(self.cache_path + u'.tmp', 'wb') as cachefile:
+                cPickle.dump((self.CACHE_VERSION, self.idcache), cachefile, cPickle.HIGHEST_PROTOCOL)
+            if os.name == 'nt' and os.path.exists(self.cache_path):
+                os.remove(self.cache_path)
+            os.rename(self.cache_path + u'.tmp', self.cache_path)
+            self.cache_changed = False
+        except (IOError, OSError), e:
+            log.warning(_("Unable to save site identification cache '%s': %s") % (self.cache_path, e))
+
+    def get_cached(self, path, stamp):
+        """Rebuild the FPDBFile of a file that hasn't changed since it was last
+           identified, False if no site matched it, None if it has to be read"""
+        if stamp is None:
+            return None
+        if self.idcache is None:
+            self.load_cache()
+        entry = self.idcache.get(path)
+        if entry is None or entry[0] != stamp:
+            return None
+        result = entry[1]
+        if result is False:
+            return False
+        (siteId, ptsplit, ftype, kodec, archive, archiveHead, archiveDivider, hero) = result
+        f = FPDBFile(path)
+        if siteId == 'PokerTracker':
+            f.site = self.getPokerTrackerSite(ptsplit)
+        elif siteId in self.sitelist:
+            f.site = self.sitelist[siteId]
+        else:
+            return None # site no longer configured
+        (f.ftype, f.kodec, f.archive, f.archiveHead, f.archiveDivider, f.hero) = (
+            ftype, kodec, archive, archiveHead, archiveDivider, hero)
+        return f
+
+    def put_cached(self, path, stamp, fobj):
+        if stamp is None:
+            return
+        if self.idcache is None:
+            self.load_cache()
+        if fobj == False:
+            result = False
+        else:
+            siteId = [id for id, site in self.sitelist.iteritems() if site is fobj.site]
+            siteId = siteId[0] if siteId else fobj.site.name
+            result = (siteId, getattr(fobj.site, 'ptsplit', None), fobj.ftype, fobj.kodec,
+                      fobj.archive, fobj.archiveHead, fobj.archiveDivider, fobj.hero)
+        self.idcache[path] = (stamp, result)
+        self.cache_changed = True
 
     def read_file(self, in_path):
         if in_path.endswith('.xls') or in_path.endswith('.xlsx') and xlrd:
@@ -205,71 +297,66 @@ class IdentifySite:
         """Identifies the site the hh file originated from"""
         f = FPDBFile(path)
         f.kodec = kodec
+        head = whole_file[:5000]
         for id, site in self.sitelist.iteritems():
             filter_name = site.filter_name
-            m = site.re_Identify.search(whole_file[:5000])
+            m = site.re_Identify.search(head)
             if m and filter_name in ('Fulltilt', 'PokerStars'):
-                m1 = re_Divider[filter_name].search(whole_file.replace('\r\n', '\n'))
+                m1 = re_Divider[filter_name].search(whole_file)
                 if m1:
                     f.archive = True
                     f.archiveDivider = True
-                elif re_Head.get(filter_name) and re_Head[filter_name].match(whole_file[:5000].replace('\r\n', '\n')):
+                elif re_Head.get(filter_name) and re_Head[filter_name].match(head.replace('\r\n', '\n')):
                     f.archive = True
                     f.archiveHead = True
             if m:
                 f.site = site
                 f.ftype = "hh"
                 if f.site.re_HeroCards:
-                    h = f.site.re_HeroCards.search(whole_file[:5000])
+                    h = f.site.re_HeroCards.search(head)
                     if h and 'PNAME' in h.groupdict():
                         f.hero = h.group('PNAME')
                 else:
                     f.hero = 'Hero'
                 return f
 
+        sumhead = whole_file[:10000]
         for id, site in self.sitelist.iteritems():
             if site.summary:
                 if path.endswith('.xls') or path.endswith('.xlsx'):
                     filter_name = site.filter_name
                     if filter_name in ('Fulltilt', 'PokerStars'):
-                        m2 = re_XLS[filter_name].search(whole_file[:5000])
+                        m2 = re_XLS[filter_name].search(head)
                         if m2:
                             f.site = site
                             f.ftype = "summary"
                             return f
                 else:
-                    m3 = site.re_SumIdentify.search(whole_file[:10000])
+                    m3 = site.re_SumIdentify.search(sumhead)
                     if m3:
                         f.site = site
                         f.ftype = "summary"
                         return f
                 
-        m1 = self.re_Identify_PT.search(whole_file[:5000])
+        m1 = self.re_Identify_PT.search(head)
         m2 = self.re_SumIdentify_PT.search(whole_file[:100])
         if m1 or m2:
-            filter = 'PokerTrackerToFpdb'
-            filter_name = 'PokerTracker'
-            mod = __import__(filter)
-            obj = getattr(mod, filter_name, None)
-            summary = 'PokerTrackerSummary'
-            f.site = Site('PokerTracker', filter, filter_name, summary, obj)
+            ptsplit = None
             if m1:
-                f.ftype = "hh"
                 if re.search(u'\*{2}\sGame\sID\s', m1.group()):
-                    f.site.line_delimiter = None
-                    f.site.re_SplitHands = re.compile(u'End\sof\sgame\s\d+')
+                    ptsplit = 'game'
                 elif re.search(u'\*{2}\sHand\s\#\s', m1.group()):
-                    f.site.line_delimiter = None
-                    f.site.re_SplitHands = re.compile(u'Rake:\s[^\s]+')
+                    ptsplit = 'hand'
                 elif re.search(u'Server\spoker\d+\.ipoker\.com', whole_file[:250]):
-                    f.site.line_delimiter = None
-                    f.site.spaces = True
-                    f.site.re_SplitHands = re.compile(u'GAME\s\#')
-                m3 = f.site.re_HeroCards1.search(whole_file[:5000])
+                    ptsplit = 'ipoker'
+            f.site = self.getPokerTrackerSite(ptsplit)
+            if m1:
+                f.ftype = "hh"
+                m3 = f.site.re_HeroCards1.search(head)
                 if m3:
                     f.hero = m3.group('PNAME')
                 else:
-                     m4 = f.site.re_HeroCards2.search(whole_file[:5000])
+                     m4 = f.site.re_HeroCards2.search(head)
                      if m4:
                          f.hero = m4.group('PNAME')
             else:
@@ -278,6 +365,28 @@ class IdentifySite:
         
         return False
 
+    def getPokerTrackerSite(self, ptsplit):
+        """PokerTracker files are split differently depending on the site they were
+           exported from, ptsplit is the one found in the file by idSite"""
+        filter = 'PokerTrackerToFpdb'
+        filter_name = 'PokerTracker'
+        mod = __import__(filter)
+        obj = getattr(mod, filter_name, None)
+        summary = 'PokerTrackerSummary'
+        site = Site('PokerTracker', filter, filter_name, summary, obj)
+        site.ptsplit = ptsplit
+        if ptsplit == 'game':
+            site.line_delimiter = None
+            site.re_SplitHands = re.compile(u'End\sof\sgame\s\d+')
+        elif ptsplit == 'hand':
+            site.line_delimiter = None
+            site.re_SplitHands = re.compile(u'Rake:\s[^\s]+')
+        elif ptsplit == 'ipoker':
+            site.line_delimiter = None
+            site.spaces = True
+            site.re_SplitHands = re.compile(u'GAME\s\#')
+        return site
+
     def getFilesForSite(self, sitename, ftype):
         l = []
         for name, f in self.filelist.iteritems():
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""ImportBenchmark.py
+
+Bulk imports the regression-test-files corpus into a new SQLite database, once
+keeping every index live and once with the sqlite bulk import profile of
+Database.prepareBulkImport, and reports hands per second for each. The
+databases are made in a temporary directory and removed afterwards.
+Run from the pyfpdb directory: python ImportBenchmark.py [corpus dir]
+"""
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#    In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import os
+import sys
+import shutil
+import tempfile
+
+import Configuration
+import Database
+import Importer
+
+def import_corpus(corpus, dropIndexes):
+    """Imports corpus into a new database, returns (hands stored, errors, seconds)"""
+    config = Configuration.Config(file = "HUD_config.test.xml")
+    config.dir_database = tempfile.mkdtemp(prefix = 'fpdb-benchmark-')
+    try:
+        db = Database.Database(config)
+        db.recreate_tables()
+        db.disconnect()
+        settings = {}
+        settings.update(config.get_db_parameters())
+        settings.update(config.get_import_parameters())
+        settings.update(config.get_default_paths())
+        importer = Importer.Importer(False, settings, config, None)
+        importer.setDropIndexes(dropIndexes)
+        importer.setThreads(1)
+        importer.setCallHud(False)
+        importer.setMode('bulk')
+        importer.addBulkImportImportFileOrDir(corpus, site = 'auto')
+        (stored, dups, partial, skipped, errs, ttime) = importer.runImport()
+        importer.database.disconnect()
+        return stored, errs, ttime
+    finally:
+        shutil.rmtree(config.dir_database, ignore_errors = True)
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    corpus = argv[0] if argv else 'regression-test-files'
+    results = []
+    for (label, dropIndexes) in (("indexes kept", "don't drop"), ("sqlite bulk profile", "drop")):
+        results.append((label,) + import_corpus(corpus, dropIndexes))
+    for (label, stored, errs, ttime) in results:
+        print "%-20s %7d hands %4d errors %8.2fs  %7.1f hands/s" % (label, stored, errs, ttime, stored / max(ttime, 0.001))
+
+if __name__ == '__main__':
+    sys.exit(main())
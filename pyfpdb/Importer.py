@@ -26,6 +26,8 @@ import datetime
 import Queue
 import shutil
 import re
+import threading
+import multiprocessing
 
 import logging, traceback
 
@@ -35,7 +37,9 @@ from PyQt5.QtCore import QCoreApplication
 #    fpdb/FreePokerTools modules
 import Database
 import Configuration
+import Archive
 import IdentifySite
+import FileWatcher
 from Exceptions import FpdbParseError, FpdbHandDuplicate, FpdbHandPartial
 
 try:
@@ -58,6 +62,7 @@ class Importer:
         self.parent     = parent
 
         self.idsite = IdentifySite.IdentifySite(config)
+        self.archive = Archive.Archive(config)
 
         self.filelist   = {}
         self.dirlist    = {}
@@ -66,10 +71,12 @@ class Importer:
         self.monitor    = False
         self.updatedsize = {}
         self.updatedtime = {}
+        self.watcher    = None       # FileWatcher for the monitored directories, None when polling
         self.lines      = None
         self.faobs      = None       # File as one big string
         self.mode       = None
         self.pos_in_file = {}        # dict to remember how far we have read in the file
+        self.seek_in_file = {}       # byte offsets to resume decoding growing files from in auto mode
         #Set defaults
         self.callHud    = self.config.get_import_parameters().get("callFpdbHud")
 
@@ -79,7 +86,6 @@ class Importer:
         #self.settings.setdefault("forceThreads", 2)            # NOT USED NOW
         self.settings.setdefault("writeQSize", 1000)           # no need to change
         self.settings.setdefault("writeQMaxWait", 10)          # not used
-        self.settings.setdefault("dropIndexes", "don't drop")
         self.settings.setdefault("dropHudCache", "don't drop")
         self.settings.setdefault("starsArchive", False)
         self.settings.setdefault("ftpArchive", False)
@@ -88,10 +94,11 @@ class Importer:
 
         self.writeq = None
         self.database = Database.Database(self.config, sql = self.sql)
-        self.writerdbs = []
+        # sqlite has a bulk import profile, prepareBulkImport, worth using for big imports
+        self.settings.setdefault("dropIndexes", "auto" if self.database.backend == Database.Database.SQLITE else "don't drop")
         self.settings.setdefault("threads", 1) # value set by GuiBulkImport
-        for i in xrange(self.settings['threads']):
-            self.writerdbs.append( Database.Database(self.config, sql = self.sql) )
+        # serialises db writes between the parser processes and the writer during a parallel import
+        self.writelock = threading.Lock()
 
         clock() # init clock in windows
 
@@ -116,9 +123,6 @@ class Importer:
 
     def setThreads(self, value):
         self.settings['threads'] = value
-        if self.settings["threads"] > len(self.writerdbs):
-            for i in xrange(self.settings['threads'] - len(self.writerdbs)):
-                self.writerdbs.append( Database.Database(self.config, sql = self.sql) )
 
     def setDropIndexes(self, value):
         self.settings['dropIndexes'] = value
@@ -148,6 +152,7 @@ class Importer:
         self.updatedsize = {}
         self.updatetime = {}
         self.pos_in_file = {}
+        self.seek_in_file = {}
         self.filelist = {}
 
     def logImport(self, type, file, stored, dups, partial, skipped, errs, ttime, id):
@@ -213,6 +218,7 @@ class Importer:
             for subdir in os.walk(inputPath):
                 for file in subdir[2]:
                     self.addImportFile(os.path.join(subdir[0], file), site=site)
+            self.idsite.save_cache()
             return True
         else:
             return self.addImportFile(inputPath, site=site)
@@ -229,18 +235,33 @@ class Importer:
             if monitor == True:
                 self.monitor = True
                 self.dirlist[site] = [dir] + [filter]
+                if self.watcher is None:
+                    self.watcher = FileWatcher.get_watcher()
+                if self.watcher is not None:
+                    self.watcher.add_directory(dir)
 
             #print "addImportDirectory: checking files in", dir
             for subdir in os.walk(dir):
                 for file in subdir[2]:
                     filename = os.path.join(subdir[0], file)
-                    if (time() - os.stat(filename).st_mtime)<= 43200: # look all files modded in the last 12 hours
-                                                                    # need long time because FTP in Win does not
-                                                                    # update the timestamp on the HH during session
+                    if self.recentlyModified(filename):
                         self.addImportFile(filename, "auto")
+            self.idsite.save_cache()
         else:
             log.warning(_("Attempted to add non-directory '%s' as an import directory") % str(dir))
 
+    def recentlyModified(self, filename):
+        # look all files modded in the last 12 hours
+        # need long time because FTP in Win does not
+        # update the timestamp on the HH during session
+        return (time() - os.stat(filename).st_mtime) <= 43200
+
+    def closeWatcher(self):
+        """Stops watching the monitored directories, called when auto import stops"""
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+
     def runImport(self):
         """"Run full import on self.filelist. This is called from GuiBulkImport.py"""
 
@@ -248,12 +269,21 @@ class Importer:
         start = datetime.datetime.now()
         starttime = time()
         log.info(_("Started at %s -- %d files to import. indexes: %s") % (start, len(self.filelist), self.settings['dropIndexes']))
-        if self.settings['dropIndexes'] == 'auto':
-            self.settings['dropIndexes'] = self.calculate_auto2(self.database, 12.0, 500.0)
+        dropIndexes = self.settings['dropIndexes']
+        if dropIndexes == 'auto':
+            dropIndexes = self.calculate_auto2(self.database, 12.0, 500.0)
         if 'dropHudCache' in self.settings and self.settings['dropHudCache'] == 'auto':
             self.settings['dropHudCache'] = self.calculate_auto2(self.database, 25.0, 500.0)    # returns "drop"/"don't drop"
 
-        (totstored, totdups, totpartial, totskipped, toterrors) = self.importFiles(None)
+        if dropIndexes == 'drop':
+            # worker processes write ids with their own connections, so a transaction
+            # can only span files when this process does all the writing
+            self.database.prepareBulkImport(spanFiles = self.settings['threads'] <= 1 or len(self.filelist) <= 1)
+        try:
+            (totstored, totdups, totpartial, totskipped, toterrors) = self.importFiles(None)
+        finally:
+            if dropIndexes == 'drop':
+                self.database.afterBulkImport()
 
         # Tidying up after import
         #if 'dropHudCache' in self.settings and self.settings['dropHudCache'] == 'drop':
@@ -286,16 +316,21 @@ class Importer:
         moveimportedfiles = False #TODO need to wire this into GUI and make it prettier
         movefailedfiles = False #TODO and this too
         
-        #prepare progress popup window
-        ProgressDialog = ImportProgressDialog(len(self.filelist), self.parent)
-        ProgressDialog.resize(500, 200)
-        ProgressDialog.show()
+        #prepare progress popup window, an import without a parent window (command line,
+        #ImportBenchmark, tests) has nowhere to show it
+        ProgressDialog = None
+        if self.parent is not None:
+            ProgressDialog = ImportProgressDialog(len(self.filelist), self.parent)
+            ProgressDialog.resize(500, 200)
+            ProgressDialog.show()
         
-        for f in self.filelist:
-            filecount = filecount + 1
-            ProgressDialog.progress_update(f, str(self.database.getHandCount()))
+        if self.settings['threads'] > 1 and len(self.filelist) > 1:
+            imported = self._import_files_parallel(ProgressDialog)
+        else:
+            imported = self._import_files_serial(ProgressDialog)
 
-            (stored, duplicates, partial, skipped, errors, ttime) = self._import_despatch(self.filelist[f])
+        for f, (stored, duplicates, partial, skipped, errors, ttime) in imported:
+            filecount = filecount + 1
             totstored += stored
             totdups += duplicates
             totpartial += partial
@@ -312,17 +347,59 @@ class Importer:
                         shutil.move(file, "c:\\fpdbfailed\\%d-%s" % (fileerrorcount, os.path.basename(file[3:]) ) )
             
             self.logImport('bulk', f, stored, duplicates, partial, skipped, errors, ttime, self.filelist[f].fileId)
+            self.database.fileImported()
 
-        ProgressDialog.accept()
+        if ProgressDialog is not None:
+            ProgressDialog.accept()
         del ProgressDialog
         
         return (totstored, totdups, totpartial, totskipped, toterrors)
     # end def importFiles
 
-    def _import_despatch(self, fpdbfile):
+    def _import_files_serial(self, ProgressDialog):
+        for f in self.filelist:
+            if ProgressDialog is not None:
+                ProgressDialog.progress_update(f, str(self.database.getHandCount()))
+            yield f, self._import_despatch(self.filelist[f])
+
+    def _import_files_parallel(self, ProgressDialog):
+        """Convert the hh files on a pool of self.settings['threads'] processes.
+           The workers parse, prepInsert and assembleHand each file and send the
+           finished hands back, this process is the only one storing them"""
+        hhfiles = [f for f in self.filelist.itervalues() if f.ftype in ("hh", "both")]
+        for f, fpdbfile in self.filelist.items():
+            if fpdbfile.ftype not in ("hh", "both"):
+                if ProgressDialog is not None:
+                    ProgressDialog.progress_update(f, str(self.database.getHandCount()))
+                yield f, self._import_despatch(fpdbfile)
+
+        log.info(_("Converting %d files with %d processes") % (len(hhfiles), self.settings['threads']))
+        self.writelock = multiprocessing.Lock()
+        worker_settings = {'testData' : self.settings['testData']}
+        pool = multiprocessing.Pool(self.settings['threads'], _init_import_worker,
+                                    (self.config.file, self.config.db_selected, self.config.dir_database,
+                                     worker_settings, self.writelock))
+        try:
+            for (f, parsed, ttold, ttnew) in pool.imap_unordered(_import_worker, hhfiles):
+                if ProgressDialog is not None:
+                    ProgressDialog.progress_update(f, str(self.database.getHandCount()))
+                self.database.ttold.update(ttold)
+                self.database.ttnew.update(ttnew)
+                for hand in parsed[0]:
+                    hand.config = self.config
+                yield f, self._import_despatch(self.filelist[f], parsed)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            self.writelock = threading.Lock()
+
+    def _import_despatch(self, fpdbfile, parsed = None):
         stored, duplicates, partial, skipped, errors, ttime = 0,0,0,0,0,0
         if fpdbfile.ftype in ("hh", "both"):
-            (stored, duplicates, partial, skipped, errors, ttime) = self._import_hh_file(fpdbfile)
+            (stored, duplicates, partial, skipped, errors, ttime) = self._import_hh_file(fpdbfile, parsed)
         if fpdbfile.ftype == "summary":
             (stored, duplicates, partial, skipped, errors, ttime) = self._import_summary_file(fpdbfile)
         if fpdbfile.ftype == "both" and fpdbfile.path not in self.updatedsize:
@@ -370,10 +447,25 @@ class Importer:
     #Run import on updated files, then store latest update time. Called from GuiAutoImport.py
     def runUpdated(self):
         """Check for new files in monitored directories"""
-        for (site,type) in self.dirlist:
-            self.addImportDirectory(self.dirlist[(site,type)][0], False, (site,type), self.dirlist[(site,type)][1])
-
-        for f in self.filelist:
+        if self.watcher is None or self.watcher.overflowed or self.watcher.incomplete:
+            if self.watcher is not None:
+                self.watcher.changes()
+                self.watcher.overflowed = False
+            for (site,type) in self.dirlist:
+                self.addImportDirectory(self.dirlist[(site,type)][0], False, (site,type), self.dirlist[(site,type)][1])
+            updated = self.filelist.keys()
+        else:
+            # only look at what the watcher saw change, and files that are still waiting for their first import
+            updated = [f for f in self.filelist if self.updatedsize.get(f) in (None, 0)]
+            for f in self.watcher.changes():
+                if (f not in self.filelist and os.path.isfile(f) and self.recentlyModified(f)
+                        and self.addImportFile(f, "auto")):
+                    self.updatedsize[f] = 0
+                    self.updatedtime[f] = 0
+                if f in self.filelist and f not in updated:
+                    updated.append(f)
+
+        for f in updated:
             if os.path.exists(f):
                 stat_info = os.stat(f)
                 if f in self.updatedsize: # we should be able to assume that if we're in size, we're in time as well
@@ -411,65 +503,40 @@ class Importer:
         self.database.rollback()
         self.runPostImport()
 
-    def _import_hh_file(self, fpdbfile):
+    def _import_hh_file(self, fpdbfile, parsed = None):
         """Function for actual import of a hh file
-            This is now an internal function that should not be called directly."""
+            This is now an internal function that should not be called directly.
+            parsed is the result of _parse_hh_file when a worker process has
+            already done the conversion"""
 
-        (stored, duplicates, partial, skipped, errors, ttime) = (0, 0, 0, 0, 0, time())
+        ttime = time()
 
-        # Load filter, process file, pass returned filename to import_fpdb_file
-        log.info(_("Converting %s") % fpdbfile.path)
-            
-        filter_name = fpdbfile.site.filter_name
-        mod = __import__(fpdbfile.site.hhc_fname)
-        obj = getattr(mod, filter_name, None)
-        if callable(obj):
-            
-            if fpdbfile.path in self.pos_in_file:  idx = self.pos_in_file[fpdbfile.path]
-            else: self.pos_in_file[fpdbfile.path], idx = 0, 0
-                
-            hhc = obj( self.config, in_path = fpdbfile.path, index = idx, autostart=False
-                      ,starsArchive = fpdbfile.archive
-                      ,ftpArchive   = fpdbfile.archive
-                      ,sitename     = fpdbfile.site.name)
-            hhc.setAutoPop(self.mode=='auto')
-            hhc.start()
-            
-            self.pos_in_file[file] = hhc.getLastCharacterRead()
-            #Tally the results
-            partial  = getattr(hhc, 'numPartial')
-            skipped  = getattr(hhc, 'numSkipped')
-            errors   = getattr(hhc, 'numErrors')
-            stored   = getattr(hhc, 'numHands')
-            stored -= errors
-            stored -= partial
-            stored -= skipped
-            
-            if stored > 0:
-                if self.caller: self.progressNotify()
-                handlist = hhc.getProcessedHands()
-                self.database.resetBulkCache(True)
-                self.pos_in_file[fpdbfile.path] = hhc.getLastCharacterRead()
-                (phands, ahands, ihands, to_hud) = ([], [], [], [])
-                self.database.resetBulkCache()
-                
-                ####Lock Placeholder####
-                for hand in handlist:
-                    hand.prepInsert(self.database, printtest = self.settings['testData'])
-                    ahands.append(hand)
-                self.database.commit()
-                ####Lock Placeholder####
-                
-                for hand in ahands:
-                    hand.assembleHand()
-                    phands.append(hand)
-                
-                ####Lock Placeholder####
+        dups = None
+        if parsed is None:
+            parsed = self._parse_hh_file(fpdbfile)
+            # _parse_hh_file looked the hands up with this connection, its answer is kept
+            dups = (self.database.dupsChecked, self.database.dupsFound)
+        if parsed is None:
+            return (0, 0, 0, 0, 0, time() - ttime)
+
+        (handlist, stored, partial, skipped, errors, summaryInFile, duplicates, failed) = parsed
+        ihands = []
+
+        if stored > 0:
+            if self.caller: self.progressNotify()
+            self.database.resetBulkCache()
+            (ihands, to_hud) = ([], [])
+
+            with self.writelock:
+                if dups is None:
+                    self.database.checkDuplicates([hand.getDuplicateKey() for hand in handlist])
+                else:
+                    (self.database.dupsChecked, self.database.dupsFound) = dups
                 backtrack = False
                 id = self.database.nextHandId()
-                for i in range(len(phands)):
-                    doinsert = len(phands)==i+1
-                    hand = phands[i]
+                for i in range(len(handlist)):
+                    doinsert = len(handlist)==i+1
+                    hand = handlist[i]
                     try:
                         id = hand.getHandId(self.database, id)
                         hand.updateSessionsCache(self.database, None, doinsert)
@@ -489,7 +556,7 @@ class Importer:
                         for line in formatted_lines:
                             error_trace += line
                         tmp = hand.handText[0:200]
-                        log.error(_("Importer._import_hh_file: '%r' Fatal error: '%r'") % (file, error_trace))
+                        log.error(_("Importer._import_hh_file: '%r' Fatal error: '%r'") % (fpdbfile.path, error_trace))
                         log.error(_("'%r'") % tmp)
                         if (doinsert and ihands): backtrack = True
                     if backtrack: #If last hand in the file is a duplicate this will backtrack and insert the new hand records
@@ -506,9 +573,11 @@ class Importer:
                 #log.debug("DEBUG: hand.updateSessionsCache: %s" % (t5tot))
                 #log.debug("DEBUG: hand.insertHands: %s" % (t6tot))
                 #log.debug("DEBUG: hand.updateHudCache: %s" % (t7tot))
+                if self.archive.save != 'none':
+                    # with the file's other rows, nothing is held back for a later file
+                    self.archive.storeHands(self.database, ihands, failed)
                 self.database.commit()
-                ####Lock Placeholder####
-                
+
                 for i in range(len(ihands)):
                     doinsert = len(ihands)==i+1
                     hand = ihands[i]
@@ -517,29 +586,98 @@ class Importer:
                     hand.insertHandsStove(self.database, doinsert)
                 self.database.commit()
 
-                #pipe the Hands.id out to the HUD
-                if self.callHud:
-                    for hid in to_hud:
-                        try:
-                            print _("fpdb_import: sending hand to hud"), hid, "pipe =", self.caller.pipe_to_hud
-                            self.caller.pipe_to_hud.stdin.write("%s" % (hid) + os.linesep)
-                        except IOError, e:
-                            log.error(_("Failed to send hand to HUD: %s") % e)
-                # Really ugly hack to allow testing Hands within the HHC from someone
-                # with only an Importer objec
-                if self.settings['cacheHHC']:
-                    self.handhistoryconverter = hhc
-        elif (self.mode=='auto'):
-            return (0, 0, partial, skipped, errors, time() - ttime)
+            #pipe the Hands.id out to the HUD
+            if self.callHud:
+                for hid in to_hud:
+                    try:
+                        print _("fpdb_import: sending hand to hud"), hid, "pipe =", self.caller.pipe_to_hud
+                        self.caller.pipe_to_hud.stdin.write("%s" % (hid) + os.linesep)
+                    except IOError, e:
+                        log.error(_("Failed to send hand to HUD: %s") % e)
+
+        if self.archive.save != 'none' and stored <= 0 and failed:
+            with self.writelock:
+                self.archive.storeHands(self.database, ihands, failed)
+                self.database.commit()
         
         stored -= duplicates
         
         if stored>0 and ihands[0].gametype['type']=='tour':
-            if hhc.summaryInFile:
+            if summaryInFile:
                 fpdbfile.ftype = "both"
 
         ttime = time() - ttime
         return (stored, duplicates, partial, skipped, errors, ttime)
+
+    def _parse_hh_file(self, fpdbfile):
+        """Convert a hh file and get its hands ready to be stored.
+            This is the cpu heavy half of _import_hh_file and does not touch the
+            bulk caches, so it can also run in a worker process.
+            Returns None if the site has no converter, otherwise a tuple of
+            (hands, stored, partial, skipped, errors, summaryInFile, duplicates, failed)
+            Hands already in the db are dropped here and only counted in duplicates,
+            failed are the texts of the hands that didn't parse."""
+
+        (stored, partial, skipped, errors, duplicates) = (0, 0, 0, 0, 0)
+
+        # Load filter, process file, pass returned filename to import_fpdb_file
+        log.info(_("Converting %s") % fpdbfile.path)
+            
+        filter_name = fpdbfile.site.filter_name
+        mod = __import__(fpdbfile.site.hhc_fname)
+        obj = getattr(mod, filter_name, None)
+        if not callable(obj):
+            return None
+
+        if fpdbfile.path in self.pos_in_file:  idx = self.pos_in_file[fpdbfile.path]
+        else: self.pos_in_file[fpdbfile.path], idx = 0, 0
+            
+        hhc = obj( self.config, in_path = fpdbfile.path, index = idx, autostart=False
+                  ,starsArchive = fpdbfile.archive
+                  ,ftpArchive   = fpdbfile.archive
+                  ,sitename     = fpdbfile.site.name)
+        hhc.setAutoPop(self.mode=='auto')
+        if self.mode=='auto':
+            hhc.setResumePoint(self.seek_in_file.get(fpdbfile.path))
+        hhc.start()
+        
+        #Tally the results
+        partial  = getattr(hhc, 'numPartial')
+        skipped  = getattr(hhc, 'numSkipped')
+        errors   = getattr(hhc, 'numErrors')
+        stored   = getattr(hhc, 'numHands')
+        stored -= errors
+        stored -= partial
+        stored -= skipped
+        
+        ahands = []
+        if stored > 0:
+            handlist = hhc.getProcessedHands()
+            self.database.resetBulkCache(True)
+            self.pos_in_file[fpdbfile.path] = hhc.getLastCharacterRead()
+            self.seek_in_file[fpdbfile.path] = hhc.getResumePoint()
+            
+            with self.writelock:
+                known = self.database.checkDuplicates([hand.getDuplicateKey() for hand in handlist])
+                self.database.cachePlayerIDs([(p[1], hand.siteId, p[1] == hand.hero) for hand in handlist
+                                              if hand.getDuplicateKey() not in known for p in hand.players])
+                for hand in handlist:
+                    if hand.getDuplicateKey() in known:
+                        duplicates += 1
+                        continue
+                    hand.prepInsert(self.database, printtest = self.settings['testData'])
+                    ahands.append(hand)
+                self.database.commit()
+            
+            for hand in ahands:
+                hand.assembleHand()
+
+            # Really ugly hack to allow testing Hands within the HHC from someone
+            # with only an Importer objec
+            if self.settings['cacheHHC']:
+                self.handhistoryconverter = hhc
+
+        return (ahands, stored, partial, skipped, errors, hhc.summaryInFile, duplicates, hhc.failedHands)
     
     def autoSummaryGrab(self, force = False):
         for f, fpdbfile in self.filelist.items():
@@ -559,10 +697,18 @@ class Importer:
                 log.error("Found: '%s' with 0 characters... skipping" % fpbdfile.path)
                 return (0, 0, 0, 0, 1, time()) # File had 0 characters
             ####Lock Placeholder####
-            for j, summaryText in enumerate(summaryTexts, start=1):
-                doinsert = len(summaryTexts)==j
+            convs = []
+            for summaryText in summaryTexts:
+                try:
+                    convs.append(obj(db=self.database, config=self.config, siteName=fpdbfile.site.name, summaryText=summaryText, in_path = fpdbfile.path, header=summaryTexts[0]))
+                except FpdbHandPartial, e:
+                    partial += 1
+                except FpdbParseError, e:
+                    log.error(_("Summary import parse error in file: %s") % fpdbfile.path)
+                    errors += 1
+            self.database.cachePlayerIDs([(p, conv.siteId, p == conv.hero) for conv in convs for p in conv.players])
+            for j, conv in enumerate(convs, start=1):
                 try:
-                    conv = obj(db=self.database, config=self.config, siteName=fpdbfile.site.name, summaryText=summaryText, in_path = fpdbfile.path, header=summaryTexts[0])
                     self.database.resetBulkCache(False)
                     conv.insertOrUpdate(printtest = self.settings['testData'])
                 except FpdbHandPartial, e:
@@ -571,8 +717,8 @@ class Importer:
                     log.error(_("Summary import parse error in file: %s") % fpdbfile.path)
                     errors += 1
                 if j != 1:
-                    print _("Finished importing %s/%s tournament summaries") %(j, len(summaryTexts))
-                stored = j
+                    print _("Finished importing %s/%s tournament summaries") %(j, len(convs))
+            stored = len(summaryTexts)
             ####Lock Placeholder####
         ttime = time() - ttime
         return (stored - errors - partial, duplicates, partial, skipped, errors, ttime)
@@ -612,6 +758,32 @@ class Importer:
                     log.warn(_("TourneyImport: Removing text < 100 characters from end of file"))
         return summaryTexts 
         
+# Parallel bulk import. Each worker process owns an Importer with its own db
+# connection, used only to look up/create ids in prepInsert.
+_worker_importer = None
+
+def _init_import_worker(config_file, dbname, dir_database, settings, writelock):
+    global _worker_importer
+    config = Configuration.Config(file = config_file, dbname = dbname)
+    # the sqlite file is found through dir_database, which may not be the one of config_file
+    config.dir_database = dir_database
+    _worker_importer = Importer(None, settings, config)
+    _worker_importer.setMode('bulk')
+    _worker_importer.writelock = writelock
+
+def _import_worker(fpdbfile):
+    """Runs in a worker process, returns the parsed file to Importer._import_files_parallel"""
+    db = _worker_importer.database
+    try:
+        parsed = _worker_importer._parse_hh_file(fpdbfile)
+    except:
+        log.error(_("Importer._import_worker: '%r' Fatal error: '%r'") % (fpdbfile.path, traceback.format_exc()))
+        db.rollback()
+        parsed = ([], 0, 0, 0, 1, False, 0, [])
+    ttold, ttnew = db.ttold, db.ttnew
+    db.resetClean()
+    return (fpdbfile.path, parsed, ttold, ttnew)
+
 class ImportProgressDialog(QDialog):
 
     """
@@ -209,11 +209,10 @@ class PartyPoker(HandHistoryConverter):
     re_GameStartLine = re.compile('Game\s\#\d+\sstarts', re.MULTILINE)
     re_emailedHand = re.compile(r'\*\*\sSummary\s\*\*')
 
-    def allHandsAsList(self):
-        list = HandHistoryConverter.allHandsAsList(self)
-        if list is None:
-            return []
-        return filter(lambda text: len(text.strip()), list)
+    def allHandsAsIter(self):
+        for text in HandHistoryConverter.allHandsAsIter(self):
+            if len(text.strip()):
+                yield text
 
     def compilePlayerRegexs(self,  hand):
         players = set([player[1] for player in hand.players])
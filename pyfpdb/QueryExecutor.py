@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""QueryExecutor.py
+
+Runs the queries of the stats, session, graph and hand viewer tabs on a worker
+thread with its own database connection, so a big query doesn't freeze the gui.
+Rows come back to the gui thread a chunk at a time and a refresh cancels
+whatever its tab still had running.
+"""
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#    In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import L10n
+_ = L10n.get_translation()
+
+import logging
+
+from PyQt5.QtCore import QCoreApplication, QObject, Qt, QThread, pyqtSignal
+
+import Database
+
+log = logging.getLogger("db")
+
+
+def fetch_chunks(cursor, size):
+    """Yields (rows, column names) of the query cursor has run, size rows at a time"""
+    colnames = [desc[0] for desc in cursor.description]
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        yield rows, colnames
+
+
+class QueryWorker(QObject):
+    """Runs the jobs of a QueryExecutor, one at a time on its thread"""
+
+    chunkReady = pyqtSignal(int, object, object)    # ticket, rows, column names
+    jobDone = pyqtSignal(int)
+    jobFailed = pyqtSignal(int, object)             # ticket, exception
+
+    def __init__(self, executor):
+        QObject.__init__(self)
+        self.executor = executor
+        self.db = None          # connected on the worker thread, sqlite connections can't change threads
+        self.running = None     # ticket of the job being run
+
+    def run(self, ticket, job, params):
+        if self.executor.isCancelled(ticket):
+            return
+        self.running = ticket
+        try:
+            if self.db is None:
+                self.db = Database.Database(self.executor.config, sql=self.executor.sql)
+            if callable(job):
+                chunks = job(self.db)
+            else:
+                c = self.db.get_cursor()
+                if params is None:
+                    c.execute(job)
+                else:
+                    c.execute(job, params)
+                chunks = fetch_chunks(c, self.executor.chunkSize)
+            for (rows, colnames) in chunks:
+                if self.executor.isCancelled(ticket):
+                    break
+                self.chunkReady.emit(ticket, rows, colnames)
+            else:
+                self.jobDone.emit(ticket)
+        except Exception, e:
+            # an interrupted query ends up here too, only a live job has a failure to report
+            if not self.executor.isCancelled(ticket):
+                log.error(_("Query failed: %s"), e)
+                self.jobFailed.emit(ticket, e)
+        finally:
+            self.running = None
+            if self.db is not None:
+                try:
+                    self.db.rollback()
+                except Exception, e:
+                    log.debug("QueryWorker rollback: %s", e)
+
+    def interrupt(self):
+        # called from the gui thread, sqlite and postgres can stop a running statement from
+        # another thread, a mysql query runs to the end and its rows are dropped
+        db = self.db
+        if db is None or self.running is None:
+            return
+        try:
+            if db.backend == db.SQLITE:
+                db.connection.interrupt()
+            elif db.backend == db.PGSQL:
+                db.connection.cancel()
+        except Exception, e:
+            log.debug("QueryWorker interrupt: %s", e)
+
+    def close(self):
+        if self.db is not None:
+            self.db.disconnect()
+            self.db = None
+
+
+class QueryExecutor(QObject):
+    """A worker thread with its own db connection for the queries of one tab.
+       Jobs run in the order they were submitted."""
+
+    chunkSize = 500     # rows sent to the gui at a time
+
+    submitted = pyqtSignal(int, object, object)     # ticket, job, params
+
+    def __init__(self, config, sql, parent=None):
+        QObject.__init__(self, parent)
+        self.config = config
+        self.sql = sql
+        self.ticket = 0         # of the last job submitted
+        self.cancelled = 0      # jobs up to this ticket are dropped
+        self.callbacks = {}     # ticket -> (rows, done, failed)
+
+        self.thread = QThread()
+        self.worker = QueryWorker(self)
+        self.worker.moveToThread(self.thread)
+        self.submitted.connect(self.worker.run)
+        self.worker.chunkReady.connect(self.deliverChunk)
+        self.worker.jobDone.connect(self.finishJob)
+        self.worker.jobFailed.connect(self.failJob)
+        # finished is emitted on the worker thread, where its connection has to be closed
+        self.thread.finished.connect(self.worker.close, Qt.DirectConnection)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stop)
+        self.thread.start()
+
+    def submit(self, job, rows, done=None, failed=None, params=None):
+        """Queues job, an sql string or a function of a Database that returns
+           (rows, column names) chunks. On the gui thread rows(chunk, colnames) gets
+           each chunk, then done() or failed(exception) is called. Returns the job's ticket."""
+        self.ticket += 1
+        self.callbacks[self.ticket] = (rows, done, failed)
+        self.submitted.emit(self.ticket, job, params)
+        return self.ticket
+
+    def isCancelled(self, ticket):
+        return ticket <= self.cancelled
+
+    def cancel(self):
+        """Drops every job submitted so far, the one that is running is interrupted where the db allows it"""
+        self.cancelled = self.ticket
+        self.callbacks.clear()
+        self.worker.interrupt()
+
+    def stop(self):
+        self.cancel()
+        self.thread.quit()
+        self.thread.wait()
+
+    def deliverChunk(self, ticket, rows, colnames):
+        callbacks = self.callbacks.get(ticket)
+        if callbacks is not None:
+            callbacks[0](rows, colnames)
+
+    def finishJob(self, ticket):
+        callbacks = self.callbacks.pop(ticket, None)
+        if callbacks is not None and callbacks[1] is not None:
+            callbacks[1]()
+
+    def failJob(self, ticket, error):
+        callbacks = self.callbacks.pop(ticket, None)
+        if callbacks is not None and callbacks[2] is not None:
+            callbacks[2](error)
@@ -32,9 +32,19 @@ import re
 
 #    FreePokerTools modules
 
+# The queries of each (game, db_server), built by the first Sql for it. Every Sql
+# gets its own copy, already rewritten to the placeholder of its backend.
+_query_sets = {}
+
 class Sql:
-   
+
     def __init__(self, game='holdem', db_server='mysql'):
+        key = (game, db_server)
+        if key not in _query_sets:
+            _query_sets[key] = self.build_queries(game, db_server)
+        self.query = dict(_query_sets[key])
+
+    def build_queries(self, game, db_server):
         self.query = {}
 ###############################################################################3
 #    Support for the Free Poker DataBase = fpdb   http://fpdb.sourceforge.net/
@@ -120,30 +130,41 @@ class Sql:
                         ENGINE=INNODB"""
 
         ################################
-        # Create RawHands (this table is all but identical with RawTourneys)
+        # Create RawHands
+        # Each row is a block of hands compressed together, offsets lists
+        # "handId:length" of each hand in the block, see Archive.py
         ################################
         if db_server == 'mysql':
             self.query['createRawHands'] = """CREATE TABLE RawHands (
                         id BIGINT UNSIGNED AUTO_INCREMENT NOT NULL, PRIMARY KEY (id),
                         handId BIGINT NOT NULL,
-                        rawHand TEXT NOT NULL,
+                        lastHandId BIGINT NOT NULL,
+                        compression VARCHAR(8) NOT NULL,
+                        offsets TEXT NOT NULL,
+                        rawHand MEDIUMBLOB NOT NULL,
                         complain BOOLEAN NOT NULL DEFAULT FALSE)
                         ENGINE=INNODB"""
         elif db_server == 'postgresql':
             self.query['createRawHands'] = """CREATE TABLE RawHands (
                         id BIGSERIAL, PRIMARY KEY (id),
                         handId BIGINT NOT NULL,
-                        rawHand TEXT NOT NULL,
+                        lastHandId BIGINT NOT NULL,
+                        compression VARCHAR(8) NOT NULL,
+                        offsets TEXT NOT NULL,
+                        rawHand BYTEA NOT NULL,
                         complain BOOLEAN NOT NULL DEFAULT FALSE)"""
         elif db_server == 'sqlite':
             self.query['createRawHands'] = """CREATE TABLE RawHands (
                         id INTEGER PRIMARY KEY,
                         handId BIGINT NOT NULL,
-                        rawHand TEXT NOT NULL,
+                        lastHandId BIGINT NOT NULL,
+                        compression VARCHAR(8) NOT NULL,
+                        offsets TEXT NOT NULL,
+                        rawHand BLOB NOT NULL,
                         complain BOOLEAN NOT NULL DEFAULT FALSE)"""
         
         ################################
-        # Create RawTourneys (this table is all but identical with RawHands)
+        # Create RawTourneys
         ################################
         if db_server == 'mysql':
             self.query['createRawTourneys'] = """CREATE TABLE RawTourneys (
@@ -1721,7 +1742,8 @@ class Sql:
                         street4Raises INT,                        
                         street1Discards INT,
                         street2Discards INT,
-                        street3Discards INT)
+                        street3Discards INT,
+                        totalProfitSq BIGINT)
                         ENGINE=INNODB"""
         elif db_server == 'postgresql':
             self.query['createHudCacheTable'] = """CREATE TABLE HudCache (
@@ -1846,7 +1868,8 @@ class Sql:
                         street4Raises INT,
                         street1Discards INT,
                         street2Discards INT,
-                        street3Discards INT)
+                        street3Discards INT,
+                        totalProfitSq BIGINT)
                         """
         elif db_server == 'sqlite':
             self.query['createHudCacheTable'] = """CREATE TABLE HudCache (
@@ -1971,7 +1994,8 @@ class Sql:
                         street4Raises INT,
                         street1Discards INT,
                         street2Discards INT,
-                        street3Discards INT)
+                        street3Discards INT,
+                        totalProfitSq INT)
                         """
                         
         ################################
@@ -2101,7 +2125,8 @@ class Sql:
                         street4Raises INT,
                         street1Discards INT,
                         street2Discards INT,
-                        street3Discards INT)
+                        street3Discards INT,
+                        totalProfitSq BIGINT)
                         ENGINE=INNODB"""
         elif db_server == 'postgresql':
             self.query['createCardsCacheTable'] = """CREATE TABLE CardsCache (
@@ -2226,7 +2251,8 @@ class Sql:
                         street4Raises INT,
                         street1Discards INT,
                         street2Discards INT,
-                        street3Discards INT)
+                        street3Discards INT,
+                        totalProfitSq BIGINT)
                         """
         elif db_server == 'sqlite':
             self.query['createCardsCacheTable'] = """CREATE TABLE CardsCache (
@@ -2351,7 +2377,8 @@ class Sql:
                         street4Raises INT,
                         street1Discards INT,
                         street2Discards INT,
-                        street3Discards INT)
+                        street3Discards INT,
+                        totalProfitSq INT)
                         """
                         
         ################################
@@ -2483,7 +2510,8 @@ class Sql:
                         street4Raises INT,
                         street1Discards INT,
                         street2Discards INT,
-                        street3Discards INT)
+                        street3Discards INT,
+                        totalProfitSq BIGINT)
                         ENGINE=INNODB"""
         elif db_server == 'postgresql':
             self.query['createPositionsCacheTable'] = """CREATE TABLE PositionsCache (
@@ -2610,7 +2638,8 @@ class Sql:
                         street4Raises INT,
                         street1Discards INT,
                         street2Discards INT,
-                        street3Discards INT)
+                        street3Discards INT,
+                        totalProfitSq BIGINT)
                         """
         elif db_server == 'sqlite':
             self.query['createPositionsCacheTable'] = """CREATE TABLE PositionsCache (
@@ -2737,7 +2766,8 @@ class Sql:
                         street4Raises INT,
                         street1Discards INT,
                         street2Discards INT,
-                        street3Discards INT)
+                        street3Discards INT,
+                        totalProfitSq INT)
                         """
                         
         ################################
@@ -2944,7 +2974,8 @@ class Sql:
                         street4Raises INT,
                         street1Discards INT,
                         street2Discards INT,
-                        street3Discards INT)
+                        street3Discards INT,
+                        totalProfitSq BIGINT)
                         ENGINE=INNODB
                         """
                         
@@ -3070,7 +3101,8 @@ class Sql:
                         street4Raises INT,
                         street1Discards INT,
                         street2Discards INT,
-                        street3Discards INT)
+                        street3Discards INT,
+                        totalProfitSq BIGINT)
                         """
                         
         elif db_server == 'sqlite':
@@ -3195,7 +3227,8 @@ class Sql:
                         street4Raises INT,
                         street1Discards INT,
                         street2Discards INT,
-                        street3Discards INT)
+                        street3Discards INT,
+                        totalProfitSq INT)
                         """
                         
         ################################
@@ -3324,7 +3357,8 @@ class Sql:
                         street4Raises INT,
                         street1Discards INT,
                         street2Discards INT,
-                        street3Discards INT)
+                        street3Discards INT,
+                        totalProfitSq BIGINT)
                         ENGINE=INNODB
                         """
                         
@@ -3450,7 +3484,8 @@ class Sql:
                         street4Raises INT,
                         street1Discards INT,
                         street2Discards INT,
-                        street3Discards INT)
+                        street3Discards INT,
+                        totalProfitSq BIGINT)
                         """
                         
         elif db_server == 'sqlite':
@@ -3575,7 +3610,8 @@ class Sql:
                         street4Raises INT,
                         street1Discards INT,
                         street2Discards INT,
-                        street3Discards INT)
+                        street3Discards INT,
+                        totalProfitSq INT)
                         """
             
         if db_server == 'mysql':
@@ -3745,7 +3781,8 @@ class Sql:
                         round(g.smallBet / 100.0,2),
                         round(g.bigBet / 100.0,2),
                         g.currency,
-                        h.gametypeId
+                        h.gametypeId,
+                        g.split
                     FROM
                         Hands as h,
                         Sites as s,
@@ -4406,6 +4443,133 @@ class Sql:
                        there's a gap over X minutes between hands (ie. when we get back to start of
                        the session */
                 """
+
+        # stats of the hands in a range of ids for each of their players, in the same form
+        # as a row of get_stats_from_hand_aggregated, used to keep the HUD's in memory totals current
+        self.query['get_stats_from_hand_delta'] = """
+                SELECT hp.playerId                                              AS player_id,
+                       hp.seatNo                                                AS seat,
+                       p.name                                                   AS screen_name,
+                       h.id                                                     AS hand_id,
+                       h.gametypeId                                             AS gametype_id,
+                       h.seats                                                  AS seats,
+                       h.startTime                                              AS starttime,
+                       1                                                        AS n,
+                       cast(hp.street0VPIChance as <signed>integer)             AS vpip_opp,
+                       cast(hp.street0VPI as <signed>integer)                   AS vpip,
+                       cast(hp.street0AggrChance as <signed>integer)            AS pfr_opp,
+                       cast(hp.street0Aggr as <signed>integer)                  AS pfr,
+                       cast(hp.street0CalledRaiseChance as <signed>integer)     AS CAR_opp_0,
+                       cast(hp.street0CalledRaiseDone as <signed>integer)       AS CAR_0,
+                       cast(hp.street0_3BChance as <signed>integer)             AS TB_opp_0,
+                       cast(hp.street0_3BDone as <signed>integer)               AS TB_0,
+                       cast(hp.street0_4BChance as <signed>integer)             AS FB_opp_0,
+                       cast(hp.street0_4BDone as <signed>integer)               AS FB_0,
+                       cast(hp.street0_C4BChance as <signed>integer)            AS CFB_opp_0,
+                       cast(hp.street0_C4BDone as <signed>integer)              AS CFB_0,
+                       cast(hp.street0_FoldTo3BChance as <signed>integer)       AS F3B_opp_0,
+                       cast(hp.street0_FoldTo3BDone as <signed>integer)         AS F3B_0,
+                       cast(hp.street0_FoldTo4BChance as <signed>integer)       AS F4B_opp_0,
+                       cast(hp.street0_FoldTo4BDone as <signed>integer)         AS F4B_0,
+                       cast(hp.street0_SqueezeChance as <signed>integer)        AS SQZ_opp_0,
+                       cast(hp.street0_SqueezeDone as <signed>integer)          AS SQZ_0,
+                       cast(hp.raiseToStealChance as <signed>integer)           AS RTS_opp,
+                       cast(hp.raiseToStealDone as <signed>integer)             AS RTS,
+                       cast(hp.success_Steal as <signed>integer)                AS SUC_ST,
+                       cast(hp.street1Seen as <signed>integer)                  AS saw_f,
+                       cast(hp.street1Seen as <signed>integer)                  AS saw_1,
+                       cast(hp.street2Seen as <signed>integer)                  AS saw_2,
+                       cast(hp.street3Seen as <signed>integer)                  AS saw_3,
+                       cast(hp.street4Seen as <signed>integer)                  AS saw_4,
+                       cast(hp.sawShowdown as <signed>integer)                  AS sd,
+                       cast(hp.street1Aggr as <signed>integer)                  AS aggr_1,
+                       cast(hp.street2Aggr as <signed>integer)                  AS aggr_2,
+                       cast(hp.street3Aggr as <signed>integer)                  AS aggr_3,
+                       cast(hp.street4Aggr as <signed>integer)                  AS aggr_4,
+                       cast(hp.otherRaisedStreet1 as <signed>integer)           AS was_raised_1,
+                       cast(hp.otherRaisedStreet2 as <signed>integer)           AS was_raised_2,
+                       cast(hp.otherRaisedStreet3 as <signed>integer)           AS was_raised_3,
+                       cast(hp.otherRaisedStreet4 as <signed>integer)           AS was_raised_4,
+                       cast(hp.foldToOtherRaisedStreet1 as <signed>integer)     AS f_freq_1,
+                       cast(hp.foldToOtherRaisedStreet2 as <signed>integer)     AS f_freq_2,
+                       cast(hp.foldToOtherRaisedStreet3 as <signed>integer)     AS f_freq_3,
+                       cast(hp.foldToOtherRaisedStreet4 as <signed>integer)     AS f_freq_4,
+                       cast(hp.wonWhenSeenStreet1 as <signed>integer)           AS w_w_s_1,
+                       cast(hp.wonAtSD as <signed>integer)                      AS wmsd,
+                       cast(hp.stealChance as <signed>integer)                  AS steal_opp,
+                       cast(hp.stealDone as <signed>integer)                    AS steal,
+                       cast(hp.foldSbToStealChance as <signed>integer)          AS SBstolen,
+                       cast(hp.foldedSbToSteal as <signed>integer)              AS SBnotDef,
+                       cast(hp.foldBbToStealChance as <signed>integer)          AS BBstolen,
+                       cast(hp.foldedBbToSteal as <signed>integer)              AS BBnotDef,
+                       cast(hp.street1CBChance as <signed>integer)              AS CB_opp_1,
+                       cast(hp.street1CBDone as <signed>integer)                AS CB_1,
+                       cast(hp.street2CBChance as <signed>integer)              AS CB_opp_2,
+                       cast(hp.street2CBDone as <signed>integer)                AS CB_2,
+                       cast(hp.street3CBChance as <signed>integer)              AS CB_opp_3,
+                       cast(hp.street3CBDone as <signed>integer)                AS CB_3,
+                       cast(hp.street4CBChance as <signed>integer)              AS CB_opp_4,
+                       cast(hp.street4CBDone as <signed>integer)                AS CB_4,
+                       cast(hp.foldToStreet1CBChance as <signed>integer)        AS f_cb_opp_1,
+                       cast(hp.foldToStreet1CBDone as <signed>integer)          AS f_cb_1,
+                       cast(hp.foldToStreet2CBChance as <signed>integer)        AS f_cb_opp_2,
+                       cast(hp.foldToStreet2CBDone as <signed>integer)          AS f_cb_2,
+                       cast(hp.foldToStreet3CBChance as <signed>integer)        AS f_cb_opp_3,
+                       cast(hp.foldToStreet3CBDone as <signed>integer)          AS f_cb_3,
+                       cast(hp.foldToStreet4CBChance as <signed>integer)        AS f_cb_opp_4,
+                       cast(hp.foldToStreet4CBDone as <signed>integer)          AS f_cb_4,
+                       hp.totalProfit                                           AS net,
+                       gt.bigblind                                              AS bigblind,
+                       cast(hp.street1CheckCallRaiseChance as <signed>integer)  AS ccr_opp_1,
+                       cast(hp.street1CheckCallDone as <signed>integer)         AS cc_1,
+                       cast(hp.street1CheckRaiseDone as <signed>integer)        AS cr_1,
+                       cast(hp.street2CheckCallRaiseChance as <signed>integer)  AS ccr_opp_2,
+                       cast(hp.street2CheckCallDone as <signed>integer)         AS cc_2,
+                       cast(hp.street2CheckRaiseDone as <signed>integer)        AS cr_2,
+                       cast(hp.street3CheckCallRaiseChance as <signed>integer)  AS ccr_opp_3,
+                       cast(hp.street3CheckCallDone as <signed>integer)         AS cc_3,
+                       cast(hp.street3CheckRaiseDone as <signed>integer)        AS cr_3,
+                       cast(hp.street4CheckCallRaiseChance as <signed>integer)  AS ccr_opp_4,
+                       cast(hp.street4CheckCallDone as <signed>integer)         AS cc_4,
+                       cast(hp.street4CheckRaiseDone as <signed>integer)        AS cr_4,
+                       cast(hp.street0Calls as <signed>integer)                 AS call_0,
+                       cast(hp.street1Calls as <signed>integer)                 AS call_1,
+                       cast(hp.street2Calls as <signed>integer)                 AS call_2,
+                       cast(hp.street3Calls as <signed>integer)                 AS call_3,
+                       cast(hp.street4Calls as <signed>integer)                 AS call_4,
+                       cast(hp.street0Bets as <signed>integer)                  AS bet_0,
+                       cast(hp.street1Bets as <signed>integer)                  AS bet_1,
+                       cast(hp.street2Bets as <signed>integer)                  AS bet_2,
+                       cast(hp.street3Bets as <signed>integer)                  AS bet_3,
+                       cast(hp.street4Bets as <signed>integer)                  AS bet_4,
+                       cast(hp.street0Raises as <signed>integer)                AS raise_0,
+                       cast(hp.street1Raises as <signed>integer)                AS raise_1,
+                       cast(hp.street2Raises as <signed>integer)                AS raise_2,
+                       cast(hp.street3Raises as <signed>integer)                AS raise_3,
+                       cast(hp.street4Raises as <signed>integer)                AS raise_4
+                FROM Hands h
+                     INNER JOIN HandsPlayers hp ON (hp.handId = h.id)
+                     INNER JOIN Players p       ON (p.id = hp.playerId)
+                     INNER JOIN Gametypes gt    ON (gt.id = h.gametypeId)
+                WHERE h.id > %s
+                AND   h.id <= %s
+                ORDER BY h.id
+            """
+
+        # gametypes whose stats the HUD aggregates with those of a gametype, as in the
+        # subselects of get_stats_from_hand_aggregated
+        self.query['get_similar_gametypes'] = """
+                SELECT gt1.id from Gametypes gt1, Gametypes gt2
+                WHERE  gt1.siteid = gt2.siteid
+                AND    gt1.type = gt2.type
+                AND    gt1.category = gt2.category
+                AND    gt1.limittype = gt2.limittype
+                AND    gt1.bigblind <= gt2.bigblind * %s
+                AND    gt1.bigblind >= gt2.bigblind / %s
+                AND    gt2.id = %s
+            """
+
+        self.query['get_gametype_ids'] = "SELECT id FROM Gametypes"
      
         self.query['get_players_from_hand'] = """
                 SELECT HandsPlayers.playerId, seatNo, name
@@ -5003,6 +5167,210 @@ class Sql:
                               ,s.name
                       """
 
+        # playerDetailedStats answered from the rollup in <cache_table> (HudCache, PositionsCache
+        # or CardsCache) instead of HandsPlayers, hp is the cache table here and n counts its hands.
+        # variance and stddev come from the sums of totalProfit and of its square, divided by n on
+        # mysql and sqlite and by n-1 on postgresql, as their variance() does.
+        # It groups and orders as playerDetailedStats does on each backend, so the grid has the
+        # same rows whichever table answers it
+        if db_server == 'mysql':
+            variance_n = 'sum(hp.n)'
+            detailed_groupby = """group by hgametypeId
+                              ,pname
+                              ,gt.base
+                              ,gt.category
+                              <groupbyseats>
+                              ,plposition
+                              ,upper(gt.limitType)
+                              ,gt.fast
+                              ,s.name"""
+            detailed_orderby = """order by pname
+                              ,gt.base
+                              ,gt.category
+                              <orderbyseats>
+                              ,case <position> when 'B' then 'B'
+                                               when 'S' then 'S'
+                                               else concat('Z', <position>)
+                               end
+                              <orderbyhgametypeId>
+                              ,upper(gt.limitType) desc
+                              ,maxbigblind desc
+                              ,gt.fast
+                              ,s.name"""
+        elif db_server == 'postgresql':
+            variance_n = 'nullif(sum(hp.n)-1, 0)'
+            detailed_groupby = """group by hgametypeId
+                              ,pname
+                              ,gt.base
+                              ,gt.category
+                              ,gt.ante
+                              ,gt.currency
+                              <groupbyseats>
+                              ,plposition
+                              ,upper(gt.limitType)
+                              ,gt.fast
+                              ,s.name"""
+            detailed_orderby = """order by pname
+                              ,gt.base
+                              ,gt.category
+                              <orderbyseats>
+                              ,case <position> when 'B' then 'B'
+                                               when 'S' then 'S'
+                                               when '0' then 'Y'
+                                               else 'Z'||<position>
+                               end
+                              <orderbyhgametypeId>
+                              ,upper(gt.limitType) desc
+                              ,maxbigblind desc
+                              ,gt.fast
+                              ,s.name"""
+        elif db_server == 'sqlite':
+            variance_n = 'sum(hp.n)'
+            detailed_groupby = """group by hgametypeId
+                              ,hp.playerId
+                              ,gt.base
+                              ,gt.category
+                              <groupbyseats>
+                              ,plposition
+                              ,upper(gt.limitType)
+                              ,gt.fast
+                              ,s.name"""
+            detailed_orderby = """order by hp.playerId
+                              ,gt.base
+                              ,gt.category
+                              <orderbyseats>
+                              ,case <position> when 'B' then 'B'
+                                               when 'S' then 'S'
+                                               when '0' then 'Y'
+                                               else 'Z'||<position>
+                               end
+                              <orderbyhgametypeId>
+                              ,upper(gt.limitType) desc
+                              ,max(gt.bigBlind) desc
+                              ,gt.fast
+                              ,s.name"""
+        cache_variance = "(sum(hp.totalProfitSq) - (sum(hp.totalProfit)+0.0)*sum(hp.totalProfit)/sum(hp.n))/10000.0/" + variance_n
+        self.query['playerDetailedStatsCache'] = """
+                     select  <hgametypeId>                                                          AS hgametypeid
+                            ,<playerName>                                                           AS pname
+                            ,gt.base
+                            ,gt.category
+                            ,upper(gt.limitType)                                                    AS limittype
+                            ,s.name
+                            ,min(gt.bigBlind)                                                       AS minbigblind
+                            ,max(gt.bigBlind)                                                       AS maxbigblind
+                            ,gt.ante                                                                AS ante
+                            ,gt.currency                                                            AS currency
+                            ,<position>                                                             AS plposition
+                            ,gt.fast                                                                AS fast
+                            ,sum(hp.n)                                                              AS n
+                            ,case when sum(hp.street0VPIChance) = 0 then -999
+                                  else 100.0*sum(hp.street0VPI)/sum(hp.street0VPIChance)
+                             end                                                                    AS vpip
+                            ,case when sum(hp.street0AggrChance) = 0 then -999
+                                  else 100.0*sum(hp.street0Aggr)/sum(hp.street0AggrChance)
+                             end                                                                    AS pfr
+                            ,case when sum(hp.street0CalledRaiseChance) = 0 then -999
+                                  else 100.0*sum(hp.street0CalledRaiseDone)/sum(hp.street0CalledRaiseChance)
+                             end                                                                    AS car0
+                            ,case when sum(hp.street0_3Bchance) = 0 then -999
+                                  else 100.0*sum(hp.street0_3Bdone)/sum(hp.street0_3Bchance)
+                             end                                                                    AS pf3
+                            ,case when sum(hp.street0_4Bchance) = 0 then -999
+                                  else 100.0*sum(hp.street0_4Bdone)/sum(hp.street0_4Bchance)
+                             end                                                                    AS pf4
+                            ,case when sum(hp.street0_FoldTo3Bchance) = 0 then -999
+                                  else 100.0*sum(hp.street0_FoldTo3Bdone)/sum(hp.street0_FoldTo3Bchance)
+                             end                                                                    AS pff3
+                            ,case when sum(hp.street0_FoldTo4Bchance) = 0 then -999
+                                  else 100.0*sum(hp.street0_FoldTo4Bdone)/sum(hp.street0_FoldTo4Bchance)
+                             end                                                                    AS pff4
+                            ,case when sum(hp.raiseFirstInChance) = 0 then -999
+                                  else 100.0 * sum(hp.raisedFirstIn) / 
+                                       sum(hp.raiseFirstInChance)
+                             end                                                                    AS rfi
+                            ,case when sum(hp.stealChance) = 0 then -999
+                                  else 100.0 * sum(hp.stealDone) / 
+                                       sum(hp.stealChance)
+                             end                                                                    AS steals
+                            ,case when sum(hp.stealDone) = 0 then -999
+                                  else 100.0 * sum(hp.success_Steal) / 
+                                       sum(hp.stealDone)
+                             end                                                                    AS suc_steal
+                            ,100.0*sum(hp.street1Seen)/sum(hp.n)            AS saw_f
+                            ,100.0*sum(hp.sawShowdown)/sum(hp.n)            AS sawsd
+                            ,case when sum(hp.street1Seen) = 0 then -999
+                                  else 100.0*sum(hp.wonWhenSeenStreet1)/sum(hp.street1Seen)
+                             end                                                                    AS wmsf
+                            ,case when sum(hp.street1Seen) = 0 then -999
+                                  else 100.0*sum(hp.sawShowdown)/sum(hp.street1Seen)
+                             end                                                                    AS wtsdwsf
+                            ,case when sum(hp.sawShowdown) = 0 then -999
+                                  else 100.0*sum(hp.wonAtSD)/sum(hp.sawShowdown)
+                             end                                                                    AS wmsd
+                            ,case when sum(hp.street1Seen) = 0 then -999
+                                  else 100.0*sum(hp.street1Aggr)/sum(hp.street1Seen)
+                             end                                                                    AS flafq
+                            ,case when sum(hp.street2Seen) = 0 then -999
+                                  else 100.0*sum(hp.street2Aggr)/sum(hp.street2Seen)
+                             end                                                                    AS tuafq
+                            ,case when sum(hp.street3Seen) = 0 then -999
+                                 else 100.0*sum(hp.street3Aggr)/sum(hp.street3Seen)
+                             end                                                                    AS rvafq
+                            ,case when sum(hp.street1Seen)+sum(hp.street2Seen)+sum(hp.street3Seen) = 0 then -999
+                                 else 100.0*(sum(hp.street1Aggr)+sum(hp.street2Aggr)+sum(hp.street3Aggr))
+                                          /(sum(hp.street1Seen)+sum(hp.street2Seen)+sum(hp.street3Seen))
+                             end                                                                    AS pofafq
+                            ,case when sum(hp.street1Calls)+ sum(hp.street2Calls)+ sum(hp.street3Calls)+ sum(hp.street4Calls) = 0 then -999
+                                 else (sum(hp.street1Aggr) + sum(hp.street2Aggr) + sum(hp.street3Aggr) + sum(hp.street4Aggr))
+                                     /(0.0+sum(hp.street1Calls)+ sum(hp.street2Calls)+ sum(hp.street3Calls)+ sum(hp.street4Calls))
+                             end                                                                    AS aggfac
+                            ,case when
+                                sum(hp.foldToOtherRaisedStreet1)+ sum(hp.foldToOtherRaisedStreet2)+ sum(hp.foldToOtherRaisedStreet3)+ sum(hp.foldToOtherRaisedStreet4)+
+                                sum(hp.street1Calls)+ sum(hp.street2Calls)+ sum(hp.street3Calls)+ sum(hp.street4Calls)+
+                                sum(hp.street1Aggr)+ sum(hp.street2Aggr)+ sum(hp.street3Aggr)+ sum(hp.street4Aggr)
+                                = 0 then -999
+                            else
+                            100.0*(sum(hp.street1Aggr) + sum(hp.street2Aggr) + sum(hp.street3Aggr) + sum(hp.street4Aggr)) 
+                                       / ((sum(hp.foldToOtherRaisedStreet1)+ sum(hp.foldToOtherRaisedStreet2)+ sum(hp.foldToOtherRaisedStreet3)+ sum(hp.foldToOtherRaisedStreet4)) +
+                                       (sum(hp.street1Calls)+ sum(hp.street2Calls)+ sum(hp.street3Calls)+ sum(hp.street4Calls)) +
+                                       (sum(hp.street1Aggr) + sum(hp.street2Aggr) + sum(hp.street3Aggr) + sum(hp.street4Aggr)) )
+                              end                                                                   AS aggfrq
+                            ,case when
+                                sum(hp.street1CBChance)+
+                                sum(hp.street2CBChance)+
+                                sum(hp.street3CBChance)+
+                                sum(hp.street4CBChance) = 0 then -999
+                            else
+                             100.0*(sum(hp.street1CBDone) + sum(hp.street2CBDone) + sum(hp.street3CBDone) + sum(hp.street4CBDone)) 
+                                       / (sum(hp.street1CBChance)+ sum(hp.street2CBChance)+ sum(hp.street3CBChance)+ sum(hp.street4CBChance)) 
+                            end                                                                     AS conbet
+                            ,sum(hp.totalProfit)/100.0                                              AS net
+                            ,sum(hp.rake)/100.0                                                     AS rake
+                            ,100.0*sum(hp.totalProfit/(gt.bigBlind+0.0))/sum(hp.n)                 AS bbper100
+                            ,sum(hp.totalProfit)/100.0/sum(hp.n)                                    AS profitperhand
+                            ,100.0*sum((hp.totalProfit+hp.rake)/(gt.bigBlind+0.0))/sum(hp.n)        AS bb100xr
+                            ,sum(hp.totalProfit+hp.rake)/100.0/sum(hp.n)                            AS profhndxr
+                            ,<cache_avgseats>                                                       AS avgseats
+                            ,<variance>                                                             AS variance
+                            ,sqrt(case when <variance> < 0 then 0 else <variance> end)              AS stddev
+                            <selectseats>
+                      from <cache_table> hp
+                           inner join Gametypes gt  on  (gt.Id = hp.gametypeId)
+                           inner join Sites s       on  (s.Id = gt.siteId)
+                           inner join Players p     on  (p.Id = hp.playerId)
+                      where hp.playerId in <player_test>
+                      <game_test>
+                      <site_test>
+                      <currency_test>
+                      <cache_seats_test>
+                      <gtbigBlind_test>
+                      <cache_datestest>
+                      <detailed_groupby>
+                      having 1 = 1 <havingclause>
+                      <detailed_orderby>
+                      """.replace('<detailed_groupby>', detailed_groupby).replace('<detailed_orderby>', detailed_orderby).replace('<variance>', cache_variance)
+
         #FIXME: 3/4bet and foldTo don't added four tournaments yet
         if db_server == 'mysql':
             self.query['tourneyPlayerDetailedStats'] = """
@@ -5979,7 +6347,7 @@ class Sql:
             ORDER BY h.startTime"""
 
         self.query['getRingProfitAllHandsPlayerIdSiteInBB'] = """
-            SELECT hp.handId, ( hp.totalProfit / ( gt.bigBlind  * 2.0 ) ) * 100 , hp.sawShowdown, ( hp.allInEV / ( gt.bigBlind * 2.0 ) ) * 100
+            SELECT hp.handId, ( hp.totalProfit / ( gt.bigBlind  * 2.0 ) ) * 100 , hp.sawShowdown, ( hp.allInEV / ( gt.bigBlind * 2.0 ) ) * 100, h.startTime
             FROM HandsPlayers hp
             INNER JOIN Players pl      ON  (pl.id = hp.playerId)
             INNER JOIN Hands h         ON  (h.id  = hp.handId)
@@ -5992,11 +6360,12 @@ class Sql:
             <game_test>
             <currency_test>
             AND   hp.tourneysPlayersId IS NULL
+            <handid_test>
             GROUP BY h.startTime, hp.handId, hp.sawShowdown, hp.totalProfit, hp.allInEV, gt.bigBlind
             ORDER BY h.startTime"""
 
         self.query['getRingProfitAllHandsPlayerIdSiteInDollars'] = """
-            SELECT hp.handId, hp.totalProfit, hp.sawShowdown, hp.allInEV
+            SELECT hp.handId, hp.totalProfit, hp.sawShowdown, hp.allInEV, h.startTime
             FROM HandsPlayers hp
             INNER JOIN Players pl      ON  (pl.id = hp.playerId)
             INNER JOIN Hands h         ON  (h.id  = hp.handId)
@@ -6009,6 +6378,7 @@ class Sql:
             <game_test>
             <currency_test>
             AND   hp.tourneysPlayersId IS NULL
+            <handid_test>
             GROUP BY h.startTime, hp.handId, hp.sawShowdown, hp.totalProfit, hp.allInEV
             ORDER BY h.startTime"""
 
@@ -6192,6 +6562,92 @@ class Sql:
                       ha.id ASC
                 """
 
+        ####################################
+        # Queries to load many hands at once for the replayer and hand viewer,
+        # <hand_ids> is replaced with a list of placeholders
+        ####################################
+        self.query['get_gameinfo_from_hids'] = """
+                SELECT
+                        h.id,
+                        s.name,
+                        g.category,
+                        g.base,
+                        g.type,
+                        g.limitType,
+                        g.hilo,
+                        round(g.smallBlind / 100.0,2),
+                        round(g.bigBlind / 100.0,2),
+                        round(g.smallBet / 100.0,2),
+                        round(g.bigBet / 100.0,2),
+                        g.currency,
+                        h.gametypeId,
+                        g.split
+                    FROM
+                        Hands as h,
+                        Sites as s,
+                        Gametypes as g
+                    WHERE
+                        h.id in (<hand_ids>)
+                    and g.id = h.gametypeId
+                    and s.id = g.siteId
+                """
+
+        self.query['multiHand'] = """
+                 SELECT h.*
+                    FROM Hands h
+                    WHERE id in (<hand_ids>)"""
+
+        self.query['multiHandBoards'] = """
+                 SELECT b.*
+                    FROM Boards b
+                    WHERE handId in (<hand_ids>)
+                    ORDER BY handId, boardId"""
+
+        self.query['multiPlayerHand'] = """
+            SELECT
+                        hp.handId,
+                        hp.seatno,
+                        round(hp.winnings / 100.0,2) as winnings,
+                        p.name,
+                        round(hp.startCash / 100.0,2) as chips,
+                        hp.card1,hp.card2,hp.card3,hp.card4,hp.card5,
+                        hp.card6,hp.card7,hp.card8,hp.card9,hp.card10,
+                        hp.card11,hp.card12,hp.card13,hp.card14,hp.card15,
+                        hp.card16,hp.card17,hp.card18,hp.card19,hp.card20,
+                        hp.position,
+                        round(hp.startBounty / 100.0,2) as bounty,
+                        hp.sitout
+                    FROM
+                        HandsPlayers as hp,
+                        Players as p
+                    WHERE
+                        hp.handId in (<hand_ids>)
+                        and p.id = hp.playerId
+                    ORDER BY
+                        hp.handId, hp.seatno
+                """
+
+        self.query['multiHandActions'] = """
+            SELECT
+                      ha.handId,
+                      ha.actionNo,
+                      p.name,
+                      ha.street,
+                      ha.actionId,
+                      ha.allIn,
+                      round(ha.amount / 100.0,2) as bet,
+                      ha.numDiscarded,
+                      ha.cardsDiscarded
+                FROM
+                      HandsActions as ha,
+                      Players as p
+                WHERE
+                          ha.handId in (<hand_ids>)
+                      AND ha.playerId = p.id
+                ORDER BY
+                      ha.handId, ha.id ASC
+                """
+
         ####################################
         # Queries to rebuild/modify hudcache
         ####################################
@@ -6362,6 +6818,7 @@ class Sql:
                 ,street1Discards
                 ,street2Discards
                 ,street3Discards
+                ,totalProfitSq
                 )
                 SELECT <select>
                       ,count(1)
@@ -6479,6 +6936,7 @@ class Sql:
                       ,sum(street1Discards)
                       ,sum(street2Discards)
                       ,sum(street3Discards)
+                      ,sum(totalProfit*totalProfit)
                 FROM Hands h
                 INNER JOIN HandsPlayers hp ON (h.id = hp.handId<hero_join>)
                 INNER JOIN Gametypes g ON (h.gametypeId = g.id)
@@ -6604,6 +7062,7 @@ class Sql:
                 ,street1Discards
                 ,street2Discards
                 ,street3Discards
+                ,totalProfitSq
                 )
                 SELECT <select>
                       ,count(1)
@@ -6721,6 +7180,7 @@ class Sql:
                       ,sum(CAST(street1Discards as integer))
                       ,sum(CAST(street2Discards as integer))
                       ,sum(CAST(street3Discards as integer))
+                      ,sum(CAST(totalProfit as bigint)*totalProfit)
                 FROM Hands h
                 INNER JOIN HandsPlayers hp ON (h.id = hp.handId<hero_join>)
                 INNER JOIN Gametypes g ON (h.gametypeId = g.id)
@@ -6846,6 +7306,7 @@ class Sql:
                 ,street1Discards
                 ,street2Discards
                 ,street3Discards
+                ,totalProfitSq
                 )
                 SELECT <select>
                       ,count(1)
@@ -6963,6 +7424,7 @@ class Sql:
                       ,sum(CAST(street1Discards as integer))
                       ,sum(CAST(street2Discards as integer))
                       ,sum(CAST(street3Discards as integer))
+                      ,sum(CAST(totalProfit as integer)*CAST(totalProfit as integer))
                 FROM Hands h
                 INNER JOIN HandsPlayers hp ON (h.id = hp.handId<hero_join>)
                 INNER JOIN Gametypes g ON (h.gametypeId = g.id)
@@ -7094,7 +7556,8 @@ class Sql:
                 street4Raises,
                 street1Discards,
                 street2Discards,
-                street3Discards)
+                street3Discards,
+                totalProfitSq)
             values (%s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
@@ -7119,7 +7582,7 @@ class Sql:
                     %s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
-                    %s)"""
+                    %s, %s)"""
 
         self.query['update_hudcache'] = """
             UPDATE HudCache SET
@@ -7237,7 +7700,8 @@ class Sql:
             street4Raises=street4Raises+%s,            
             street1Discards=street1Discards+%s,
             street2Discards=street2Discards+%s,
-            street3Discards=street3Discards+%s
+            street3Discards=street3Discards+%s,
+            totalProfitSq=totalProfitSq+%s
         WHERE id=%s"""
             
         self.query['select_hudcache_ring'] = """
@@ -7260,6 +7724,46 @@ class Sql:
                     AND   tourneyTypeId=%s
                     AND   styleKey = %s"""
             
+        ####################################
+        # Set based merge of a batch of deltas into a cache table, see Database.mergeCache
+        # <table>, <delta>, <columns>, <match> and <set> are filled in by mergeCache
+        ####################################
+
+        self.query['createCacheDelta'] = """CREATE TEMPORARY TABLE IF NOT EXISTS <delta> AS
+                                             SELECT <columns> FROM <table> WHERE 1=0"""
+
+        self.query['clearCacheDelta'] = """DELETE FROM <delta>"""
+
+        self.query['insertCacheDelta'] = """insert into <delta> (<columns>) values (<values>)"""
+
+        if db_server == 'mysql':
+            self.query['mergeCacheUpdate'] = """UPDATE <table> T INNER JOIN <delta> D ON (<match>)
+                                                 SET <set>"""
+            self.query['mergeCacheColumn'] = """T.<col>"""
+            self.query['mergeCacheNullMatch'] = """T.<col> <=> D.<col>"""
+        elif db_server == 'postgresql':
+            self.query['mergeCacheUpdate'] = """UPDATE <table> T SET <set>
+                                                 FROM <delta> D WHERE <match>"""
+            self.query['mergeCacheColumn'] = """<col>"""
+            self.query['mergeCacheNullMatch'] = """T.<col> IS NOT DISTINCT FROM D.<col>"""
+        elif db_server == 'sqlite':
+            import sqlite3
+            if sqlite3.sqlite_version_info >= (3, 33, 0):
+                self.query['mergeCacheUpdate'] = """UPDATE <table> AS T SET <set>
+                                                     FROM <delta> D WHERE <match>"""
+            else:
+                # no UPDATE ... FROM, mergeCache looks the ids up with mergeCacheIds instead
+                self.query['mergeCacheUpdate'] = None
+            self.query['mergeCacheColumn'] = """<col>"""
+            self.query['mergeCacheNullMatch'] = """T.<col> IS D.<col>"""
+
+        self.query['mergeCacheIds'] = """SELECT T.id, <columns> FROM <delta> D
+                                          INNER JOIN <table> T ON (<match>)"""
+
+        self.query['mergeCacheInsert'] = """INSERT INTO <table> (<columns>)
+                                             SELECT <dcolumns> FROM <delta> D
+                                             WHERE NOT EXISTS (SELECT 1 FROM <table> T WHERE <match>)"""
+
         self.query['get_hero_hudcache_start'] = """select min(hc.styleKey)
                                                    from HudCache hc
                                                    where hc.playerId in <playerid_list>
@@ -7390,7 +7894,8 @@ class Sql:
                 street4Raises,
                 street1Discards,
                 street2Discards,
-                street3Discards)
+                street3Discards,
+                totalProfitSq)
             values (%s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
@@ -7415,7 +7920,7 @@ class Sql:
                     %s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
-                    %s)"""
+                    %s, %s)"""
 
         self.query['update_cardscache'] = """
             UPDATE CardsCache SET
@@ -7533,7 +8038,8 @@ class Sql:
                     street4Raises=street4Raises+%s,
                     street1Discards=street1Discards+%s,
                     street2Discards=street2Discards+%s,
-                    street3Discards=street3Discards+%s
+                    street3Discards=street3Discards+%s,
+                    totalProfitSq=totalProfitSq+%s
         WHERE     id=%s"""
             
         self.query['select_cardscache_ring'] = """
@@ -7683,7 +8189,8 @@ class Sql:
                 street4Raises,
                 street1Discards,
                 street2Discards,
-                street3Discards)
+                street3Discards,
+                totalProfitSq)
             values (%s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
@@ -7708,7 +8215,7 @@ class Sql:
                     %s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
-                    %s, %s, %s
+                    %s, %s, %s, %s
                     )"""
 
         self.query['update_positionscache'] = """
@@ -7827,7 +8334,8 @@ class Sql:
                     street4Raises=street4Raises+%s,
                     street1Discards=street1Discards+%s,
                     street2Discards=street2Discards+%s,
-                    street3Discards=street3Discards+%s
+                    street3Discards=street3Discards+%s,
+                    totalProfitSq=totalProfitSq+%s
         WHERE id=%s"""
             
         self.query['select_positionscache_ring'] = """
@@ -8031,7 +8539,8 @@ class Sql:
                     street4Raises,
                     street1Discards,
                     street2Discards,
-                    street3Discards
+                    street3Discards,
+                    totalProfitSq
                     FROM SessionsCache
                     WHERE endTime>=%s
                     AND startTime<=%s
@@ -8050,7 +8559,7 @@ class Sql:
         
         self.query['insert_W'] = """insert into Weeks (
                     weekStart)
-                    values (%s)"""
+                    values (%s, %s)"""
         
         self.query['insert_M'] = """insert into Months (
                     monthStart)
@@ -8183,7 +8692,8 @@ class Sql:
                     street4Raises,
                     street1Discards,
                     street2Discards,
-                    street3Discards
+                    street3Discards,
+                    totalProfitSq
                     )
                     values (%s, %s, %s, %s, %s,
                             %s, %s, %s, %s, %s,
@@ -8208,7 +8718,7 @@ class Sql:
                             %s, %s, %s, %s, %s,
                             %s, %s, %s, %s, %s,
                             %s, %s, %s, %s, %s,
-                            %s, %s, %s, %s, %s)"""
+                            %s, %s, %s, %s, %s, %s)"""
                             
         self.query['insert_TC'] = """insert into TourneysCache (
                     sessionId,
@@ -8330,7 +8840,8 @@ class Sql:
                     street4Raises,
                     street1Discards,
                     street2Discards,
-                    street3Discards
+                    street3Discards,
+                    totalProfitSq
                     )
                     values (%s, %s, %s, %s, %s,
                             %s, %s, %s, %s, %s,
@@ -8355,7 +8866,7 @@ class Sql:
                             %s, %s, %s, %s, %s,
                             %s, %s, %s, %s, %s,
                             %s, %s, %s, %s, %s,
-                            %s, %s, %s, %s, %s)"""
+                            %s, %s, %s, %s, %s, %s)"""
                     
         ####################################
         # update
@@ -8493,7 +9004,8 @@ class Sql:
                     street4Raises=street4Raises+%s,
                     street1Discards=street1Discards+%s,
                     street2Discards=street2Discards+%s,
-                    street3Discards=street3Discards+%s
+                    street3Discards=street3Discards+%s,
+                    totalProfitSq=totalProfitSq+%s
                     WHERE id=%s"""
                     
         self.query['update_TC'] = """
@@ -8613,7 +9125,8 @@ class Sql:
                     street4Raises=street4Raises+%s,
                     street1Discards=street1Discards+%s,
                     street2Discards=street2Discards+%s,
-                    street3Discards=street3Discards+%s
+                    street3Discards=street3Discards+%s,
+                    totalProfitSq=totalProfitSq+%s
                     WHERE tourneyId=%s
                     AND playerId=%s"""
                     
@@ -8753,6 +9266,23 @@ class Sql:
                                          INNER JOIN Gametypes G ON (H.gametypeId = G.id)
                                          WHERE siteHandNo=%s AND G.siteId=%s<heroSeat>
         """
+
+        self.query['areAlreadyInDB'] = """SELECT H.siteHandNo<heroSeat> FROM Hands H
+                                         INNER JOIN Gametypes G ON (H.gametypeId = G.id)
+                                         WHERE G.siteId=%s AND siteHandNo IN (<siteHandNos>)
+        """
+
+        self.query['getPlayerIdsByNames'] = """SELECT id, name, hero FROM Players
+                                              WHERE siteId=%s AND name IN (<names>)
+        """
+
+        self.query['getPlayerByName'] = """SELECT id, name, hero FROM Players WHERE name=%s and siteid=%s"""
+
+        self.query['insertPlayer'] = """INSERT INTO Players (name, siteId, hero, chars) VALUES (%s, %s, %s, %s)"""
+
+        self.query['updatePlayerHero'] = """UPDATE Players SET hero=%s WHERE name=%s and siteid=%s"""
+
+        self.query['insertStartCards'] = """INSERT INTO StartCards (category, name, rank, combinations) VALUES (%s, %s, %s, %s)"""
         
         self.query['getTourneyTypeIdByTourneyNo'] = """SELECT tt.id,
                                                               tt.siteId,
@@ -8951,6 +9481,12 @@ class Sql:
                                                        WHERE tourneyId=%s
         """
 
+        self.query['getTourneyResults'] = """SELECT p.name, tp.rank, tp.winnings
+                                             FROM TourneysPlayers tp
+                                             INNER JOIN Players p ON (p.id = tp.playerId)
+                                             WHERE tp.tourneyId=%s
+        """
+
         self.query['updateTourneysPlayer'] = """UPDATE TourneysPlayers
                                                  SET rank = %s,
                                                      winnings = %s,
@@ -9351,6 +9887,29 @@ class Sql:
                     finished=%s
                     WHERE id=%s"""
         
+        ################################
+        # Raw hand archive, see Archive.py
+        # (not get<table> names, those are the dumpDatabase queries below)
+        ################################
+        self.query['storeRawHand'] = """INSERT INTO RawHands
+                    (handId, lastHandId, compression, offsets, rawHand, complain)
+                    VALUES (%s, %s, %s, %s, %s, %s)"""
+
+        self.query['updateRawHand'] = """UPDATE RawHands
+                    SET handId=%s, lastHandId=%s, compression=%s, offsets=%s, rawHand=%s, complain=%s
+                    WHERE id=%s"""
+
+        # blocks holding any of the hands between the two ids
+        self.query['getRawHandBlocks'] = """SELECT handId, lastHandId, compression, offsets, rawHand
+                    FROM RawHands
+                    WHERE handId <= %s AND lastHandId >= %s AND complain = %s
+                    ORDER BY handId"""
+
+        self.query['getFailedRawHandBlocks'] = """SELECT id, compression, offsets, rawHand
+                    FROM RawHands
+                    WHERE complain = %s
+                    ORDER BY id"""
+
         ################################
         # Counts for DB stats window
         ################################
@@ -9379,6 +9938,7 @@ class Sql:
         if db_server == 'sqlite':
             for k, q in self.query.iteritems():
                 self.query[k] = re.sub('%s', '?', q)
+        return self.query
 
 if __name__ == "__main__":
 #    just print the default queries and exit
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""StartupBenchmark.py
+
+Times loading fpdb.pyw, each run in a fresh interpreter: the main window module
+on its own, as at startup, and with every tab module imported as well, which is
+what startup cost before fpdb.pyw imported them on first use. The difference is
+left to whichever tabs get opened.
+Run from the pyfpdb directory: python StartupBenchmark.py [runs]
+"""
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#    In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import os
+import sys
+import subprocess
+
+TAB_MODULES = ['GuiAutoImport', 'GuiBulkImport', 'GuiTourneyImport', 'GuiRingPlayerStats',
+               'GuiTourneyPlayerStats', 'GuiPositionalStats', 'GuiGraphViewer',
+               'GuiTourneyGraphViewer', 'GuiSessionViewer', 'GuiHandViewer', 'GuiStove',
+               'GuiPrefs', 'GuiLogView', 'DetectInstalledSites', 'Stats']
+
+# runs in the child, prints seconds taken and the number of modules loaded
+CHILD = """
+import sys, time, imp
+sys.argv = ['fpdb.pyw']
+start = time.time()
+imp.load_source('fpdb_main', 'fpdb.pyw')
+for name in %r:
+    __import__(name)
+print time.time() - start, len(sys.modules)
+"""
+
+def time_load(modules):
+    child = subprocess.Popen([sys.executable, '-c', CHILD % (modules,)], stdout=subprocess.PIPE)
+    out = child.communicate()[0]
+    if child.returncode:
+        raise RuntimeError("loading fpdb.pyw failed, see the traceback above")
+    (seconds, count) = out.split()[-2:]
+    return float(seconds), int(count)
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    runs = int(argv[0]) if argv else 5
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    time_load([])   # warm the disk cache and write the .pyc files
+    for (label, modules) in (("fpdb.pyw startup", []), ("with every tab module", TAB_MODULES)):
+        results = [time_load(modules) for i in xrange(runs)]
+        print "%-24s %6.3fs  %4d modules" % (label, median([r[0] for r in results]), results[-1][1])
+
+if __name__ == '__main__':
+    sys.exit(main())
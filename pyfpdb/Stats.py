@@ -79,6 +79,8 @@ log = logging.getLogger("db")
 
 re_Places = re.compile("_[0-9]$")
 
+# configured stat name -> (stat function, decimal places or None), filled by get_stat
+_compiled_stats = {}
 
 
 # Since tuples are immutable, we have to create a new one when
@@ -96,6 +98,25 @@ def do_tip(widget, tip):
     widget.setToolTip(_tip)
 
 
+def get_stat(stat):
+    """Resolve a stat name from the config, eg. vpip or vpip_1, to its function
+       and decimal places override. This is done once per name, returns None
+       for names that are not stats."""
+    try:
+        return _compiled_stats[stat]
+    except KeyError:
+        pass
+    statname = stat
+    places = None
+    if re_Places.search(stat):   # override if necessary
+        statname = stat[0:-2]
+        places = int(stat[-1:])
+    compiled = None
+    if statname in STATLIST:
+        compiled = (globals()[statname], places)
+    _compiled_stats[stat] = compiled
+    return compiled
+
 def do_stat(stat_dict, player = 24, stat = 'vpip', hand_instance = None):
 
     #hand instance is not needed for many stat functions
@@ -104,16 +125,12 @@ def do_stat(stat_dict, player = 24, stat = 'vpip', hand_instance = None):
     global _global_hand_instance
     _global_hand_instance = hand_instance
     
-    statname = stat
-    match = re_Places.search(stat)
-    if match:   # override if necessary
-        statname = stat[0:-2]
-
-    if statname not in STATLIST:
+    compiled = get_stat(stat)
+    if compiled is None:
         return None
+    (function, places) = compiled
 
-    result = eval("%(stat)s(stat_dict, %(player)d)" %
-        {'stat': statname, 'player': player})
+    result = function(stat_dict, player)
 
     # If decimal places have been defined, override result[1]
     # NOTE: decimal place override ALWAYS assumes the raw result is a
@@ -121,11 +138,32 @@ def do_stat(stat_dict, player = 24, stat = 'vpip', hand_instance = None):
     # percentage values. Also, profit/100 hands (bb/BB) already default
     # to three decimal places anyhow, so they are unlikely override
     # candidates.
-    if match:
-        places = int(stat[-1:])
+    if places is not None:
         result = __stat_override(places, result)
     return result
 
+def do_stats(stat_dict, stats, players = None, hand_instance = None):
+    """do_stat for every stat in stats and every player in players, all of the
+       players in stat_dict if not given. Returns {player: {stat: result}},
+       names that are not stats are left out."""
+    global _global_hand_instance
+    _global_hand_instance = hand_instance
+
+    compiled = [(stat, get_stat(stat)) for stat in stats]
+    compiled = [(stat, c[0], c[1]) for (stat, c) in compiled if c is not None]
+    if players is None:
+        players = stat_dict.keys()
+
+    results = {}
+    for player in players:
+        values = results[player] = {}
+        for (stat, function, places) in compiled:
+            result = function(stat_dict, player)
+            if places is not None:
+                result = __stat_override(places, result)
+            values[stat] = result
+    return results
+
 #    OK, for reference the tuple returned by the stat is:
 #    0 - The stat, raw, no formating, eg 0.33333333
 #    1 - formatted stat with appropriate precision, eg. 33; shown in HUD
@@ -1507,7 +1545,7 @@ misslist = [ "Configuration", "Database", "Charset", "codecs", "encoder"
                  , 'GPollableInputStream', 'GPollableOutputStream'
                  , "re", "re_Places", 'Hand'
                ]
-STATLIST = [ x for x in STATLIST if x not in ("do_stat", "do_tip","get_valid_stats")]
+STATLIST = [ x for x in STATLIST if x not in ("do_stat", "do_stats", "do_tip", "get_stat", "get_valid_stats")]
 STATLIST = [ x for x in STATLIST if not x.startswith('_')]
 STATLIST = [ x for x in STATLIST if x not in dir(sys) ]
 STATLIST = [ x for x in STATLIST if x not in dir(codecs) ]
@@ -14,9 +14,18 @@
 import L10n
 _ = L10n.get_translation()
 
-import sys, random
+import sys
 import re
-import pokereval
+import os
+import multiprocessing
+
+import Configuration
+try:
+    import pokereval
+    PokerEval = pokereval.PokerEval
+except ImportError:
+    from Evaluator import PokerEval
+import Evaluator
 
 SUITS = ['h', 'd', 's', 'c']
 
@@ -27,7 +36,12 @@ ANY = 0
 SUITED = 1
 OFFSUIT = 2
 
-ev = pokereval.PokerEval()
+CHUNK_SIZE = 8              # villain combos handed to a pool process at a time
+PREFLOP_TABLE = os.path.join(Configuration.PYFPDB_PATH, u"PreflopEquity.txt")
+PREFLOP_SCALE = 10000       # the table holds wins and ties in ten thousandths
+PREFLOP_SAMPLES = 40000     # Monte Carlo deals per matchup when building the table
+
+ev = PokerEval()
 
 
 class Stove:
@@ -148,20 +162,88 @@ class SumEV:
         self.n_ties += ev.n_ties
         self.n_losses += ev.n_losses
 
-    def show(self, hand, h_range):
+    def show(self, hand, h_range, preflop=False):
+        print self.format(hand, h_range, preflop)
+
+    def format(self, hand, h_range, preflop=False):
         win_pct = 100 * (float(self.n_wins) / float(self.n_hands))
         lose_pct = 100 * (float(self.n_losses) / float(self.n_hands))
         tie_pct = 100 * (float(self.n_ties) / float(self.n_hands))
         equity = win_pct + tie_pct / 2.
+        if preflop:
+            plays = "Looked up %d hands in the preflop table." % (self.n_hands / PREFLOP_SCALE)
+        else:
+            plays = "Enumerated %d possible plays." % self.n_hands
         self.output = """
-Enumerated %d possible plays.
+%s
 Your hand: (%s %s)
 Against the range: %s
 Equity       Win         Lose         Tie
 %5.2f%%    %5.2f%%    %5.2f%%    %5.2f%%
-""" % (self.n_hands, hand.c1, hand.c2, cards_from_range(h_range), equity, win_pct, lose_pct, tie_pct)
-
-        print self.output
+""" % (plays, hand.c1, hand.c2, cards_from_range(h_range), equity, win_pct, lose_pct, tie_pct)
+        return self.output
+
+
+class RangeEquity:
+    """Equity of holder's hand against its villain range.
+       With a flop, turn or river every villain combo is enumerated exactly,
+       CHUNK_SIZE combos at a time on a pool of processes. Without a board the
+       combos are looked up in the preflop table. The chunks are added to sum
+       as they come back, so poll() lets a gui show the running total while
+       the rest is still being worked out."""
+
+    def __init__(self, holder, processes=None):
+        self.sum = SumEV()
+        self.combos = 0         # villain combos added to sum so far
+        self.pool = None
+        hand = holder.hand.get()
+        board = holder.board.get()
+        villains = [h.get() for h in holder.h_range.get()]
+        self.total = len(villains)
+        self.preflop = board[2] == '__'
+        if self.preflop:
+            for villain in villains:
+                self.sum.add(preflop_odds(hand, villain))
+            self.combos = self.total
+        elif villains:
+            tasks = [(hand, villains[i:i + CHUNK_SIZE], board) for i in xrange(0, len(villains), CHUNK_SIZE)]
+            self.pool = multiprocessing.Pool(processes)
+            self.results = self.pool.imap_unordered(_odds_worker, tasks)
+            self.pool.close()
+
+    def __iter__(self):
+        """Wait for the chunks, yielding the running sum after each"""
+        while not self.done():
+            self._add(self.results.next())
+            yield self.sum
+
+    def done(self):
+        return self.combos == self.total
+
+    def poll(self):
+        """Add up the chunks that have come back, without waiting.
+           Returns True if any were added."""
+        added = False
+        while not self.done():
+            try:
+                self._add(self.results.next(0))
+            except multiprocessing.TimeoutError:
+                break
+            added = True
+        return added
+
+    def cancel(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def _add(self, (count, ev)):
+        self.sum.add(ev)
+        self.combos += count
+        if self.done():
+            self.pool.join()
+            self.pool = None
 
 
 # Expands hand abbreviations such as JJ and AK to full hand ranges.
@@ -282,43 +364,121 @@ def odds_for_hand(hand1, hand2, board, iterations):
     return _ev
 
 
-def odds_for_range(holder):
+def _odds_worker((hand, villains, board)):
+    """Runs in a pool process, returns (combos, EV) for hand against villains"""
     sev = SumEV()
-    monte_carlo = False
+    for villain in villains:
+        sev.add(odds_for_hand(hand, villain, board, iterations=0))
+    return (len(villains), EV(sev.n_hands, sev.n_wins, sev.n_ties, sev.n_losses))
 
-    # Construct board list
-    b = []
-    board = holder.board
-    if board.b3 is not None:
-        b.extend([board.b1, board.b2, board.b3])
-    else:
-        b.extend(['__', '__', '__'])
-        monte_carlo = True
-    if board.b4 is not None:
-        b.append(board.b4)
-    else:
-        b.append("__")
-    if board.b5 is not None:
-        b.append(board.b5)
-    else:
-        b.append("__")
 
-    if monte_carlo:
-        print _('No board given. Using Monte-Carlo simulation...')
-        iters = random.randint(25000, 125000)
-    else:
-        iters = -1
-    for h in holder.h_range.get():
-        e = odds_for_hand(
-            [holder.hand.c1, holder.hand.c2],
-            [h.c1, h.c2],
-            b,
-            iterations=iters
-            )
-        sev.add(e)
-
-    sev.show(holder.hand, holder.h_range.get())
-    return sev
+def odds_for_range(holder, processes=None):
+    equity = RangeEquity(holder, processes)
+    if equity.preflop:
+        print _('No board given. Using the preflop equity table...')
+    for sev in equity:
+        pass
+    equity.sum.show(holder.hand, holder.h_range.get(), equity.preflop)
+    return equity.sum
+
+
+def hand_class(c1, c2):
+    """Preflop class of two cards: 'AA', 'AKs' or 'AKo'"""
+    (r1, r2) = sorted([c1[0], c2[0]], key=CARDS.index, reverse=True)
+    if r1 == r2:
+        return r1 + r2
+    elif c1[1] == c2[1]:
+        return r1 + r2 + 's'
+    return r1 + r2 + 'o'
+
+def hand_classes():
+    """The 169 preflop classes, pairs first"""
+    ranks = CARDS[::-1]
+    classes = [r + r for r in ranks]
+    for (i, r1) in enumerate(ranks):
+        for r2 in ranks[i + 1:]:
+            classes.extend([r1 + r2 + 's', r1 + r2 + 'o'])
+    return classes
+
+_preflop = None
+
+def preflop_table():
+    """{(class, class): (wins, ties)} of the first class against the second,
+       in PREFLOP_SCALE units. Read from PREFLOP_TABLE on first use."""
+    global _preflop
+    if _preflop is None:
+        classes = hand_classes()
+        table = {}
+        f = open(PREFLOP_TABLE)
+        try:
+            for line in f:
+                if line.startswith('#') or not line.strip():
+                    continue
+                fields = line.split()
+                for (c2, entry) in zip(classes[classes.index(fields[0]):], fields[1:]):
+                    (win, tie) = [int(n) for n in entry.split(',')]
+                    table[(fields[0], c2)] = (win, tie)
+                    table[(c2, fields[0])] = (PREFLOP_SCALE - win - tie, tie)
+        finally:
+            f.close()
+        _preflop = table
+    return _preflop
+
+def preflop_odds(hand1, hand2):
+    (win, tie) = preflop_table()[(hand_class(*hand1), hand_class(*hand2))]
+    return EV(PREFLOP_SCALE, win, tie, PREFLOP_SCALE - win - tie)
+
+
+def build_preflop_table(path=PREFLOP_TABLE, samples=PREFLOP_SAMPLES, processes=None):
+    """Write the table read by preflop_table(), one line per class listing
+       its wins and ties against itself and every class after it.
+       Each matchup is averaged over the pairs of combos that can meet, with
+       samples Monte Carlo deals shared out between them. Pairs that only
+       differ by a change of suits are dealt together. Takes a while."""
+    classes = hand_classes()
+    tasks = [(c1, classes[i:], samples) for (i, c1) in enumerate(classes)]
+    pool = multiprocessing.Pool(processes)
+    try:
+        f = open(path, 'w')
+        try:
+            f.write("# Preflop equity table for Stove.py, written by build_preflop_table()\n")
+            f.write("# wins,ties of the first class against the rest in 1/%d, %d deals a matchup\n" % (PREFLOP_SCALE, samples))
+            for (c1, row) in zip(classes, pool.imap(_preflop_row_worker, tasks)):
+                f.write(' '.join([c1] + ['%d,%d' % entry for entry in row]) + '\n')
+        finally:
+            f.close()
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def _preflop_row_worker((c1, classes, samples)):
+    """Runs in a pool process, returns [(wins, ties), ...] of c1 against classes"""
+    evaluator = Evaluator.PokerEval(budget=2 * samples)
+    row = []
+    for c2 in classes:
+        matchups = {}
+        for h in standard_expand(c1, None, set()):
+            for v in standard_expand(c2, None, set(h.get())):
+                cards = _suit_canonical(h.get() + v.get())
+                matchups[cards] = matchups.get(cards, 0) + 1
+        total = sum(matchups.itervalues())
+        win = tie = 0.0
+        for (cards, count) in matchups.iteritems():
+            res = evaluator.poker_eval(game='holdem', pockets=[cards[:2], cards[2:]], dead=[],
+                                       board=['__'] * 5, iterations=max(1, samples * count / total))
+            plays = float(res['info'][0])
+            win += res['eval'][0]['winhi'] / plays * count / total
+            tie += res['eval'][0]['tiehi'] / plays * count / total
+        row.append((int(round(win * PREFLOP_SCALE)), int(round(tie * PREFLOP_SCALE))))
+    return row
+
+def _suit_canonical(cards):
+    """cards with the suits renamed in order of appearance"""
+    suits = {}
+    return tuple([c[0] + suits.setdefault(c[1], SUITS[len(suits)]) for c in cards])
 
 def usage(me):
     print """Texas Hold'Em odds calculator
@@ -349,4 +509,6 @@ def main(argv=None):
     odds_for_range(stove)
 
 if __name__  == '__main__':
+    # the pool of RangeEquity and build_preflop_table starts copies of a frozen Stove.exe
+    multiprocessing.freeze_support()
     sys.exit(main())
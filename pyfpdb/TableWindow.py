@@ -225,6 +225,11 @@ class Table_Window(object):
                 return True
         return False
 
+    def stop_tracking(self):
+        """Called when the hud for this table is killed. Subclasses that follow
+           the table with window system events stop doing so here."""
+        pass
+
     def check_bad_words(self, title):
         for word in bad_words:
             if word in title: return True
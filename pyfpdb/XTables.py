@@ -50,6 +50,113 @@ utf8atom = getAtom("UTF8_STRING")
 c = Configuration.Config()
 log = logging.getLogger("hud")
 
+def query_geometry(window):
+    """Ask the server where window is, None if it is gone"""
+    try:
+        geo = xconn.core.GetGeometry(window).reply()
+        absxy = xconn.core.TranslateCoordinates(window, root, geo.x, geo.y).reply()
+    except (xcffib.xproto.DrawableError, xcffib.xproto.WindowError):
+        return None
+    return {'x'        : absxy.dst_x,
+            'y'        : absxy.dst_y,
+            'width'    : geo.width,
+            'height'   : geo.height
+           }
+
+class WindowTracker(object):
+    """Follows the table windows with X events instead of asking the server for
+       every table on every timer tick. The window manager sends the client a
+       ConfigureNotify when the table is moved or resized, the client list and
+       geometry are only queried when one of those arrives. Hand fileno() to a
+       QSocketNotifier and call changes() whenever it is readable."""
+
+    TITLE_ATOMS = (wnameatom, xcffib.xproto.Atom.WM_NAME)
+
+    def __init__(self):
+        self.windows = {}   # window -> geometry dict, None once the window is gone
+        self.lost = False   # the X connection broke, nothing is tracked any more
+
+    def fileno(self):
+        return xconn.get_file_descriptor()
+
+    def track(self, window):
+        if window in self.windows:
+            return
+        try:
+            xconn.core.ChangeWindowAttributesChecked(window, xcffib.xproto.CW.EventMask,
+                [xcffib.xproto.EventMask.StructureNotify | xcffib.xproto.EventMask.PropertyChange]).check()
+        except xcffib.xproto.WindowError:
+            self.windows[window] = None
+            return
+        self.windows[window] = query_geometry(window)
+
+    def untrack(self, window):
+        if self.windows.pop(window, None) is not None:
+            try:
+                xconn.core.ChangeWindowAttributes(window, xcffib.xproto.CW.EventMask, [0])
+                xconn.flush()
+            except xcffib.XcffibException:
+                pass
+
+    def geometry(self, window):
+        return self.windows.get(window)
+
+    def changes(self):
+        """Read the pending X events. Returns (window, change) pairs, change is
+           "geometry", "title" or "destroyed", each pair once. If the X
+           connection breaks every tracked window is reported destroyed and
+           tracking stops, see lost."""
+        if self.lost:
+            return []
+        changed = []
+        while True:
+            moved = set()
+            while True:
+                try:
+                    event = xconn.poll_for_event()
+                except xcffib.ConnectionException, e:
+                    # the server is gone or the socket broke, no more events will come
+                    log.error(_("X connection lost, tables are no longer tracked: %s"), e)
+                    self.lost = True
+                    for (window, geo) in self.windows.items():
+                        if geo is not None:
+                            self.windows[window] = None
+                            changed.append((window, "destroyed"))
+                    moved = set()
+                    break
+                except xcffib.XcffibException, e: # an error for a request of ours, eg. a window that just closed
+                    log.debug("X error while tracking tables: %s", e)
+                    continue
+                if event is None:
+                    break
+                window = getattr(event, 'window', None)
+                if self.windows.get(window) is None:
+                    continue
+                if isinstance(event, xcffib.xproto.ConfigureNotifyEvent):
+                    moved.add(window)
+                elif isinstance(event, xcffib.xproto.DestroyNotifyEvent):
+                    self.windows[window] = None
+                    changed.append((window, "destroyed"))
+                elif isinstance(event, xcffib.xproto.PropertyNotifyEvent) and event.atom in self.TITLE_ATOMS:
+                    changed.append((window, "title"))
+            if not moved:
+                break
+            # synthetic ConfigureNotify events from the window manager and real ones
+            # relative to its frame look alike, so ask the server once per window
+            for window in moved:
+                if self.windows.get(window) is not None:
+                    geo = query_geometry(window)
+                    if geo is None:
+                        changed.append((window, "destroyed"))
+                    elif geo != self.windows[window]:
+                        changed.append((window, "geometry"))
+                    self.windows[window] = geo
+            # the replies may have brought more events along, go round again
+        seen = set()
+        return [change for change in changed if not (change in seen or seen.add(change))]
+
+tracker = WindowTracker()
+
 class Table(Table_Window):
 
     def find_table_parameters(self):
@@ -71,25 +178,25 @@ class Table(Table_Window):
 
         if self.number is None:
             log.warning(_("No match in XTables for table '%s'."), self.search_string)
+        else:
+            tracker.track(self.number)
 
     # This function serves a double purpose. It fetches the X geometry
     # but it also is used to track for window lifecycle. When
     # get_geometry() returns False [None is deal as False], the table is
     # assumed dead and thus the HUD instance may be killed off.
+    # Tracked windows are answered from the geometry kept up to date by
+    # the tracker, without a round trip to the server.
     def get_geometry(self):
+        if self.number in tracker.windows:
+            return tracker.geometry(self.number)
         wins = xconn.core.GetProperty(False, root, nclatom, winatom, 0, (2**32) - 1).reply().value.to_atoms()
         if self.number not in wins:
             return None
-        try:
-            geo = xconn.core.GetGeometry(self.number).reply()
-            absxy = xconn.core.TranslateCoordinates(self.number, root, geo.x, geo.y).reply()
-            return {'x'        : absxy.dst_x,
-                    'y'        : absxy.dst_y,
-                    'width'    : geo.width,
-                    'height'   : geo.height
-                   }
-        except xcffib.xproto.DrawableError:
-            return None
+        return query_geometry(self.number)
+
+    def stop_tracking(self):
+        tracker.untrack(self.number)
 
     def get_window_title(self):
         return xconn.core.GetProperty(False, self.number, wnameatom, utf8atom, 0, (2**32) - 1).reply().value.to_string()
@@ -21,6 +21,7 @@ import os
 import sys
 import re
 import Queue
+import multiprocessing
 
 if os.name == 'nt':
     import win32api
@@ -50,39 +51,49 @@ from PyQt5.QtWidgets import (QAction, QApplication, QCalendarWidget,
 
 import interlocks
 
-# these imports not required in this module, imported here to report version in About dialog
-import numpy
-numpy_version = numpy.__version__
+
+class LazyModule(object):
+    """Stands in for a module until one of its attributes is used, when it is
+       imported. Most sessions only open a few tabs, so the Gui modules (and
+       matplotlib, numpy and the parsers they pull in) are left out of startup."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = __import__(self._name)
+        return getattr(self._module, attr)
+
+# numpy and sqlite3 are not required in this module, they are here to report versions in the About dialog
+numpy = LazyModule('numpy')
 import sqlite3
 sqlite3_version = sqlite3.version
 sqlite_version = sqlite3.sqlite_version
 
-import DetectInstalledSites
-import GuiPrefs
-import GuiLogView
-#import GuiDatabase
-import GuiBulkImport
-import GuiTourneyImport
-import GuiImapFetcher
-import GuiRingPlayerStats
-import GuiTourneyPlayerStats
-import GuiTourneyViewer
-import GuiPositionalStats
-import GuiAutoImport
-import GuiGraphViewer
-import GuiTourneyGraphViewer
-import GuiSessionViewer
-import GuiHandViewer
-try:
-    import GuiStove
-except:
-    print _("GuiStove not found. If you want to use it please install pypoker-eval.")
+DetectInstalledSites = LazyModule('DetectInstalledSites')
+GuiPrefs = LazyModule('GuiPrefs')
+GuiLogView = LazyModule('GuiLogView')
+#GuiDatabase = LazyModule('GuiDatabase')
+GuiBulkImport = LazyModule('GuiBulkImport')
+GuiTourneyImport = LazyModule('GuiTourneyImport')
+GuiImapFetcher = LazyModule('GuiImapFetcher')
+GuiRingPlayerStats = LazyModule('GuiRingPlayerStats')
+GuiTourneyPlayerStats = LazyModule('GuiTourneyPlayerStats')
+GuiTourneyViewer = LazyModule('GuiTourneyViewer')
+GuiPositionalStats = LazyModule('GuiPositionalStats')
+GuiAutoImport = LazyModule('GuiAutoImport')
+GuiGraphViewer = LazyModule('GuiGraphViewer')
+GuiTourneyGraphViewer = LazyModule('GuiTourneyGraphViewer')
+GuiSessionViewer = LazyModule('GuiSessionViewer')
+GuiHandViewer = LazyModule('GuiHandViewer')
 import SQL
 import Database
 import Configuration
 import Card
 import Exceptions
-import Stats
+Stats = LazyModule('Stats')
 
 Configuration.set_logfile("fpdb-log.txt")
 log = logging.getLogger("fpdb")
@@ -242,7 +253,7 @@ class fpdb(QMainWindow):
                 ('GTK+',             '.'.join([str(x) for x in gtk.gtk_version])),
                 ('PyGTK',            '.'.join([str(x) for x in gtk.pygtk_version])),
                 ('matplotlib',       matplotlib_version),
-                ('numpy',            numpy_version),
+                ('numpy',            numpy.__version__),
                 ('sqlite',           sqlite_version),
                 (_('fpdb version'),  VERSION),
                 (_('database used'), self.settings['db-server']),
@@ -528,8 +539,10 @@ class fpdb(QMainWindow):
                 self.db.recreate_tables()
                 # find any guibulkimport/guiautoimport windows and clear cache:
                 for t in self.threads:
-                    if isinstance(t, GuiBulkImport.GuiBulkImport) or isinstance(t, GuiAutoImport.GuiAutoImport):
+                    if t.__class__.__name__ in ('GuiBulkImport', 'GuiAutoImport'):
                         t.importer.database.resetCache()
+                    elif t.__class__.__name__ == 'GuiGraphViewer':
+                        t.graphCache.clear()
                 self.release_global_lock()
             else:
                 self.release_global_lock()
@@ -848,7 +861,7 @@ class fpdb(QMainWindow):
         cashMenu.addAction(makeAction(_('Hand Viewer'), self.tab_hand_viewer))
         #cashMenu.addAction(makeAction(_('Positional Stats (tabulated view)'), self.tab_positional_stats))
         cashMenu.addAction(makeAction(_('Session Stats'), self.tab_session_stats, 'Ctrl+S'))
-        #cashMenu.addAction(makeAction(_('Stove (preview)'), self.tabStove))
+        cashMenu.addAction(makeAction(_('Stove (preview)'), self.tabStove))
 
         tournamentMenu.addAction(makeAction(_('Tourney Graphs'), self.tabTourneyGraphViewer))
         tournamentMenu.addAction(makeAction(_('Tourney Stats'), self.tab_tourney_player_stats, 'Ctrl+T'))
@@ -1104,10 +1117,14 @@ You can find the full license texts in agpl-3.0.txt, gpl-2.0.txt, gpl-3.0.txt an
 
     def tabStove(self, widget, data=None):
         """opens a tab for poker stove"""
-        thread = GuiStove.GuiStove(self.config, self.window)
+        try:
+            import GuiStove
+        except ImportError:
+            print _("GuiStove not found. If you want to use it please install pypoker-eval.")
+            return
+        thread = GuiStove.GuiStove(self.config, self)
         self.threads.append(thread)
-        tab = thread.get_vbox()
-        self.add_and_display_tab(tab, _("Stove"))
+        self.add_and_display_tab(thread, _("Stove"))
 
     def __init__(self):
         QMainWindow.__init__(self)
@@ -1315,6 +1332,9 @@ You can find the full license texts in agpl-3.0.txt, gpl-2.0.txt, gpl-3.0.txt an
 
 
 if __name__ == "__main__":
+    # the import and stove pools start copies of this exe in a frozen windows build,
+    # they have to run their task instead of another fpdb
+    multiprocessing.freeze_support()
     app = QApplication([])
     me = fpdb()
     app.exec_()
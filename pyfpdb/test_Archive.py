@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+# Stores hand texts in RawHands of a new sqlite database and reads them back.
+# Run from the pyfpdb directory.
+
+import os
+import shutil
+import tempfile
+
+import Archive
+import Configuration
+import Database
+import Importer
+
+corpus = os.path.join('regression-test-files', 'cash', 'Stars')
+
+class FakeHand:
+    def __init__(self, dbid_hands, siteId):
+        self.dbid_hands = dbid_hands
+        self.siteId = siteId
+        self.handText = u"Hand #%d of site %d €\n" % (dbid_hands, siteId)
+
+def new_config(save, compression = 'gzip'):
+    config = Configuration.Config(file = "HUD_config.test.xml")
+    config.dir_database = tempfile.mkdtemp(prefix = 'fpdb-test-')
+    config.raw_hands.save = save
+    config.raw_hands.compression = compression
+    db = Database.Database(config)
+    db.recreate_tables()
+    return (config, db)
+
+def block_count(db):
+    c = db.get_cursor()
+    c.execute("SELECT COUNT(*) FROM RawHands")
+    return c.fetchone()[0]
+
+def testStoreThenRead():
+    (config, db) = new_config('all')
+    try:
+        archive = Archive.Archive(config)
+        size = archive.blockSize
+        # two sites with interleaved ids, in files too short to fill a block
+        hands = [FakeHand(id, 2 + id % 2) for id in xrange(1, 2 * size + 11)]
+        for i in xrange(0, len(hands), 7):
+            archive.storeHands(db, hands[i:i + 7], failed = [u"broken %d" % i] if i == 0 else [])
+            db.commit()
+            # what has been stored can be read at once, nothing waits for the block to fill
+            reader = Archive.Archive(config)
+            assert reader.getHandText(db, hands[i].dbid_hands) == hands[i].handText
+        # a full and a part filled block per site, and the failed hand
+        assert block_count(db) == 4 + 1
+        reader = Archive.Archive(config)
+        texts = reader.getHandTexts(db, [hand.dbid_hands for hand in hands])
+        assert texts == dict((hand.dbid_hands, hand.handText) for hand in hands)
+        assert reader.getHandText(db, 5) == hands[4].handText
+        assert reader.getHandText(db, 10 ** 6) is None
+        assert reader.getFailedTexts(db) == [u"broken 0"]
+    finally:
+        db.disconnect()
+        shutil.rmtree(config.dir_database, ignore_errors = True)
+
+def testImportArchivesEveryHand():
+    (config, db) = new_config('all')
+    db.disconnect()
+    try:
+        settings = {}
+        settings.update(config.get_db_parameters())
+        settings.update(config.get_import_parameters())
+        settings.update(config.get_default_paths())
+        importer = Importer.Importer(False, settings, config, None)
+        importer.setCallHud(False)
+        importer.setMode('bulk')
+        importer.addBulkImportImportFileOrDir(corpus, site = 'auto')
+        importer.runImport()
+        importer.database.disconnect()
+        db = Database.Database(config)
+        c = db.get_cursor()
+        c.execute("SELECT id FROM Hands")
+        ids = [row[0] for row in c.fetchall()]
+        texts = Archive.Archive(config).getHandTexts(db, ids)
+        assert len(texts) == len(ids) > 0
+        # blocks fill across files, only the last block of each site is part filled
+        size = Archive.Archive.blockSize
+        c.execute("""SELECT COUNT(*) FROM Hands h INNER JOIN Gametypes gt ON (gt.id = h.gametypeId)
+                     GROUP BY gt.siteId""")
+        blocks = sum((n + size - 1) // size for (n,) in c.fetchall())
+        c.execute("SELECT COUNT(*) FROM RawHands WHERE NOT complain")
+        assert c.fetchone()[0] == blocks
+    finally:
+        db.disconnect()
+        shutil.rmtree(config.dir_database, ignore_errors = True)
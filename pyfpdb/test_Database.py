@@ -81,3 +81,212 @@ def testSQLiteModFunction():
         idx = idx+1
 
     cur.execute("DROP TABLE test")
+
+def testPlayerIdCache():
+    import shutil, tempfile
+    import Configuration
+    config = Configuration.Config(file = "HUD_config.test.xml")
+    config.dir_database = tempfile.mkdtemp(prefix = 'fpdb-test-')
+    try:
+        db1 = Database.Database(config)
+        db1.recreate_tables()
+        db2 = Database.Database(config)
+        key = (u'Hero', 2, True)
+
+        # an id that was rolled back must not be handed out again
+        db1.getSqlPlayerIDs([u'Hero'], 2, u'Hero')
+        assert key not in Database._player_ids[db1.playerCacheKey()]
+        db1.rollback()
+        id = db1.getSqlPlayerIDs([u'Hero'], 2, u'Hero')[u'Hero']
+        assert key not in Database._player_ids[db1.playerCacheKey()]
+        db1.commit()
+        assert Database._player_ids[db1.playerCacheKey()][key] == id
+
+        # the other connection finds it in the cache without looking it up
+        db2.insertPlayer = None
+        assert db2.getSqlPlayerIDs([u'Hero'], 2, u'Hero') == {u'Hero': id}
+
+        # and forgets it when the tables are made again
+        db1.recreate_tables()
+        assert key not in db2.pcache
+        db1.disconnect()
+        db2.disconnect()
+    finally:
+        shutil.rmtree(config.dir_database, ignore_errors = True)
+
+def testMergeCache():
+    import shutil, tempfile
+    from datetime import datetime
+    import Configuration
+    config = Configuration.Config(file = "HUD_config.test.xml")
+    config.dir_database = tempfile.mkdtemp(prefix = 'fpdb-test-')
+    try:
+        db = Database.Database(config)
+        db.recreate_tables()
+        c = db.get_cursor()
+        keys = ['gametypeId', 'playerId', 'seats', 'position', 'tourneyTypeId', 'styleKey']
+        day = lambda d: datetime(2011, 1, d)
+        # once with UPDATE ... FROM, once with the id lookup sqlite before 3.33 needs
+        for update in (db.sql.query['mergeCacheUpdate'], None):
+            db.sql.query['mergeCacheUpdate'] = update
+            c.execute("DELETE FROM HudCache")
+            c.execute("DELETE FROM TourneysCache")
+
+            # a ring row (tourneyTypeId NULL) must be matched and summed, not inserted twice
+            ring, tour = [1, 1, 6, 'B', None, 'A000000'], [1, 1, 6, 'B', 7, 'A000000']
+            db.mergeCache(c, 'HudCache', keys, [ring + [1, 1], tour + [1, 0]], sums = ['n', 'street0VPI'])
+            db.mergeCache(c, 'HudCache', keys, [ring + [2, 1]], sums = ['n', 'street0VPI'])
+            c.execute("SELECT tourneyTypeId, n, street0VPI FROM HudCache ORDER BY tourneyTypeId")
+            assert c.fetchall() == [(None, 3, 2), (7, 1, 0)]
+
+            # the first sessionId is kept, startTime only moves back and endTime only forward
+            merge = lambda rows: db.mergeCache(c, 'TourneysCache', ['tourneyId', 'playerId'], rows, sums = ['n']
+                                              ,mins = ['startTime'], maxs = ['endTime'], inserts = ['sessionId'], nullable = [])
+            merge([[1, 1, 5, day(10), day(11), 1]])
+            merge([[1, 1, 6, day(9), day(10), 1], [1, 2, 6, day(9), day(10), 1]])
+            merge([[1, 1, 6, day(10), day(12), 2]])
+            c.execute("SELECT playerId, sessionId, startTime, endTime, n FROM TourneysCache ORDER BY playerId")
+            rows = [(r[0], r[1], str(r[2])[:10], str(r[3])[:10], r[4]) for r in c.fetchall()]
+            assert rows == [(1, 5, '2011-01-09', '2011-01-12', 4), (2, 6, '2011-01-09', '2011-01-10', 1)]
+        db.disconnect()
+    finally:
+        shutil.rmtree(config.dir_database, ignore_errors = True)
+
+def testCopyStream():
+    import csv
+    from cStringIO import StringIO
+    from decimal_wrapper import Decimal
+    rows = [[1, u'Hero', None, ''], [2, u'tab\there', u'say "hi"', u'two\nlines'], [3, u'Zoë', Decimal('0.25'), True]] * 50
+
+    def copy(encoding, size):
+        stream = Database.CopyStream(rows, encoding)
+        data = ''
+        while True:
+            chunk = stream.read(size)
+            assert len(chunk) <= size
+            if not chunk:
+                return data
+            data += chunk
+
+    # read in odd sizes and in one go, COPY must get the same text either way
+    data = copy('utf-8', 7)
+    assert data == copy('utf-8', 1 << 20)
+    assert data.startswith('1\tHero\t\\N\t\n')
+    back = list(csv.reader(StringIO(data), delimiter='\t', quotechar='"'))
+    assert len(back) == len(rows)
+    assert back[1] == ['2', 'tab\there', 'say "hi"', 'two\nlines']
+    assert back[2] == ['3', u'Zoë'.encode('utf-8'), '0.25', 'True']
+
+    # unicode goes out in the connection's encoding
+    data = copy('latin-1', 100)
+    assert u'Zoë'.encode('latin-1') in data and u'Zoë'.encode('utf-8') not in data
+
+def testStatCacheSharedByTables():
+    # the HUD's in memory totals must stay equal to HudCache while hands
+    # come in from several tables, whichever table they are asked for at
+    import os, re, shutil, tempfile
+    import Configuration
+    import Importer
+    config = Configuration.Config(file = "HUD_config.test.xml")
+    config.dir_database = tempfile.mkdtemp(prefix = 'fpdb-test-')
+    try:
+        db = Database.Database(config)
+        db.recreate_tables()
+        settings = {}
+        settings.update(config.get_db_parameters())
+        settings.update(config.get_import_parameters())
+        settings.update(config.get_default_paths())
+        text = open('regression-test-files/cash/Stars/Flop/NLHE-6max-USD-0.05-0.10-200911.txt', 'rb').read()
+        hands = re.split('\r?\n\r?\n\r?\n+', text.strip())
+        params = {'stat_range':'A', 'agg_bb_mult':1000
+                 ,'seats_style':'A', 'seats_cust_nums_low':1, 'seats_cust_nums_high':10
+                 ,'h_stat_range':'A', 'h_agg_bb_mult':1000
+                 ,'h_seats_style':'A', 'h_seats_cust_nums_low':1, 'h_seats_cust_nums_high':10}
+        stat_cache, seen = {}, {}
+        for n, part in enumerate((hands[:30], hands[30:50], hands[50:])):
+            path = os.path.join(config.dir_database, 'hh%d.txt' % n)
+            open(path, 'wb').write('\n\n\n'.join(part) + '\n\n\n')
+            importer = Importer.Importer(False, settings, config, None)
+            importer.setCallHud(False)
+            importer.setMode('bulk')
+            importer.addBulkImportImportFileOrDir(path, site = 'PokerStars')
+            importer.runImport()
+            importer.database.disconnect()
+            # the new table and every table seen before asks for its latest hand
+            seen[n] = db.get_last_hand()
+            db.commit()
+            for table, hand in seen.iteritems():
+                hero = db.get_player_id(config, 'PokerStars', 'Hero') or -1
+                cached = db.get_stats_from_hand(hand, 'ring', params, hero, 6, stat_cache, table)
+                assert cached == db.get_stats_from_hand(hand, 'ring', params, hero, 6)
+            assert len(cached) > 1
+        # the totals of the players only the closed tables held on to go
+        players = set(stat_cache['players'])
+        for table in seen:
+            db.release_cached_stats(stat_cache, table)
+        stats = db.get_stats_from_hand(seen[2], 'ring', params, -1, 6, stat_cache, 'other')
+        assert set(stat_cache['players']) == set(stats) and len(stat_cache['totals']) == len(stats)
+        assert players > set(stats)
+        db.disconnect()
+    finally:
+        shutil.rmtree(config.dir_database, ignore_errors = True)
+
+def testCachedProfitSquares():
+    # the stats grids work out variance from the caches' sums of totalProfit squared,
+    # storing hands and rebuilding the cache must both keep them equal to HandsPlayers'
+    import os, shutil, tempfile
+    import Configuration
+    import Importer
+    config = Configuration.Config(file = "HUD_config.test.xml")
+    config.dir_database = tempfile.mkdtemp(prefix = 'fpdb-test-')
+    try:
+        db = Database.Database(config)
+        db.recreate_tables()
+        settings = {}
+        settings.update(config.get_db_parameters())
+        settings.update(config.get_import_parameters())
+        settings.update(config.get_default_paths())
+        importer = Importer.Importer(False, settings, config, None)
+        importer.setCallHud(False)
+        importer.setMode('bulk')
+        importer.addBulkImportImportFileOrDir(os.path.join('regression-test-files', 'cash', 'Stars', 'Flop'), site = 'PokerStars')
+        importer.runImport()
+        importer.database.disconnect()
+        c = db.get_cursor()
+        c.execute("SELECT playerId, sum(totalProfit*totalProfit), count(1) FROM HandsPlayers GROUP BY playerId ORDER BY playerId")
+        expected = c.fetchall()
+        assert len(expected) > 100 and [r for r in expected if r[1]]
+        for stored in (True, False):
+            if not stored:
+                db.rebuild_cache(None, None, 'HudCache')
+            c.execute("SELECT playerId, sum(totalProfitSq), sum(n) FROM HudCache GROUP BY playerId ORDER BY playerId")
+            assert c.fetchall() == expected
+        db.disconnect()
+    finally:
+        shutil.rmtree(config.dir_database, ignore_errors = True)
+
+def testTourneyPayouts():
+    # the replayer shows ICM equities only when the table holds the tourney's last players
+    import shutil, tempfile
+    import Configuration
+    config = Configuration.Config(file = "HUD_config.test.xml")
+    config.dir_database = tempfile.mkdtemp(prefix = 'fpdb-test-')
+    try:
+        db = Database.Database(config)
+        db.recreate_tables()
+        c = db.get_cursor()
+        results = [('a', 1, 5000), ('b', 2, 3000), ('c', 3, 2000), ('d', 4, 0), ('e', None, None)]
+        for (i, (name, rank, winnings)) in enumerate(results):
+            c.execute("INSERT INTO Players (id, name, siteId) VALUES (?, ?, 2)", (i + 1, name))
+            c.execute("INSERT INTO TourneysPlayers (tourneyId, playerId, entryId, rank, winnings) VALUES (7, ?, 1, ?, ?)",
+                      (i + 1, rank, winnings))
+        db.commit()
+        assert db.get_tourney_payouts(7, ['a', 'b', 'c']) == [50.0, 30.0, 20.0]
+        assert db.get_tourney_payouts(7, ['a', 'b', 'c', 'd']) == [50.0, 30.0, 20.0, 0.0]
+        # a table that isn't the last one, or a tourney without results
+        assert db.get_tourney_payouts(7, ['a', 'b', 'd']) is None
+        assert db.get_tourney_payouts(7, ['a', 'e']) is None
+        assert db.get_tourney_payouts(8, ['a', 'b']) is None
+        db.disconnect()
+    finally:
+        shutil.rmtree(config.dir_database, ignore_errors = True)
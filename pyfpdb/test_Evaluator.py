@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+# Checks the equities of Evaluator.PokerEval against exhaustive counts, with
+# and without NumPy. Run from the pyfpdb directory.
+
+import codecs
+import os
+import shutil
+import tempfile
+from itertools import combinations
+
+import Configuration
+import Database
+import Evaluator
+import Importer
+
+numpy = Evaluator.numpy
+
+def each_backend(test):
+    """Runs test with NumPy batches, when installed, and without"""
+    for np in (numpy, None) if numpy else (None,):
+        Evaluator.numpy = np
+        try:
+            test()
+        finally:
+            Evaluator.numpy = numpy
+
+def equity(result, i):
+    e = result['eval'][i]
+    return (e['winhi'] + e['tiehi'] / 2.0) / result['info'][0]
+
+def testOmahaFlopIsExact():
+    pockets = [['Ac', 'As', 'Kd', 'Qh'], ['Td', '9d', '8c', '7c']]
+    board = ['2d', '5h', '6d']
+    # every turn and river, each pocket plays its best two cards with three of the board
+    pe = Evaluator.PokerEval()
+    deck = [c for c in xrange(52) if pe.card2string(c) not in pockets[0] + pockets[1] + board]
+    wins = ties = 0
+    for deal in combinations(deck, 2):
+        cards = board + pe.card2string(list(deal))
+        (hero, villain) = [pe.best('hi', p, cards)[0] for p in pockets]
+        wins += hero > villain
+        ties += hero == villain
+    def test():
+        result = Evaluator.PokerEval(seed=0).poker_eval(game='omaha', pockets=pockets, board=board + ['__', '__'])
+        assert result['info'][0] == 820
+        assert result['eval'][0]['winhi'] == wins and result['eval'][0]['tiehi'] == ties
+    each_backend(test)
+
+def testHoldemPreflopSample():
+    # exhaustive count over all 1712304 boards: AcAs wins 1419893, ties 6577
+    exact = (1419893 + 6577 / 2.0) / 1712304
+    def test():
+        result = Evaluator.PokerEval(seed=0).poker_eval(game='holdem', pockets=[['Ac', 'As'], ['Kd', '5d']],
+                                                         board=['__'] * 5, iterations=50000)
+        assert result['info'][0] >= 10000
+        assert abs(equity(result, 0) - exact) < 0.01
+    each_backend(test)
+
+def testSeededSampleIsRepeated():
+    def test():
+        (pe1, pe2) = (Evaluator.PokerEval(seed=0), Evaluator.PokerEval(seed=0))
+        args = dict(game='omaha8', pockets=[['Ac', '2s', 'Kd', 'Qh'], ['Td', '9d', '8c', '3c']], board=['__'] * 5)
+        pe2.poker_eval(game='holdem', pockets=[['Ac', 'As'], ['Kd', '5d']], board=['__'] * 5)
+        assert pe1.poker_eval(**args) == pe2.poker_eval(**args)
+    each_backend(test)
+
+def testAllInEVMatchesPokereval():
+    # the .hp stats of the hand were made with pypoker-eval taking 50000 samples
+    filename = os.path.join('regression-test-files', 'cash', 'Stars', 'Flop', 'NLHE-6max-USD-0.05-0.10-200912.Allin-pre.txt')
+    with codecs.open(filename + '.hp', 'r', 'utf8') as f:
+        expected = eval(f.read())
+    config = Configuration.Config(file = "HUD_config.test.xml")
+    config.dir_database = tempfile.mkdtemp(prefix = 'fpdb-test-')
+    try:
+        db = Database.Database(config)
+        db.recreate_tables()
+        settings = {}
+        settings.update(config.get_db_parameters())
+        settings.update(config.get_import_parameters())
+        settings.update(config.get_default_paths())
+        importer = Importer.Importer(False, settings, config, None)
+        importer.setCallHud(False)
+        importer.setFakeCacheHHC(True)
+        importer.addBulkImportImportFileOrDir(filename, site = 'auto')
+        importer.runImport()
+        importer.database.disconnect()
+        db.disconnect()
+        (hand,) = importer.getCachedHHC().getProcessedHands()
+        stats = hand.stats.getHandsPlayers()
+        for player in (u'Hero', u'AAALISAAAA'):
+            # a thousandth of the equity is 3.9 cents of this pot, either sample can be a couple off
+            assert abs(stats[player]['allInEV'] - expected[player]['allInEV']) < 20
+    finally:
+        shutil.rmtree(config.dir_database, ignore_errors = True)
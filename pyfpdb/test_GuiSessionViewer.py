@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+# Checks the session stats of GuiSessionViewer.generateDatasets against the
+# hand by hand loop it replaced. Run from the pyfpdb directory.
+
+from time import strftime, localtime
+
+import py
+
+py.test.importorskip('numpy')
+py.test.importorskip('PyQt5')
+
+import GuiSessionViewer
+
+THRESHOLD = 1800
+PADDING = 5
+
+class Cursor:
+    def __init__(self, hands):
+        self.hands = hands
+
+    def execute(self, q):
+        pass
+
+    def __iter__(self):
+        return iter(self.hands)
+
+def loop_datasets(hands):
+    # the sessions as generateDatasets worked them out before it used arrays
+    hands = list(hands)
+    if not hands:
+        return ([], [], [])
+    hands.insert(0, (hands[0][0], 0))
+    times = [long(x[0]) for x in hands]
+    profits = [float(x[1]) for x in hands]
+    index = [i for i in range(len(times)) if i == len(times) - 1 or times[i + 1] - times[i] > THRESHOLD]
+    cum_sum = []
+    for p in profits:
+        cum_sum.append((cum_sum[-1] if cum_sum else 0) + p)
+    cum_sum = [c / 100 for c in cum_sum]
+
+    first_idx = 1
+    (quotes, results, sessionTimes) = ([], [], [])
+    (total_hands, total_time) = (0, 0)
+    (global_open, global_lwm, global_hwm) = (None, None, None)
+    sid = 1
+    for last_idx in index:
+        hds = last_idx - first_idx + 1
+        if hds <= 0:
+            continue
+        stime = strftime("%d/%m/%Y %H:%M", localtime(times[first_idx]))
+        etime = strftime("%d/%m/%Y %H:%M", localtime(times[last_idx]))
+        sessionTimes.append((times[first_idx] - PADDING * 60, times[last_idx] + PADDING * 60))
+        minutesplayed = (times[last_idx] - times[first_idx]) / 60 + PADDING
+        if minutesplayed == 0:
+            minutesplayed = 1
+        hph = hds * 60 / minutesplayed
+        end_idx = last_idx + 1
+        hwm = max(cum_sum[first_idx - 1:end_idx])
+        lwm = min(cum_sum[first_idx - 1:end_idx])
+        open = sum(profits[:first_idx]) / 100
+        close = sum(profits[:end_idx]) / 100
+        total_hands += hds
+        total_time += minutesplayed
+        if global_lwm is None or global_lwm > lwm:
+            global_lwm = lwm
+        if global_hwm is None or global_hwm < hwm:
+            global_hwm = hwm
+        if global_open is None:
+            (global_open, global_stime) = (open, stime)
+        results.append([sid, hds, stime, etime, hph,
+                        "%.2f" % open, "%.2f" % close, "%.2f" % lwm, "%.2f" % hwm,
+                        "%.2f" % (hwm - lwm), "%.2f" % (close - open)])
+        quotes.append((sid, open, close, hwm, lwm))
+        first_idx = end_idx
+        sid += 1
+    results.append([''] * 11)
+    results.append([GuiSessionViewer._("all"), total_hands, global_stime, etime,
+                    total_hands * 60 / total_time,
+                    "%.2f" % global_open, "%.2f" % close, "%.2f" % global_lwm, "%.2f" % global_hwm,
+                    "%.2f" % (global_hwm - global_lwm), "%.2f" % (close - global_open)])
+    return (results, quotes, sessionTimes)
+
+def datasets(hands):
+    generate = GuiSessionViewer.GuiSessionViewer.generateDatasets.im_func
+    return generate(None, 'sessionStats', Cursor(hands))
+
+def check(hands):
+    (results, quotes, sessionTimes) = datasets(hands)
+    assert (results, quotes, list(sessionTimes)) == loop_datasets(hands)
+    return results
+
+def testSessions():
+    start = 1262304000
+    hands = [(start, 150), (start + 60, -200), (start + 61, 0),
+             # a gap of exactly THRESHOLD stays in the session
+             (start + 61 + THRESHOLD, 1250),
+             # one more second starts a new one, of a single hand
+             (start + 61 + 3 * THRESHOLD + 1, -75),
+             # single hand sessions in a row
+             (start + 10000, 20), (start + 20000, -20), (start + 30000, 0),
+             (start + 40000, -500), (start + 40000 + THRESHOLD, 300), (start + 40000 + THRESHOLD, 300)]
+    results = check(hands)
+    assert [row[1] for row in results[:-2]] == [4, 1, 1, 1, 1, 3]
+    # long sessions of hands a few seconds apart
+    hands = [(start + 7 * i + (i // 400) * (THRESHOLD + 1), (i * 37) % 251 - 120) for i in xrange(2000)]
+    results = check(hands)
+    assert len(results) == 5 + 2
+
+def testSingleHand():
+    results = check([(1262304000, -35)])
+    assert len(results) == 3 and results[0][1] == 1
+    check([(1262304000, 0)])
+
+def testNoHands():
+    assert datasets([]) == ([], [], [])
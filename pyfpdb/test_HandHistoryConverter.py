@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+# Checks the incremental hand splitter of HandHistoryConverter against
+# splitting the whole file at once. Run from the pyfpdb directory.
+
+import codecs
+import os
+import shutil
+import tempfile
+
+import Configuration
+from PokerStarsToFpdb import PokerStars
+
+config = Configuration.Config(file = "HUD_config.test.xml")
+sample = os.path.join('regression-test-files', 'cash', 'Stars', 'Flop', 'NLHE-6max-USD-0.05-0.10-200911.txt')
+
+def converter(path, index = 0, chunk = None):
+    hhc = PokerStars(config, in_path = path, index = index, autostart = False, sitename = "PokerStars")
+    if chunk is not None:
+        hhc.READ_CHUNK_SIZE = chunk
+    return hhc
+
+def whole_file_hands(path):
+    return converter(path).readAllHands()
+
+def write(path, text, encoding, crlf = False):
+    if crlf:
+        text = text.replace(u'\n', u'\r\n')
+    with open(path, 'wb') as f:
+        f.write(text.encode(encoding))
+
+def testHandsAcrossChunks():
+    # chunks of a few bytes cut hands, lines, \r\n pairs and multibyte characters in two
+    tmpdir = tempfile.mkdtemp(prefix = 'fpdb-test-')
+    try:
+        text = codecs.open(sample, 'r', 'utf8').read()
+        for (encoding, crlf) in (('utf8', False), ('utf8', True), ('cp1252', False)):
+            path = os.path.join(tmpdir, 'hh-%s-%s.txt' % (encoding, crlf))
+            write(path, text, encoding, crlf)
+            expected = whole_file_hands(path)
+            assert len(expected) > 50
+            for chunk in (7, 500, 10000):
+                hhc = converter(path, chunk = chunk)
+                assert list(hhc.allHandsAsIter()) == expected
+                assert hhc.kodec == encoding
+                # picking the codec keeps no more than a few chunks of text
+                hhc = converter(path, chunk = chunk)
+                hhc.openFile().close()
+                assert len(hhc.decoded) <= hhc.DECODE_KEEP
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors = True)
+
+def testTrailingPartialHand():
+    # the last hand is still being written: it comes out cut short, and the
+    # next read picks it up again from the resume point once it is complete
+    tmpdir = tempfile.mkdtemp(prefix = 'fpdb-test-')
+    try:
+        text = codecs.open(sample, 'r', 'utf8').read()
+        path = os.path.join(tmpdir, 'hh.txt')
+        whole = whole_file_hands(sample)
+        cut = text.rindex(u'*** HOLE CARDS ***')
+        write(path, text[:cut], 'utf8')
+
+        hhc = converter(path, chunk = 500)
+        hands = list(hhc.allHandsAsIter())
+        assert hands[:-1] == whole[:-1]
+        assert whole[-1].startswith(hands[-1]) and hands[-1] != whole[-1]
+        # as start() does with autoPop when the last hand is partial
+        index = hhc.index - len(hands[-1])
+        resume = hhc.getResumePoint()
+
+        write(path, text, 'utf8')
+        hhc = converter(path, index = index, chunk = 500)
+        hhc.setResumePoint(resume)
+        assert list(hhc.allHandsAsIter()) == whole[-1:]
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors = True)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+# Checks ICM.equities against recursing over every finishing order.
+# Run from the pyfpdb directory.
+
+import random
+
+import ICM
+
+def recursion(stacks, payouts):
+    # each place is taken with probability stack / chips left, by every player in turn
+    eq = [0.0] * len(stacks)
+    def place(left, prob, payouts):
+        total = float(sum(stacks[i] for i in left))
+        if not payouts or total == 0:
+            return
+        for i in left:
+            if stacks[i] == 0:
+                continue
+            p = prob * stacks[i] / total
+            eq[i] += p * payouts[0]
+            place([j for j in left if j != i], p, payouts[1:])
+    place(range(len(stacks)), 1.0, list(payouts))
+    return eq
+
+def check(stacks, payouts):
+    expected = recursion(stacks, payouts)
+    for use_numpy in (False, True):
+        if use_numpy and ICM.numpy is None:
+            continue
+        saved = ICM.NUMPY_SUBSETS
+        # force the python or the numpy version
+        ICM.NUMPY_SUBSETS = 0 if use_numpy else ICM.MAX_SUBSETS + 1
+        try:
+            ICM._cache.clear()
+            result = ICM.equities(stacks, payouts)
+        finally:
+            ICM.NUMPY_SUBSETS = saved
+        assert len(result) == len(stacks)
+        for (a, b) in zip(result, expected):
+            assert abs(a - b) < 1e-9 * max(1.0, sum(payouts))
+
+def testRandomTables():
+    rnd = random.Random(4)
+    for n in xrange(2, 7):
+        for k in xrange(1, n + 1):
+            for i in xrange(5):
+                stacks = [rnd.randint(1, 5000) for j in xrange(n)]
+                payouts = sorted((rnd.randint(1, 1000) for j in xrange(k)), reverse = True)
+                check(stacks, payouts)
+                ICM._cache.clear()
+                assert abs(sum(ICM.equities(stacks, payouts)) - sum(payouts)) < 1e-6
+
+def testTiedStacks():
+    check([1000] * 4, [50, 30, 20])
+    eq = ICM.equities([1000] * 4, [50, 30, 20])
+    assert max(eq) - min(eq) < 1e-9
+    check([500, 500, 2000, 2000, 100], [40, 25, 15, 10])
+
+def testZeroStacks():
+    # players without chips take no place and get nothing
+    check([0, 3000, 0, 1500], [60, 40])
+    assert ICM.equities([0, 3000, 0, 1500], [60, 40])[0] == 0.0
+    check([0, 0, 2000], [50, 30, 20])
+    assert ICM.equities([0, 0, 2000], [50, 30, 20]) == [0.0, 0.0, 50.0]
+    assert ICM.equities([0, 0], [50, 30]) == [0.0, 0.0]
+
+def testFewerPayoutsThanPlayers():
+    check([1200, 800, 600, 400, 300, 100], [100])
+    check([1200, 800, 600, 400, 300, 100], [65, 35])
+    # more payouts than players: the extra places are not paid
+    check([700, 300], [50, 30, 20])
+
+def testEvDiff():
+    payouts = [50, 30, 20]
+    before = [2000, 1000, 1000]
+    after = [3000, 1000, 0]
+    diff = ICM.ev_diff(before, payouts, after)
+    expected = [b - a for (a, b) in zip(recursion(before, payouts), recursion(after, payouts))]
+    for (a, b) in zip(diff, expected):
+        assert abs(a - b) < 1e-9
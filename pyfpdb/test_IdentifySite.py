@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+# Checks the site identification cache is kept to the files that are still
+# there unchanged. Run from the pyfpdb directory.
+
+import os
+import shutil
+import tempfile
+
+import Configuration
+import IdentifySite
+
+sample = os.path.join('regression-test-files', 'cash', 'Stars', 'Flop', 'NLHE-6max-USD-0.05-0.10-200912.Allin-pre.txt')
+
+def testCacheDropsGoneAndChangedFiles():
+    config = Configuration.Config(file = "HUD_config.test.xml")
+    config.dir_database = tempfile.mkdtemp(prefix = 'fpdb-test-')
+    try:
+        hhdir = os.path.join(config.dir_database, 'hh')
+        os.mkdir(hhdir)
+        paths = [os.path.join(hhdir, name) for name in ('kept.txt', 'gone.txt', 'changed.txt')]
+        for path in paths:
+            shutil.copy(sample, path)
+        IdentifySite.IdentifySite(config).scan(hhdir)
+
+        os.remove(paths[1])
+        with open(paths[2], 'a') as f:
+            f.write('\n')
+        os.utime(paths[2], (0, 0))
+        shutil.copy(sample, os.path.join(hhdir, 'new.txt'))
+        IdentifySite.IdentifySite(config).scan(os.path.join(hhdir, 'new.txt'))
+
+        ids = IdentifySite.IdentifySite(config)
+        ids.load_cache()
+        assert sorted(os.path.basename(path) for path in ids.idcache) == ['kept.txt', 'new.txt']
+    finally:
+        shutil.rmtree(config.dir_database, ignore_errors = True)
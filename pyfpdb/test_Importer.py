@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+# Bulk imports a corpus into new sqlite databases in different ways and checks
+# they all store the same rows as a plain import (one process, indexes kept).
+# Run from the pyfpdb directory.
+
+import os
+import shutil
+import tempfile
+
+import Configuration
+import Database
+import Importer
+
+corpus = os.path.join('regression-test-files', 'cash', 'Stars')
+tables = ('Hands', 'HandsPlayers', 'HandsActions', 'HudCache')
+
+def import_counts(threads=1, dropIndexes="don't drop"):
+    """Imports corpus into a new database, returns {table: rows} of tables"""
+    config = Configuration.Config(file = "HUD_config.test.xml")
+    config.dir_database = tempfile.mkdtemp(prefix = 'fpdb-test-')
+    try:
+        db = Database.Database(config)
+        db.recreate_tables()
+        db.disconnect()
+        settings = {}
+        settings.update(config.get_db_parameters())
+        settings.update(config.get_import_parameters())
+        settings.update(config.get_default_paths())
+        importer = Importer.Importer(False, settings, config, None)
+        importer.setDropIndexes(dropIndexes)
+        importer.setThreads(threads)
+        importer.setCallHud(False)
+        importer.setMode('bulk')
+        importer.addBulkImportImportFileOrDir(corpus, site = 'auto')
+        importer.runImport()
+        importer.database.disconnect()
+        db = Database.Database(config)
+        c = db.get_cursor()
+        counts = {}
+        for table in tables:
+            c.execute("SELECT COUNT(*) FROM " + table)
+            counts[table] = c.fetchone()[0]
+        db.disconnect()
+        return counts
+    finally:
+        shutil.rmtree(config.dir_database, ignore_errors = True)
+
+plain = []
+def plain_counts():
+    if not plain:
+        plain.append(import_counts())
+    return plain[0]
+
+def testPlainImportStoresRows():
+    counts = plain_counts()
+    assert counts['Hands'] > 0 and counts['HandsPlayers'] > counts['Hands']
+
+def testSqliteBulkProfileKeepsRows():
+    # commits span files under the profile, none of them may be lost on the way
+    assert import_counts(dropIndexes = 'drop') == plain_counts()
+
+def testAutoIndexesKeepsRows():
+    assert import_counts(dropIndexes = 'auto') == plain_counts()
+
+def testWorkerProcessesKeepRows():
+    # the workers parse in processes of their own, this one stores what they send back
+    assert import_counts(threads = 3) == plain_counts()
+    assert import_counts(threads = 3, dropIndexes = 'drop') == plain_counts()
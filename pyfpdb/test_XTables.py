@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+# Maps, moves, renames, unmaps and destroys a window on an Xvfb server and
+# checks what XTables.WindowTracker reports for it. Skipped where Xvfb or
+# xcffib is not installed. Run from the pyfpdb directory.
+
+import os
+import subprocess
+import time
+from distutils.spawn import find_executable
+
+import py
+
+def start_xvfb():
+    """Starts Xvfb on a free display and points DISPLAY at it, returns the process"""
+    if find_executable('Xvfb') is None:
+        py.test.skip("Xvfb not installed")
+    display = 100 + os.getpid() % 400
+    while os.path.exists('/tmp/.X11-unix/X%d' % display) or os.path.exists('/tmp/.X%d-lock' % display):
+        display += 1
+    server = subprocess.Popen(['Xvfb', ':%d' % display, '-screen', '0', '800x600x24', '-nolisten', 'tcp'])
+    for i in xrange(100):
+        if os.path.exists('/tmp/.X11-unix/X%d' % display):
+            break
+        time.sleep(0.05)
+    os.environ['DISPLAY'] = ':%d' % display
+    return server
+
+def wait_for_changes(tracker, wanted):
+    """Reads the tracker until wanted (a change or None for any) turns up, returns all it read"""
+    changes = []
+    for i in xrange(40):
+        changes.extend(tracker.changes())
+        if (wanted is None and changes) or wanted in changes:
+            break
+        time.sleep(0.05)
+    return changes
+
+def testTrackerFollowsWindow():
+    py.test.importorskip('xcffib')
+    py.test.importorskip('PyQt5')
+    server = start_xvfb()
+    try:
+        import xcffib, xcffib.xproto
+        import XTables
+
+        # the window is made and changed on a connection of its own, as the table client would
+        conn = xcffib.connect()
+        screen = conn.get_setup().roots[conn.pref_screen]
+        window = conn.generate_id()
+        conn.core.CreateWindow(screen.root_depth, window, screen.root, 10, 20, 300, 200, 0,
+                               xcffib.xproto.WindowClass.InputOutput, screen.root_visual, 0, [])
+        conn.core.MapWindow(window)
+        conn.flush()
+        conn.core.GetInputFocus().reply()   # round trip, the server has mapped it
+
+        tracker = XTables.WindowTracker()
+        tracker.track(window)
+        assert tracker.geometry(window) == {'x': 10, 'y': 20, 'width': 300, 'height': 200}
+
+        conn.core.ConfigureWindow(window, xcffib.xproto.ConfigWindow.X | xcffib.xproto.ConfigWindow.Y, [50, 60])
+        conn.flush()
+        assert wait_for_changes(tracker, (window, "geometry")) == [(window, "geometry")]
+        assert tracker.geometry(window) == {'x': 50, 'y': 60, 'width': 300, 'height': 200}
+
+        title = "Table 'Lucretia IV' 6-max"
+        conn.core.ChangeProperty(xcffib.xproto.PropMode.Replace, window, XTables.wnameatom,
+                                 XTables.utf8atom, 8, len(title), title)
+        conn.flush()
+        assert wait_for_changes(tracker, (window, "title")) == [(window, "title")]
+
+        # a table that is only unmapped (minimised) is still there
+        conn.core.UnmapWindow(window)
+        conn.flush()
+        assert wait_for_changes(tracker, None) == []
+        assert tracker.geometry(window) is not None
+
+        conn.core.DestroyWindow(window)
+        conn.flush()
+        assert wait_for_changes(tracker, (window, "destroyed")) == [(window, "destroyed")]
+        assert tracker.geometry(window) is None
+        conn.disconnect()
+    finally:
+        server.terminate()
+        server.wait()
+
+def testTrackerStopsWhenConnectionBreaks():
+    py.test.importorskip('xcffib')
+    py.test.importorskip('PyQt5')
+    server = start_xvfb()
+    try:
+        import xcffib, xcffib.xproto
+        import XTables
+        reload(XTables)     # connect to this server, not to the one of an earlier test
+
+        conn = xcffib.connect()
+        screen = conn.get_setup().roots[conn.pref_screen]
+        window = conn.generate_id()
+        conn.core.CreateWindow(screen.root_depth, window, screen.root, 10, 20, 300, 200, 0,
+                               xcffib.xproto.WindowClass.InputOutput, screen.root_visual, 0, [])
+        conn.core.MapWindow(window)
+        conn.flush()
+        conn.core.GetInputFocus().reply()
+
+        tracker = XTables.WindowTracker()
+        tracker.track(window)
+        assert tracker.geometry(window) is not None
+    finally:
+        server.terminate()
+        server.wait()
+    # the tables went with the server, they are reported once and tracking stops
+    assert wait_for_changes(tracker, None) == [(window, "destroyed")]
+    assert tracker.lost
+    assert tracker.geometry(window) is None
+    assert tracker.changes() == []
@@ -82,7 +82,8 @@ setup(name = 'fpdb',
             ['files/fpdb.desktop']),
         ('/usr/share/python-fpdb',
             ['pyfpdb/logging.conf', 
-             'pyfpdb/HUD_config.xml.example'
+             'pyfpdb/HUD_config.xml.example',
+             'pyfpdb/PreflopEquity.txt'
             ]),
         ('/usr/share/python-fpdb/cards/backs/', glob.glob('gfx/cards/backs/*') ),
         ('/usr/share/python-fpdb/cards/bordered/', glob.glob('gfx/cards/bordered/*') ),